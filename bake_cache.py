@@ -0,0 +1,233 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import numpy as np
+
+try:
+    import bpy
+    from bpy import context as C
+except ImportError:
+    # cache eviction and key hashing also work outside of Blender
+    bpy = C = None
+
+"""
+Content-addressed cache of baked rigid body simulations.
+
+Baking at steps_per_second = 500 and solver_iterations = 150 takes far
+longer than building the scene, and a scene built from the same parameters
+and seed bakes to the same result on the same Blender version. The rigid
+body point cache is only stored inside the .blend file, so after a bake a
+copy of the baked scene is saved under a hash of everything the simulation
+depends on (see scene_inputs). The next run which builds an identical
+scene opens the cached copy instead of baking again:
+
+if not restore_bake(key):
+    bpy.ops.ptcache.bake_all(bake=True)
+    store_bake(key)
+
+finish_scene does this when params['bake_cache'] is a directory, which is
+off by default; BAKE_CACHE_DIR is the suggested place for it:
+
+blender --background --python blender_crystal.py --
+    --set bake_cache=~/.cache/blender_bakes --stages bake
+
+The least recently used bakes are removed once the cache grows beyond
+params['bake_cache_gb'] gigabytes, together with temporary files left by
+jobs which were killed while storing a bake.
+"""
+
+
+BAKE_CACHE_DIR = os.path.expanduser('~/.cache/blender_bakes')
+BAKE_CACHE_GB = 20
+# temporary files of stored bakes older than this were left by killed jobs
+STALE_TMP_SECONDS = 24 * 3600
+
+
+def hash_inputs(inputs):
+    """Get the hex digest of a nested structure of dictionaries, lists,
+    numbers, strings and NumPy arrays, independent of dictionary order."""
+    h = hashlib.sha256()
+
+    def update(value):
+        if isinstance(value, dict):
+            h.update(b'{')
+            for k in sorted(value):
+                update(str(k))
+                update(value[k])
+            h.update(b'}')
+        elif isinstance(value, (list, tuple)):
+            h.update(b'[')
+            for v in value:
+                update(v)
+            h.update(b']')
+        elif isinstance(value, np.ndarray):
+            # hash values, not the memory layout
+            value = np.ascontiguousarray(value, dtype=float)
+            h.update(repr(value.shape).encode())
+            h.update(value.tobytes())
+        else:
+            h.update(json.dumps(value).encode())
+            h.update(b';')
+
+    update(inputs)
+    return h.hexdigest()
+
+
+def animation_inputs(obj):
+    """Get the keyframes of an object's animation, which set up initial
+    velocities and kinematic switches, as {data_path[index]: array}."""
+    if obj.animation_data is None or obj.animation_data.action is None:
+        return {}
+    keys = {}
+    for fc in obj.animation_data.action.fcurves:
+        co = np.empty(2 * len(fc.keyframe_points))
+        fc.keyframe_points.foreach_get('co', co)
+        keys['{}[{}]'.format(fc.data_path, fc.array_index)] = co
+    return keys
+
+
+def scene_inputs(scene=None):
+    """Get everything a rigid body bake of a scene depends on: the solver
+    settings, gravity and frame range, and the transform, geometry size,
+    rigid body settings, force field and keyframes of every object taking
+    part in the simulation."""
+    scene = scene or C.scene
+    world = scene.rigidbody_world
+    inputs = {
+        'blender': bpy.app.version_string,
+        'frames': (scene.frame_start, scene.frame_end),
+        'gravity': tuple(scene.gravity),
+        'use_gravity': scene.use_gravity,
+        'world': None,
+        'objects': {},
+    }
+    if world is not None:
+        inputs['world'] = {
+            'steps_per_second': world.steps_per_second,
+            'solver_iterations': world.solver_iterations,
+            'time_scale': world.time_scale,
+            'use_split_impulse': world.use_split_impulse,
+            'frames': (world.point_cache.frame_start,
+                world.point_cache.frame_end),
+        }
+    for obj in scene.objects:
+        rb = obj.rigid_body
+        has_field = obj.field is not None and obj.field.type != 'NONE'
+        if rb is None and not has_field:
+            continue
+        entry = {
+            'matrix': np.array(obj.matrix_world),
+            'dimensions': tuple(obj.dimensions),
+            'animation': animation_inputs(obj),
+        }
+        if rb is not None:
+            entry['rigid_body'] = {k: getattr(rb, k) for k in (
+                'type', 'enabled', 'kinematic', 'mass', 'friction',
+                'restitution', 'collision_shape', 'collision_margin',
+                'use_margin', 'linear_damping', 'angular_damping')}
+        if has_field:
+            entry['field'] = {k: getattr(obj.field, k) for k in (
+                'type', 'strength', 'falloff_type', 'falloff_power')}
+        inputs['objects'][obj.name] = entry
+    return inputs
+
+
+def bake_key(scene=None, tune_frames=None):
+    """Get the cache key of the current scene's bake. Scenes built from the
+    same parameters and seed have the same key, wherever they were built.
+    With tune_frames, the key is of the bake after tune_solver_accuracy on
+    that many frames, which picks the same settings for the same scene, so
+    it can be looked up before tuning."""
+    inputs = scene_inputs(scene)
+    if tune_frames:
+        inputs['tune_frames'] = tune_frames
+    return hash_inputs(inputs)
+
+
+def cached_bake_path(key, cache_dir=BAKE_CACHE_DIR):
+    """Get the path of the cached baked scene with this key."""
+    return os.path.join(cache_dir, key + '.blend')
+
+
+def restore_bake(key, cache_dir=BAKE_CACHE_DIR, blend_path=''):
+    """Open the cached baked copy of the current scene if there is one and
+    return whether it was found. With a blend_path, the cached file is
+    copied there and the copy is opened, so later saves don't change the
+    cache."""
+    path = cached_bake_path(key, cache_dir)
+    if not os.path.isfile(path):
+        return False
+    # mark it as recently used for eviction
+    os.utime(path)
+    if blend_path:
+        blend_path = os.path.abspath(blend_path)
+        os.makedirs(os.path.dirname(blend_path), exist_ok=True)
+        shutil.copyfile(path, blend_path)
+        path = blend_path
+    bpy.ops.wm.open_mainfile(filepath=path)
+    return True
+
+
+def store_bake(key, cache_dir=BAKE_CACHE_DIR, max_gb=BAKE_CACHE_GB):
+    """Save a copy of the current, baked scene to the cache and evict the
+    least recently used bakes beyond max_gb gigabytes."""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = cached_bake_path(key, cache_dir)
+    # write to a temporary file so other jobs never open half a file
+    tmp_dir = os.path.join(cache_dir, 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp_path = os.path.join(tmp_dir, '{}_{}.blend'.format(key, os.getpid()))
+    bpy.ops.wm.save_as_mainfile(filepath=tmp_path, copy=True, compress=True)
+    os.replace(tmp_path, path)
+    evict_bakes(cache_dir, max_gb, keep=(path,))
+
+
+def remove_stale_tmp(cache_dir=BAKE_CACHE_DIR, max_age=STALE_TMP_SECONDS):
+    """Delete the temporary files in the cache which were last written more
+    than max_age seconds ago, left by jobs which never finished storing
+    their bake. Returns the list of deleted paths."""
+    tmp_dir = os.path.join(cache_dir, 'tmp')
+    if not os.path.isdir(tmp_dir):
+        return []
+    deleted = []
+    now = time.time()
+    for name in os.listdir(tmp_dir):
+        path = os.path.join(tmp_dir, name)
+        try:
+            if now - os.stat(path).st_mtime > max_age:
+                os.remove(path)
+                deleted.append(path)
+        except FileNotFoundError:
+            # renamed into the cache or removed by another job meanwhile
+            pass
+    return deleted
+
+
+def evict_bakes(cache_dir=BAKE_CACHE_DIR, max_gb=BAKE_CACHE_GB, keep=()):
+    """Delete stale temporary files (see remove_stale_tmp) and the least
+    recently used bakes in the cache until it holds at most max_gb
+    gigabytes, never deleting the paths in keep. Returns the list of
+    deleted paths."""
+    deleted = remove_stale_tmp(cache_dir)
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.endswith('.blend') and os.path.isfile(path):
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_gb * 2**30:
+            break
+        if path in keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # another job on the shared disk evicted it first
+            pass
+        total -= size
+        deleted.append(path)
+    return deleted
@@ -0,0 +1,157 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+"""
+Benchmark how the stages of the scene scripts scale with the number of
+particles and frames.
+
+Every run builds one scene in a fresh headless Blender process with
+--set benchmark_path=..., so finish_scene writes the wall time of each
+stage of the run (setup, spawn, animate, bake, save, export, render, see
+scene_builder.start_stage). The peak resident memory of the process is
+added, and all runs are saved to one JSON file:
+
+python benchmark.py results.json --scenes gas crystal --frames 100 250
+
+Runs are compared with an earlier results file, and slower stages or
+higher memory use are reported as regressions:
+
+python benchmark.py new.json --baseline results.json
+"""
+
+
+# scene script, parameter setting its size and sizes of every benchmark
+BENCHMARK_SCENES = {
+    'gas': ('blender_rigid_body_particles.py', 'gas_particle_num',
+        (30, 100, 300, 1000)),
+    'brownian': ('blender_brownian_motion.py', 'block_size',
+        (4, 8, 12, 16)),
+    'crystal': ('blender_crystal.py', 'atom_1d_num', (4, 6, 8, 10)),
+    'force': ('blender_sticky_particles.py', 'particle_num',
+        (10, 20, 40, 80)),
+}
+
+
+def run_benchmark(scene, size, frames, stages='build,bake', blender='blender',
+    work_dir=None):
+    """Build one benchmark scene with the given size parameter and number
+    of frames in a headless Blender process, running the given stages.
+    Returns the record of the run with the time of each stage, total
+    wall time and peak memory use in MB. Raises RuntimeError with the path
+    of the Blender log if the run fails."""
+    script, size_param, _ = BENCHMARK_SCENES[scene]
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), script)
+    work_dir = work_dir or tempfile.mkdtemp(prefix='benchmark_')
+    name = '{}_{}_{}'.format(scene, size, frames)
+    times_path = os.path.join(work_dir, name + '.json')
+    log_path = os.path.join(work_dir, name + '.log')
+    # without --python-exit-code, Blender exits with 0 if the script raises
+    cmd = [blender, '--background', '--python-exit-code', '1',
+        '--python', script, '--',
+        '--stages', stages,
+        '--set', '{}={}'.format(size_param, size),
+        '--set', 'end_kf={}'.format(frames),
+        '--set', 'seed=0',
+        '--set', 'bake_cache=',
+        '--set', 'benchmark_path=' + times_path,
+        '--set', 'blend_path=' + os.path.join(work_dir, name + '.blend'),
+        '--set', 'render_path=' + os.path.join(work_dir, name)]
+    start = time.perf_counter()
+    with open(log_path, 'w') as log:
+        proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+        # the resource usage of this process only, in kilobytes on Linux
+        _, status, usage = os.wait4(proc.pid, 0)
+    wall_time = time.perf_counter() - start
+    if os.WIFEXITED(status):
+        proc.returncode = os.WEXITSTATUS(status)
+    else:
+        proc.returncode = -os.WTERMSIG(status)
+    if proc.returncode or not os.path.isfile(times_path):
+        raise RuntimeError('Benchmark run {} failed with exit code {}, see {}'
+            .format(name, proc.returncode, log_path))
+    with open(times_path) as f:
+        stage_times = json.load(f)['stages']
+    return {
+        'scene': scene,
+        'size': size,
+        'frames': frames,
+        'stages': stage_times,
+        'wall_time': wall_time,
+        'peak_rss_mb': usage.ru_maxrss / 1024,
+    }
+
+
+def run_benchmarks(scenes=tuple(BENCHMARK_SCENES), sizes=None,
+    frames=(100,), stages='build,bake', blender='blender'):
+    """Run every scene at each of its sizes, or the given sizes, and each
+    number of frames. Returns the list of run records."""
+    work_dir = tempfile.mkdtemp(prefix='benchmark_')
+    results = []
+    for scene in scenes:
+        for size in sizes or BENCHMARK_SCENES[scene][2]:
+            for frame_num in frames:
+                record = run_benchmark(scene, size, frame_num, stages=stages,
+                    blender=blender, work_dir=work_dir)
+                print('{scene} size {size}, {frames} frames: '
+                    '{wall_time:.1f} s, {peak_rss_mb:.0f} MB'.format(**record))
+                results.append(record)
+    return results
+
+
+def compare_results(results, baseline, threshold=0.2, min_seconds=0.1):
+    """Get a list of regressions of results against baseline results:
+    stages which got slower, and peak memory which grew, by more than a
+    fraction threshold. Stage times within min_seconds are ignored as
+    noise."""
+    base_runs = {(r['scene'], r['size'], r['frames']): r for r in baseline}
+    regressions = []
+    for run in results:
+        base = base_runs.get((run['scene'], run['size'], run['frames']))
+        if base is None:
+            continue
+        label = '{} size {}, {} frames'.format(
+            run['scene'], run['size'], run['frames'])
+        for stage, seconds in sorted(run['stages'].items()):
+            old = base['stages'].get(stage)
+            if old is None or seconds - old < min_seconds:
+                continue
+            if seconds > (1 + threshold) * old:
+                regressions.append('{}: {} took {:.2f} s, was {:.2f} s'
+                    .format(label, stage, seconds, old))
+        if run['peak_rss_mb'] > (1 + threshold) * base['peak_rss_mb']:
+            regressions.append('{}: peak memory {:.0f} MB, was {:.0f} MB'
+                .format(label, run['peak_rss_mb'], base['peak_rss_mb']))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=(
+        'Benchmark the stages of the scene scripts at increasing size.'))
+    parser.add_argument('output', help='JSON file for the results')
+    parser.add_argument('--scenes', nargs='+', default=list(BENCHMARK_SCENES),
+        choices=list(BENCHMARK_SCENES))
+    parser.add_argument('--sizes', nargs='+', type=int, default=None,
+        help='size parameter values instead of the defaults of each scene')
+    parser.add_argument('--frames', nargs='+', type=int, default=[100])
+    parser.add_argument('--stages', default='build,bake')
+    parser.add_argument('--blender', default='blender')
+    parser.add_argument('--baseline', help='earlier results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    args = parser.parse_args()
+    results = run_benchmarks(args.scenes, sizes=args.sizes,
+        frames=args.frames, stages=args.stages, blender=args.blender)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=4)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_results(results, json.load(f),
+                threshold=args.threshold)
+        for line in regressions:
+            print('REGRESSION ' + line)
+        if regressions:
+            sys.exit(1)
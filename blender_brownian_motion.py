@@ -1,8 +1,19 @@
+import os
+import sys
 import numpy as np
 import bpy
 from bpy import data as D
 from bpy import context as C
 
+# make helper modules next to this script importable inside Blender
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from scene_builder import (add_light, scene_params, finish_scene,
+    start_stage)
+from particle_spawner import spawn_particles
+from keyframes import write_location_keyframes
+from trajectories import brownian_trajectory
+from point_cache import write_pc2, point_cache_particles
+
 """
 #~ PYTHON INTERACTIVE CONSOLE 3.7.4 (default, Oct  8 2019, 15:23:02)
 [GCC 6.3.1 20170216 (Red Hat 6.3.1-3)]
@@ -26,6 +37,21 @@ blender --background --python blender_molecules00.py
 #bpy.ops.rigidbody.world_add()
 
 
+# ------------------------------- PARAMETERS ---------------------------------
+
+# override any of these from the command line, for example:
+# blender --background --python blender_brownian_motion.py --
+#     --set end_kf=500 --set seed=0 --stages build,render
+params = scene_params({
+    'start_kf': 0,
+    'end_kf': 250,
+    'step_size': 0.5,
+    'block_size': 4,
+    # animate through a PC2 file at this path instead of keyframes
+    'point_cache_path': '',
+})
+
+
 # ---------------------- INITIALIZE ENVIRONMENT ----------------------
 
 # select all objects and delete them
@@ -33,8 +59,7 @@ bpy.ops.object.select_all(action='SELECT')
 bpy.ops.object.delete(use_global=False, confirm=False)
 
 # add light source
-bpy.ops.object.light_add(type='SUN', radius=1.0, location=(0, 2, 2))
-bpy.context.object.name = 'lamp'
+add_light(loc=(0, 2, 2))
 
 # add camera
 cam_pos = [0, 0, 30]
@@ -54,8 +79,8 @@ bpy.data.worlds["World"].node_tree.nodes["Background"].inputs[0].default_value =
 # -------------- INITIALIZE KEYFRAMES ------------------------------
 
 # set start and end keyframes
-bpy.context.scene.frame_start = 0
-bpy.context.scene.frame_end = 250
+bpy.context.scene.frame_start = params['start_kf']
+bpy.context.scene.frame_end = params['end_kf']
 
 # for animation, track current frame, specify desired number of key frames
 current_kf = bpy.context.scene.frame_start
@@ -65,53 +90,42 @@ bpy.context.scene.frame_set(current_kf)
 
 # ----------------- CREATE PARTICLES -------------------------------
 
+start_stage('spawn')
+
 # set current position
 x, y, z = 0, 0, 0
 
-mol_num = 0
-
-for i in range(4):
-    for j in range(4):
-        for k in range(4):
-
-            # add sphere
-            bpy.ops.mesh.primitive_uv_sphere_add(location=(x+i/20, y+j/20, z+k/20), radius=0.1)
-            # name sphere
-            bpy.context.object.name = 'particle_' + str(mol_num).zfill(3)
-            # set sphere rendering smooth
-            bpy.ops.object.shade_smooth()
-            # make sphere a rigid object
-            #bpy.context.scene.objects.active.rigid_body.type=True
-            #bpy.context.object.rigid_body.type=True
-            mol_num += 1
+# create a block of block_size**3 spheres in one pass
+n = params['block_size']
+locs = np.indices((n, n, n)).reshape(3, -1).T / 20 + [x, y, z]
+if not params['point_cache_path']:
+    spawn_particles(locs, radius=0.1, prefix='particle_')
 
 # get list of all particles
 particles = [p for p in bpy.data.objects if p.name.startswith('particle')]
 
-# initialize keyframes for each particle
-[p.keyframe_insert(data_path='location', frame=current_kf) for p in particles]
 
+# -------------- ANIMATE PARTICLES ------------------------------------------
 
-# increment the keyframe
-current_kf += 1
+start_stage('animate')
 
+# random walk of every particle over all frames after the starting frame
+trajectory = brownian_trajectory(
+    locs, params['end_kf'] - current_kf + 1,
+    step_size=params['step_size'], seed=params['seed'])
 
-# -------------- ANIMATE PARTICLES ------------------------------------------
+if params['point_cache_path']:
+    # move one point cloud of instanced spheres with a PC2 file
+    write_pc2(params['point_cache_path'], trajectory, frame_start=current_kf)
+    # the point cloud starts at the first frame of the file
+    start_stage('spawn')
+    point_cache_particles(params['point_cache_path'], radius=0.1,
+        name='particles', frame_start=current_kf)
+else:
+    # write all keyframes of each particle at once
+    write_location_keyframes(particles, trajectory, frame_start=current_kf)
+
+
+# -------------------------- PREPARE RENDER ----------------------------------
 
-for i in range(0, 250):
-    
-    # loop over each particle
-    for p in particles:
-        
-        # get current location of particle and translate it
-        current_location = p.location
-        # get new location of particle
-        translate_by = 0.5 * (np.random.random(3) - 0.5)
-        # translate particle
-        p.location = tuple(map(sum, zip(current_location, translate_by)))
-
-        # insert new keyframe
-        p.keyframe_insert(data_path='location', frame=current_kf)
-
-    # increment the keyframe
-    current_kf += 1
\ No newline at end of file
+finish_scene(params)
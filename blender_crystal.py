@@ -1,8 +1,22 @@
+import os
+import sys
 import numpy as np
 import bpy
 from bpy import data as D
 from bpy import context as C
 
+# make helper modules next to this script importable inside Blender
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from scene_builder import (delete_all_objects_and_materials, add_camera,
+    add_light, set_background, make_gas_material, set_rigid_body_accuracy,
+    scene_params, finish_scene, start_stage)
+from scene_template import base_scene
+from particle_spawner import spawn_particles
+from keyframes import write_location_keyframes
+from trajectories import brownian_trajectory
+from point_cache import write_pc2, point_cache_particles
+from lattice import lattice_coordinates
+
 """
 #~ PYTHON INTERACTIVE CONSOLE 3.7.4 (default, Oct  8 2019, 15:23:02)
 [GCC 6.3.1 20170216 (Red Hat 6.3.1-3)]
@@ -24,178 +38,58 @@ For obtaining location data from rigid body object at each keyframe:
 obj = bpy.data.objects["Cube"]
 print(obj.matrix_world.translation)
 
+For the locations of all particles on all frames of the bake at once, use
+trajectory_export.extract_trajectory, or run the bake stage with
+--set trajectory_path=/tmp/trajectory.npy
+
 """
 
 
+# ------------------------------- PARAMETERS ---------------------------------
 
-def delete_all_objects_and_materials():
-    """Delete all objects and materials. Run this
-    at the beginning of the script to clear the environment."""
-    # select all objects and delete them
-    bpy.ops.object.select_all(action='SELECT')
-    bpy.ops.object.delete(use_global=False, confirm=False)
-    # delete all physics bakes
-    bpy.ops.ptcache.free_bake_all()
-    # delete all materials
-    for material in D.materials:
-        material.user_clear()
-        D.materials.remove(material)
-
-
-
-def add_camera(loc=(0, 0, 20), rot=(0, 0, 0)):
-    """Add a camera to the scene."""
-    bpy.ops.object.camera_add(location=loc, rotation=rot)
-    C.object.name = 'cam'
-    C.scene.camera = D.objects['cam']
-
-
-
-def boundary_plane(size, loc=(0, 0, 0), rot=(0, 0, 0),
-    name=None, rigid_body_type='PASSIVE', mat=None):
-    """Create bounding plane for rigid body simulation."""
-    # create plane
-    bpy.ops.mesh.primitive_plane_add(
-        size=size, location=loc, rotation=rot)
-    # name it
-    if name:
-        C.object.name = name
-    # set material
-    if mat:
-        C.active_object.data.materials.append(mat)
-    # make it a rigid object
-    bpy.ops.rigidbody.objects_add()
-    C.object.rigid_body.type = rigid_body_type
-    # make collisions elastic
-    C.object.rigid_body.restitution = 1
-    C.object.rigid_body.friction = 0
-    C.object.rigid_body.collision_margin = 0.1
-    #C.object.rigid_body.mass = 100
-    bpy.ops.object.modifier_add(type='SOLIDIFY')
-    C.object.modifiers["Solidify"].thickness = 0.1
-    bpy.ops.object.modifier_apply(apply_as='DATA', modifier="Solidify")
-
-
-
-def create_bounding_box(plane_size=5):
-    """Create bounding box for rigid bodies by building 
-    transparent cube from multiple planes."""
-    # set location of each plane
-    plane_locs = ((0, 0, -plane_size/2), (0, 0, plane_size/2),
-        (-plane_size/2, 0, 0), (plane_size/2, 0, 0),
-        (0, -plane_size/2, 0), (0, plane_size/2, 0))
-    # set rotation of each plane
-    plane_rots = ((0, 0, 0), (0, 0, 0),
-        (0, np.pi/2, 0), (0, np.pi/2, 0),
-        (np.pi/2, 0, 0), (np.pi/2, 0, 0))
-    #set name of each plane
-    plane_names = ('plane_low_z', 'plane_high_z',
-        'plane_low_x', 'plane_high_x',
-        'plane_low_y', 'plane_high_y',)
-    # create transparent material
-    mat = make_transparent_material()
-    # create each plane
-    for p in range(len(plane_locs)):
-        boundary_plane(
-            plane_size,
-            loc=plane_locs[p],
-            rot=plane_rots[p],
-            name=plane_names[p],
-            mat=mat)
-
-
-def make_transparent_material(name='transparent'):
-    """Create a transparent material."""
-    mat = D.materials.new(name=name)
-    mat.use_nodes = True
-    mat.shadow_method = 'NONE'
-    mat.blend_method = 'HASHED'
-    mat.diffuse_color = (0, 0, 0, 0)
-    mat.node_tree.nodes["Principled BSDF"].inputs[18].default_value = 0
-    return mat
-
-
-def make_gas_material(rgb_alpha, name='gas'):
-    """Create a material for gas particles."""
-    mat = D.materials.new(name=name)
-    mat.use_nodes = True
-    mat_nodes = mat.node_tree.nodes["Principled BSDF"]
-    mat.diffuse_color = rgb_alpha
-    mat_nodes.inputs[0].default_value = rgb_alpha
-    mat_nodes.inputs[5].default_value = 0
-    mat.roughness = 1
-    mat.shadow_method = 'NONE'
-    return mat
-
-
-def create_particle(loc=(0, 0, 0), rot=(0, 0, 0), radius=1, name=None,
-    mat=None):
-    """Create a sphere to simulate a gas particle."""
-    bpy.ops.mesh.primitive_uv_sphere_add(
-        location=loc,
-        radius=radius)
-    bpy.ops.object.shade_smooth()
-    if name:
-        C.object.name = name
-    if mat:
-        C.active_object.data.materials.append(mat)
-
-
-def add_collision_properties(obj, mass=1):
-    """Turn a mesh object into a rigid body for elastic collisions."""
-    bpy.context.view_layer.objects.active = obj
-    C.object.rigid_body.restitution = 1
-    C.object.rigid_body.friction = 0
-    C.object.rigid_body.linear_damping = 0
-    C.object.rigid_body.angular_damping = 0
-    C.object.display.show_shadows = False
-    C.object.rigid_body.collision_margin = 0.1
-    C.object.rigid_body.collision_shape = 'SPHERE'
-    bpy.ops.object.modifier_add(type='SOLIDIFY')
-    C.object.modifiers["Solidify"].thickness = 0.05
-    bpy.ops.object.modifier_apply(apply_as='DATA', modifier="Solidify")
-    C.object.rigid_body.mass = mass
-
-
-def set_background(rgb_alpha=(0, 0, 0, 0)):
-    """Set the background color of the scene."""
-    bg = D.worlds["World"].node_tree.nodes["Background"]
-    bg.inputs[0].default_value = rgb_alpha
-
-
-def render(filepath="/home/eric/Desktop/blender_render"):
-    """Render the animation."""
-    C.scene.render.filepath = filepath
-    C.scene.render.image_settings.file_format = 'AVI_JPEG'
-    C.scene.render.image_settings.quality = 100
-    bpy.ops.ptcache.bake_all(bake=True)
-    bpy.ops.render.render('INVOKE_DEFAULT', animation=True)
+# override any of these from the command line, for example:
+# blender --background --python blender_crystal.py --
+#     --set atom_1d_num=10 --set seed=0 --stages build,render
+params = scene_params({
+    'start_kf': 0,
+    'end_kf': 250,
+    'atom_1d_num': 6,
+    'lattice_constant': 1.5,
+    'radius': 0.1,
+    'step_size': 0.05,
+    'steps_per_second': 300,
+    'solver_iterations': 50,
+    # animate the atoms through a PC2 file at this path, not keyframes
+    'point_cache_path': '',
+})
 
 
 # ---------------------------- INITIALIZE ENVIRONMENT ------------------------
 
 delete_all_objects_and_materials()
 
-add_camera(loc=(30, -30, 13), rot=(np.pi/2.5, 0, np.pi/4))
 
-# add light source
-bpy.ops.object.light_add(type='SUN', radius=1.0, location=(10, -10, 10))
-C.object.name = 'lamp'
+def build_base_scene():
+    """Add the camera, light and background."""
+    add_camera(loc=(30, -30, 13), rot=(np.pi/2.5, 0, np.pi/4))
 
-set_background(rgb_alpha=(1, 1, 1, 1))
+    # add light source
+    add_light(loc=(10, -10, 10))
 
-# set gravitational acceleration vector
-C.scene.gravity = [0, 0, 0]
+    set_background(rgb_alpha=(1, 1, 1, 1))
 
-#create_bounding_box(plane_size=10)
+    #create_bounding_box(plane_size=10)
 
 
+base_scene(build_base_scene, template_dir=params['base_scene_cache'])
 
+# set gravitational acceleration vector
+C.scene.gravity = [0, 0, 0]
 
 # ------------------------ INITIALIZE KEYFRAMES ------------------------------
 
 # set start and end keyframes
-start_kf, end_kf = 0, 250
+start_kf, end_kf = params['start_kf'], params['end_kf']
 C.scene.frame_start = start_kf
 C.scene.frame_end = end_kf
 # for animation, track current frame, specify desired number of key frames
@@ -212,45 +106,43 @@ C.scene.frame_set(current_kf)
 
 # --------------------------- CREATE ATOMS -------------------------------
 
+start_stage('spawn')
+
 
 mat = make_gas_material((0.8, 0.04, 0.05, 1))
-atom_1d_num = 6
-loc_list = np.arange(atom_1d_num) - (float(atom_1d_num)/2)
-
-atom_num = 0
-for i in loc_list:
-    for j in loc_list:
-        for k in loc_list:
-            create_particle(
-                loc=np.array([i, j, k])*1.5,
-                radius=0.1,
-                name='atom_1_'+str(atom_num).zfill(4),
-                mat=mat)
-            atom_num += 1
+atom_1d_num = params['atom_1d_num']
+a = params['lattice_constant']
+# simple cubic block of atoms like nested loops over np.arange(6) - 3
+locs = lattice_coordinates('sc', cells=atom_1d_num, a=a, center=False)
+locs -= a * atom_1d_num / 2
+if not params['point_cache_path']:
+    spawn_particles(
+        locs,
+        radius=params['radius'],
+        mats=mat,
+        prefix='atom_1_')
 
 atoms = [a for a in D.objects if a.name.startswith('atom_1_')]
 
 
 
-for a in atoms:
-    loc = a.location
-    current_kf = 0
-    for kf in range(250):
-        
-        translate_by = (np.random.random(3)-0.5) * 0.05
-        
-        a.location = tuple(map(sum, zip(loc, translate_by)))
-
-        a.keyframe_insert(data_path='location', frame=current_kf)
-
-        current_kf += 1
-    
-    
-    
-
-
-
 # --------------- ANIMATE PARTICLES ------------------------------------------
+
+start_stage('animate')
+
+# random walk of each atom from its lattice site over all frames
+trajectory = brownian_trajectory(
+    locs, end_kf - start_kf,
+    step_size=params['step_size'], seed=params['seed'])
+if params['point_cache_path']:
+    # move one point cloud of instanced atoms with a PC2 file
+    write_pc2(params['point_cache_path'], trajectory, frame_start=start_kf)
+    # the point cloud starts at the first frame of the file
+    start_stage('spawn')
+    point_cache_particles(params['point_cache_path'],
+        radius=params['radius'], mat=mat, name='atom_1', frame_start=start_kf)
+else:
+    write_location_keyframes(atoms, trajectory, frame_start=start_kf)
 '''
 # create initial keyframe state of each particle
 for p in particles:
@@ -349,7 +241,7 @@ for p in plumes:
 C.scene.frame_start = start_kf
 C.scene.frame_end = end_kf
 # increase rigid body accuracy so objects don't pass through each other
-C.scene.rigidbody_world.steps_per_second = 300
-C.scene.rigidbody_world.solver_iterations = 50
+set_rigid_body_accuracy(
+    params['steps_per_second'], params['solver_iterations'])
 
-#render()
+finish_scene(params)
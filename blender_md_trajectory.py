@@ -0,0 +1,122 @@
+import os
+import sys
+import numpy as np
+import bpy
+from bpy import data as D
+from bpy import context as C
+
+# make helper modules next to this script importable inside Blender
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from scene_builder import (delete_all_objects_and_materials, add_camera,
+    add_light, set_background, scene_params, finish_scene, start_stage)
+from scene_template import base_scene
+from particle_spawner import camera_sphere_lod, lod_sphere_mesh
+from md_import import (trajectory_chunks, spawn_atoms, import_trajectory,
+    write_point_caches, point_cache_clouds)
+
+"""
+Animate the atoms of a molecular dynamics trajectory from an XYZ or
+LAMMPS dump file, read in chunks of frames so long runs of many atoms
+don't have to fit in memory (see md_import):
+
+blender --background --python blender_md_trajectory.py --
+    --set trajectory_file=run.lammpstrj --set stride=10 --stages build,render
+
+With --set point_cache_dir=DIR, every species is animated as one point
+cloud through a PC2 file in that directory instead of keyframes per atom.
+
+The camera looks at the atoms from a distance of camera_distance times the
+size of the first frame. Give atom radii and colors by type as JSON in a
+config file, like {"radii": {"O": 0.3, "H": 0.15}}.
+"""
+
+
+# ------------------------------- PARAMETERS ---------------------------------
+
+params = scene_params({
+    'trajectory_file': '',
+    'format': None,
+    'chunk_frames': 100,
+    'stride': 1,
+    'max_frames': None,
+    'radius': 0.2,
+    'radii': None,
+    'colors': None,
+    'camera_distance': 2,
+    'point_cache_dir': '',
+})
+if not params['trajectory_file']:
+    sys.exit('Give the trajectory with --set trajectory_file=PATH')
+
+
+# ---------------------------- INITIALIZE ENVIRONMENT ------------------------
+
+delete_all_objects_and_materials()
+
+# types, center and size of the atoms on the first frame
+types, first = next(trajectory_chunks(params['trajectory_file'],
+    fmt=params['format'], chunk_frames=1))
+center = (first[0].min(axis=0) + first[0].max(axis=0)) / 2
+size = np.ptp(first[0], axis=0).max()
+
+
+def build_base_scene():
+    """Add the camera, light and background."""
+    distance = params['camera_distance'] * size
+    add_camera(loc=center + distance * np.array([1, -1, 0.6]),
+        rot=(np.pi/2.5, 0, np.pi/4))
+
+    # add light source
+    add_light(loc=center + distance * np.array([1, -1, 1]))
+
+    set_background(rgb_alpha=(1, 1, 1, 1))
+
+
+base_scene(build_base_scene, {'center': center, 'size': size,
+    'camera_distance': params['camera_distance']},
+    template_dir=params['base_scene_cache'])
+
+C.scene.frame_start = 0
+C.scene.frame_set(0)
+
+
+# --------------------------- CREATE ATOMS -------------------------------
+
+start_stage('spawn')
+
+# one sphere mesh for all atoms, as fine as their size on screen needs
+radius = max([params['radius']] + list((params['radii'] or {}).values()))
+segments, rings = camera_sphere_lod(radius, first[0], margin=size / 2)
+mesh = lod_sphere_mesh(segments, rings)
+atom_args = dict(
+    radius=params['radius'],
+    radii=params['radii'],
+    colors=params['colors'],
+    mesh=mesh)
+read_args = dict(
+    fmt=params['format'],
+    chunk_frames=params['chunk_frames'],
+    stride=params['stride'],
+    max_frames=params['max_frames'])
+if not params['point_cache_dir']:
+    atoms = spawn_atoms(types, first[0], **atom_args)
+
+# --------------- ANIMATE ATOMS ----------------------------------------------
+
+start_stage('animate')
+
+if params['point_cache_dir']:
+    # every species as one point cloud moved by its own PC2 file
+    paths = write_point_caches(params['trajectory_file'],
+        params['point_cache_dir'], **read_args)
+    # the point clouds start at the first frame of their files
+    start_stage('spawn')
+    atoms = point_cache_clouds(paths, **atom_args)
+else:
+    # append the keyframes chunk by chunk
+    import_trajectory(params['trajectory_file'], atoms=atoms, **read_args)
+
+
+# -------------------------- PREPARE RENDER ----------------------------------
+
+finish_scene(params)
@@ -1,8 +1,21 @@
+import os
+import sys
 import numpy as np
 import bpy
 from bpy import data as D
 from bpy import context as C
 
+# make helper modules next to this script importable inside Blender
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from scene_builder import (delete_all_objects_and_materials, add_camera,
+    add_light, set_background, boundary_plane, make_gas_material,
+    create_force_particle, set_rigid_body_accuracy, scene_params, finish_scene,
+    start_stage)
+from scene_template import base_scene
+from particle_spawner import spawn_particles
+from keyframes import write_location_keyframes
+from nbody import integrate_forces
+
 """
 #~ PYTHON INTERACTIVE CONSOLE 3.7.4 (default, Oct  8 2019, 15:23:02)
 [GCC 6.3.1 20170216 (Red Hat 6.3.1-3)]
@@ -24,222 +37,56 @@ For obtaining location data from rigid body object at each keyframe:
 obj = bpy.data.objects["Cube"]
 print(obj.matrix_world.translation)
 
-"""
+For the locations of all particles on all frames of the bake at once, use
+trajectory_export.extract_trajectory, or run the bake stage with
+--set trajectory_path=/tmp/trajectory.npy
 
+"""
 
-def delete_all_objects_and_materials():
-    """Delete all objects and materials. Run this
-    at the beginning of the script to clear the environment."""
-    # select all objects and delete them
-    bpy.ops.object.select_all(action='SELECT')
-    bpy.ops.object.delete(use_global=False, confirm=False)
-    # delete all materials
-    for material in D.materials:
-        material.user_clear()
-        D.materials.remove(material)
-    # delete all physics bakes    
-    bpy.ops.ptcache.free_bake_all()
-
-
-
-def add_camera(loc=(0, 0, 20), rot=(0, 0, 0)):
-    """Add a camera to the scene."""
-    bpy.ops.object.camera_add(location=loc, rotation=rot)
-    C.object.name = 'cam'
-    C.scene.camera = D.objects['cam']
-
-
-
-def boundary_plane(size, loc=(0, 0, 0), rot=(0, 0, 0),
-    name=None, bounciness=0, rigid_body_type='PASSIVE', mat=None):
-    """Create bounding plane for rigid body simulation."""
-    # create plane
-    bpy.ops.mesh.primitive_plane_add(
-        size=size, location=loc, rotation=rot)
-    # name it
-    if name:
-        C.object.name = name
-    # set material
-    if mat:
-        C.active_object.data.materials.append(mat)
-    # make it a rigid object
-    bpy.ops.rigidbody.objects_add()
-    C.object.rigid_body.type = rigid_body_type
-    # make collisions elastic
-    C.object.rigid_body.restitution = bounciness
-    C.object.rigid_body.friction = 1
-    C.object.rigid_body.collision_margin = 0.1
-    #C.object.rigid_body.mass = 100
-    bpy.ops.object.modifier_add(type='SOLIDIFY')
-    C.object.modifiers["Solidify"].thickness = 0.1
-    bpy.ops.object.modifier_apply(apply_as='DATA', modifier="Solidify")
-
-
-
-def create_bounding_box(plane_size=5):
-    """Create bounding box for rigid bodies by building 
-    transparent cube from multiple planes."""
-    # set location of each plane
-    plane_locs = ((0, 0, -plane_size/2), (0, 0, plane_size/2),
-        (-plane_size/2, 0, 0), (plane_size/2, 0, 0),
-        (0, -plane_size/2, 0), (0, plane_size/2, 0))
-    # set rotation of each plane
-    plane_rots = ((0, 0, 0), (0, 0, 0),
-        (0, np.pi/2, 0), (0, np.pi/2, 0),
-        (np.pi/2, 0, 0), (np.pi/2, 0, 0))
-    #set name of each plane
-    plane_names = ('plane_low_z', 'plane_high_z',
-        'plane_low_x', 'plane_high_x',
-        'plane_low_y', 'plane_high_y',)
-    # create transparent material
-    mat = make_transparent_material()
-    # create each plane
-    for p in range(len(plane_locs)):
-        boundary_plane(
-            plane_size,
-            loc=plane_locs[p],
-            rot=plane_rots[p],
-            name=plane_names[p],
-            mat=mat)
-
-
-def make_transparent_material(name='transparent'):
-    """Create a transparent material."""
-    mat = D.materials.new(name=name)
-    mat.use_nodes = True
-    mat.shadow_method = 'NONE'
-    mat.blend_method = 'HASHED'
-    mat.diffuse_color = (0, 0, 0, 0)
-    mat.node_tree.nodes["Principled BSDF"].inputs[18].default_value = 0
-    return mat
-
-
-def make_gas_material(rgb_alpha, name='gas'):
-    """Create a material for gas particles."""
-    mat = D.materials.new(name=name)
-    mat.use_nodes = True
-    mat_nodes = mat.node_tree.nodes["Principled BSDF"]
-    mat.diffuse_color = rgb_alpha
-    mat_nodes.inputs[0].default_value = rgb_alpha
-    mat_nodes.inputs[5].default_value = 0
-    mat.roughness = 1
-    mat.shadow_method = 'NONE'
-    return mat
-
-
-def create_particle(loc=(0, 0, 0), rot=(0, 0, 0), radius=1, name=None,
-    mat=None):
-    """Create a sphere to simulate a gas particle."""
-    bpy.ops.mesh.primitive_uv_sphere_add(
-        location=loc,
-        radius=radius)
-    bpy.ops.object.shade_smooth()
-    if name:
-        C.object.name = name
-    if mat:
-        C.active_object.data.materials.append(mat)
-
-
-def add_collision_properties(obj, mass=1, bounciness=0,
-        friction=0.1, ):
-    """Turn a mesh object into a rigid body for elastic collisions."""
-    bpy.context.view_layer.objects.active = obj
-    C.object.rigid_body.restitution = bounciness
-    C.object.rigid_body.friction = 0.1
-    C.object.rigid_body.linear_damping = 0
-    C.object.rigid_body.angular_damping = 0
-    C.object.display.show_shadows = False
-    C.object.rigid_body.collision_margin = 0.5
-    C.object.rigid_body.collision_shape = 'SPHERE'
-    bpy.ops.object.modifier_add(type='SOLIDIFY')
-    C.object.modifiers["Solidify"].thickness = 0.05
-    bpy.ops.object.modifier_apply(apply_as='DATA', modifier="Solidify")
-    C.object.rigid_body.mass = mass
-
-
-def set_background(rgb_alpha=(0, 0, 0, 0)):
-    """Set the background color of the scene."""
-    bg = D.worlds["World"].node_tree.nodes["Background"]
-    bg.inputs[0].default_value = rgb_alpha
-
-
-def render(filepath="/home/eric/Desktop/blender_render"):
-    """Render the animation."""
-    C.scene.render.filepath = filepath
-    C.scene.render.image_settings.file_format = 'AVI_JPEG'
-    C.scene.render.image_settings.quality = 100
-    bpy.ops.ptcache.bake_all(bake=True)
-    bpy.ops.render.render('INVOKE_DEFAULT', animation=True)
-
-
-def create_force_particle(loc=(0, 0, 0), radius=1,
-    p_name=None, mat=None, force=0, falloff=2, mass=1,
-    lin_damp=0.25, ang_damp=0.25):
-    """Create a sphere to simulate a particle with an inherent force.
-    Force can be positive or negative (repulsive or attractive) with falloff
-    exponent and linear and angular damping of particle motion."""
-    bpy.ops.mesh.primitive_uv_sphere_add(location=loc, radius=radius)
-    bpy.ops.object.shade_smooth()
-    if p_name:
-        C.object.name = p_name
-    if mat:
-        C.active_object.data.materials.append(mat)
-
-    # make particle a rigid body
-    bpy.ops.rigidbody.object_add() 
-    C.object.rigid_body.linear_damping = lin_damp
-    C.object.rigid_body.angular_damping = ang_damp
-    C.object.rigid_body.mass = mass
-
-    
-    # add collision properties
-    bpy.ops.object.modifier_add(type='COLLISION')
-    C.object.collision.stickiness = 0.2
-    C.object.collision.damping_factor = 0.2
-    C.object.collision.friction_factor = 0.2
-
-    
-    
-    # create force field
-    if force != 0:
-        bpy.ops.object.effector_add(
-            type='FORCE',
-            enter_editmode=False,
-            location=loc)
-        C.object.field.strength = force
-        C.object.field.falloff_power = falloff
-        f_name = p_name + '_force_' + str(i).zfill(3)
-        C.object.name = f_name
-        # parent force to particle
-        bpy.ops.object.select_all(action='DESELECT')
-        # select particle and force field and parent them
-        p = bpy.context.scene.objects.get(p_name)
-        f = bpy.context.scene.objects.get(f_name)
-        p.select_set(True)
-        f.select_set(True)
-        C.view_layer.objects.active = p
-        bpy.ops.object.parent_set(type='OBJECT')
 
+# ------------------------------- PARAMETERS ---------------------------------
+
+# override any of these from the command line, for example:
+# blender --background --python blender_sticky_particles.py --
+#     --set force=-200 --set particle_num=50 --stages build,bake,render
+params = scene_params({
+    'start_kf': 0,
+    'end_kf': 500,
+    'gravity': (0, 0, -5),
+    'particle_num': 10,
+    'force': -30,
+    'heavy_particle_num': 5,
+    'heavy_force': -200,
+    'heavy_mass': 25,
+    'radius': 0.2,
+    'precompute_forces': False,
+    'steps_per_second': 500,
+    'solver_iterations': 150,
+    'stages': 'build,bake',
+})
 
 
 # ---------------------------- INITIALIZE ENVIRONMENT ------------------------
 
 delete_all_objects_and_materials()
 
-add_camera(loc=(0, -24, 14), rot=(np.pi/3, 0, 0))#(np.pi/2.5, 0, np.pi/2))
 
-# add light source
-bpy.ops.object.light_add(type='SUN', radius=1.0, location=(0, -10, 10))
-C.object.name = 'lamp'
+def build_base_scene():
+    """Add the camera, light and background."""
+    add_camera(loc=(0, -24, 14), rot=(np.pi/3, 0, 0))#(np.pi/2.5, 0, np.pi/2))
 
-set_background(rgb_alpha=(0, 0, 0, -10))
+    # add light source
+    add_light(loc=(0, -10, 10))
 
+    set_background(rgb_alpha=(0, 0, 0, -10))
 
 
+base_scene(build_base_scene, template_dir=params['base_scene_cache'])
+
 # ------------------------ INITIALIZE KEYFRAMES ------------------------------
 
 # set start and end keyframes
-start_kf, end_kf = 0, 500
+start_kf, end_kf = params['start_kf'], params['end_kf']
 C.scene.frame_start = start_kf
 C.scene.frame_end = end_kf
 # for animation, track current frame, specify desired number of key frames
@@ -250,39 +97,68 @@ C.scene.frame_set(current_kf)
 # set gravitational acceleration vector
 bpy.context.scene.use_gravity = False
 bpy.context.scene.use_gravity = True
-C.scene.gravity = [0, 0, -5]
+C.scene.gravity = params['gravity']
 
 # --------------------- ADD PLANE TO SERVE AS FLOOR --------------------------
 
-boundary_plane(40, name='floor')
+boundary_plane(40, name='floor', bounciness=0, friction=1)
 
 # -------------------------- CREATE PARTICLES --------------------------------
 
-mat1 = make_gas_material((0.8, 0.04, 0.05, 1))
-for i in range(10):
-    # set particle location, name
-    p_radius = 0.2
-    p_loc = np.append(8*(np.random.random(2) - 0.5), [p_radius+0.1])
-    p_name = 'particle_'+str(i).zfill(3)
-    
-    # create particle
-    create_force_particle(
-        loc=p_loc, radius=p_radius, p_name=p_name, force=-30, mat=mat1) 
-
-
-
+start_stage('spawn')
 
+# compute forces between particles with NumPy and write the motion to
+# keyframes, instead of baking a FORCE field effector on every particle.
+# a stiff contact repulsion stands in for the rigid body collisions, and
+# particles don't stick
+precompute_forces = params['precompute_forces']
 
+mat1 = make_gas_material((0.8, 0.04, 0.05, 1))
 mat2 = make_gas_material((0.05, 0.05, 0.8, 15))
-for i in range(5):
-    # set particle location, name
-    p_radius = 0.2
-    p_loc = 5*(np.random.random(3) - 0.5) + [0, 0, 80]
-    p_name = 'particle2_'+str(i).zfill(3)
-    
-    # create particle
-    create_force_particle(
-        loc=p_loc, radius=p_radius, p_name=p_name, force=-200, mass=25, mat=mat2) 
+p_radius = params['radius']
+n1, n2 = params['particle_num'], params['heavy_particle_num']
+
+if precompute_forces:
+    locs1 = np.column_stack((
+        8*(np.random.random((n1, 2)) - 0.5), np.full(n1, p_radius+0.1)))
+    locs2 = 5*(np.random.random((n2, 3)) - 0.5) + [0, 0, 80]
+    particles = spawn_particles(
+        locs1, radius=p_radius, mats=mat1, prefix='particle_')
+    particles += spawn_particles(
+        locs2, radius=p_radius, mats=mat2, prefix='particle2_')
+    trajectory = integrate_forces(
+        np.vstack((locs1, locs2)),
+        end_kf - start_kf + 1,
+        strengths=[params['force']]*n1 + [params['heavy_force']]*n2,
+        masses=[1]*n1 + [params['heavy_mass']]*n2,
+        lin_damp=0.25,
+        gravity=C.scene.gravity,
+        floor=p_radius,
+        fps=C.scene.render.fps / C.scene.render.fps_base,
+        steps_per_second=params['steps_per_second'],
+        contact_distance=2*p_radius)
+    write_location_keyframes(particles, trajectory, frame_start=start_kf)
+
+else:
+    for i in range(n1):
+        # set particle location, name
+        p_loc = np.append(8*(np.random.random(2) - 0.5), [p_radius+0.1])
+        p_name = 'particle_'+str(i).zfill(3)
+
+        # create particle
+        create_force_particle(
+            loc=p_loc, radius=p_radius, p_name=p_name,
+            force=params['force'], mat=mat1)
+
+    for i in range(n2):
+        # set particle location, name
+        p_loc = 5*(np.random.random(3) - 0.5) + [0, 0, 80]
+        p_name = 'particle2_'+str(i).zfill(3)
+
+        # create particle
+        create_force_particle(
+            loc=p_loc, radius=p_radius, p_name=p_name,
+            force=params['heavy_force'], mass=params['heavy_mass'], mat=mat2)
 
 
 
@@ -296,6 +172,8 @@ for i in range(5):
 
 
 # --------------- ANIMATE PARTICLES ------------------------------------------
+
+start_stage('animate')
 '''
 # create initial keyframe state of each particle
 for p in particles:
@@ -334,13 +212,10 @@ bpy.ops.ptcache.free_bake_all()
 C.scene.frame_start = start_kf
 C.scene.frame_end = end_kf
 # increase rigid body accuracy so objects don't pass through each other
-C.scene.rigidbody_world.steps_per_second = 500
-C.scene.rigidbody_world.solver_iterations = 150
-bpy.ops.ptcache.bake_all(bake=True)
-
-
+set_rigid_body_accuracy(
+    params['steps_per_second'], params['solver_iterations'])
 
-#render()
+finish_scene(params)
 
 # DELETE RIGID BODY WORLD AFTER EACH BAKE TO RESET CACHE
 #bpy.ops.rigidbody.world_remove()
\ No newline at end of file
@@ -0,0 +1,955 @@
+import os
+import sys
+import time
+import types
+import runpy
+import argparse
+from collections import Counter
+import numpy as np
+
+"""
+Pure-Python stand-in for the parts of the bpy API used by the scene scripts,
+so their scene construction can be run, tested and profiled without a
+Blender binary:
+
+import fake_bpy
+fake_bpy.install()
+runpy.run_path('blender_rigid_body_particles.py')
+fake_bpy.print_report()
+
+Or from a shell, with scene parameters after '--' as usual:
+
+python fake_bpy.py blender_rigid_body_particles.py -- --set end_kf=100
+
+Nothing is drawn or simulated. Operators, datablock creation, keyframe
+insertions and property assignments are counted in LEDGER, each with a
+simulated cost in seconds from COSTS. Operators pay for every object in
+the scene, like the depsgraph and name lookups of real operators do, so
+loops of operator calls show the same quadratic growth as in Blender.
+Baking only marks the point cache as baked, frame_set evaluates location
+keyframes by linear interpolation, and saving a .blend file writes a
+placeholder which can't be opened again. Scripts run from a shell have
+the bake cache turned off, unless it is given with --set bake_cache=DIR.
+"""
+
+
+# simulated seconds per call, roughly measured in Blender 2.8x
+COSTS = {
+    'op': 5e-4,
+    'op_per_object': 2e-6,
+    'op_per_vertex': 1e-7,
+    'property': 1e-6,
+    'new_id': 2e-5,
+    'new_id_per_id': 5e-8,
+    'foreach_per_item': 1e-8,
+    'keyframe_insert': 5e-5,
+    'frame_set': 1e-4,
+    'frame_set_per_object': 1e-6,
+    'bake_per_body_step': 2e-7,
+    'render_per_frame': 0.5,
+}
+
+# calls and simulated cost per kind of call, and the event log
+LEDGER = {'calls': Counter(), 'cost': Counter(), 'events': []}
+
+# keep a log of operator calls, new datablocks and keyframes
+RECORD_EVENTS = True
+
+
+def record(name, cost, event=None):
+    """Count a call and its simulated cost in the ledger."""
+    LEDGER['calls'][name] += 1
+    LEDGER['cost'][name] += cost
+    if event is not None and RECORD_EVENTS:
+        LEDGER['events'].append((name,) + event)
+
+
+def reset_ledger():
+    """Clear all counted calls, costs and events."""
+    LEDGER['calls'].clear()
+    LEDGER['cost'].clear()
+    del LEDGER['events'][:]
+
+
+# ------------------------------- DATA TYPES ---------------------------------
+
+class Vector(list):
+    """Vector or color like mathutils.Vector."""
+
+    x = property(lambda self: self[0])
+    y = property(lambda self: self[1])
+    z = property(lambda self: self[2])
+
+
+class Matrix(list):
+    """Rows of a 4x4 matrix like mathutils.Matrix."""
+
+    @property
+    def translation(self):
+        return Vector(row[3] for row in self[:3])
+
+
+VECTOR_PROPS = {'location', 'rotation_euler', 'scale', 'gravity',
+    'diffuse_color', 'default_value'}
+
+
+class Struct:
+    """RNA struct which records assignments to its properties."""
+
+    def __init__(self, **props):
+        for k, v in props.items():
+            object.__setattr__(self, k, v)
+
+    def __setattr__(self, name, value):
+        rna = self.__dict__.get('rna', type(self).__name__)
+        record('property ' + rna + '.' + name, COSTS['property'])
+        if name in VECTOR_PROPS and np.ndim(value) == 1:
+            value = Vector(float(v) for v in value)
+        object.__setattr__(self, name, value)
+
+
+class Collection:
+    """bpy_prop_collection of structs, looked up by index or name."""
+
+    def __init__(self, items=()):
+        self.items = list(items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(list(self.items))
+
+    def __contains__(self, key):
+        if isinstance(key, str):
+            return any(item.name == key for item in self.items)
+        return key in self.items
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            for item in self.items:
+                if item.name == key:
+                    return item
+            raise KeyError('bpy_prop_collection[key]: key "{}" not found'
+                .format(key))
+        return self.items[key]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [item.name for item in self.items]
+
+    def values(self):
+        return list(self.items)
+
+    def foreach_get(self, attr, seq):
+        record('foreach_get', COSTS['foreach_per_item'] * len(self.items))
+        # matrices are stored column by column like in Blender
+        values = np.array([np.ravel(np.transpose(getattr(item, attr)))
+            for item in self.items], dtype=float).ravel()
+        seq[:len(values)] = values
+
+    def foreach_set(self, attr, seq):
+        record('foreach_set', COSTS['foreach_per_item'] * len(self.items))
+        values = np.reshape(np.asarray(seq), (len(self.items), -1))
+        for item, value in zip(self.items, values):
+            object.__setattr__(item, attr,
+                value[0] if len(value) == 1 else Vector(value))
+
+
+class ID(Struct):
+    """Datablock with a name which is unique in its bpy.data collection."""
+
+    use_fake_user = False
+
+    @property
+    def users(self):
+        """Number of objects, meshes and animations using this datablock."""
+        users = 0
+        for obj in DATA.objects:
+            anim = obj.animation_data
+            users += obj.data is self
+            users += anim is not None and anim.action is self
+        for mesh in DATA.meshes:
+            users += sum(mat is self for mat in mesh.materials)
+        return users
+
+    def __setattr__(self, name, value):
+        if name == 'name' and getattr(self, 'registry', None) is not None:
+            value = self.registry.unique_name(value, exclude=self)
+        Struct.__setattr__(self, name, value)
+
+    # custom properties, like obj['key'] in Blender
+    def __getitem__(self, key):
+        return self.__dict__.setdefault('id_props', {})[key]
+
+    def __setitem__(self, key, value):
+        record('custom property', COSTS['property'])
+        self.__dict__.setdefault('id_props', {})[key] = value
+
+    def get(self, key, default=None):
+        return self.__dict__.get('id_props', {}).get(key, default)
+
+
+class DataCollection(Collection):
+    """Collection of datablocks in bpy.data."""
+
+    def __init__(self, factory):
+        Collection.__init__(self)
+        self.factory = factory
+
+    def unique_name(self, name, exclude=None):
+        """Add a .001 style suffix to a name which is already taken."""
+        names = {item.name for item in self.items if item is not exclude}
+        unique, n = name, 0
+        while unique in names:
+            n += 1
+            unique = '{}.{:03d}'.format(name, n)
+        return unique
+
+    def new(self, name, *args, **kwargs):
+        record('new ' + self.factory.__name__, COSTS['new_id']
+            + COSTS['new_id_per_id'] * len(self.items),
+            event=(name,))
+        item = self.factory(*args, **kwargs)
+        object.__setattr__(item, 'name', self.unique_name(name))
+        object.__setattr__(item, 'registry', self)
+        self.items.append(item)
+        return item
+
+    def remove(self, item, do_unlink=True):
+        record('remove ' + self.factory.__name__, COSTS['new_id'])
+        self.discard(item)
+
+    def discard(self, item):
+        """Remove a datablock and unlink it from all collections."""
+        self.items.remove(item)
+        object.__setattr__(item, 'registry', None)
+        if isinstance(item, Object):
+            for collection in DATA.collections.items + [SCENE.collection]:
+                if item in collection.objects.items:
+                    collection.objects.items.remove(item)
+
+
+class Node(Struct):
+    """Shader node with numbered inputs."""
+
+    def __init__(self, name, input_num):
+        Struct.__init__(self, name=name, inputs=Collection(
+            Struct(name=str(i), default_value=0) for i in range(input_num)))
+
+
+class Material(ID):
+
+    def __init__(self):
+        ID.__init__(self, use_nodes=False, diffuse_color=Vector((1, 1, 1, 1)),
+            roughness=0.4, shadow_method='OPAQUE', blend_method='OPAQUE',
+            node_tree=Struct(nodes=Collection([
+                Node('Principled BSDF', 24), Node('Material Output', 3)])))
+
+    def user_clear(self):
+        record('user_clear', COSTS['property'])
+
+
+class World(ID):
+
+    def __init__(self):
+        ID.__init__(self, use_nodes=True, node_tree=Struct(
+            nodes=Collection([Node('Background', 2)])))
+
+
+class MeshElements(Collection):
+    """Vertices or polygons of a mesh, stored as NumPy attribute arrays."""
+
+    def __init__(self, widths):
+        Collection.__init__(self)
+        self.widths = widths
+        self.attrs = {k: np.zeros((0, w)) for k, w in widths.items()}
+
+    def __len__(self):
+        return len(next(iter(self.attrs.values())))
+
+    def __iter__(self):
+        return iter(range(len(self)))
+
+    def add(self, count):
+        for k, w in self.widths.items():
+            self.attrs[k] = np.concatenate(
+                [self.attrs[k], np.zeros((count, w))])
+
+    def foreach_get(self, attr, seq):
+        record('foreach_get', COSTS['foreach_per_item'] * len(self))
+        values = self.attrs[attr].ravel()
+        seq[:len(values)] = values
+
+    def foreach_set(self, attr, seq):
+        record('foreach_set', COSTS['foreach_per_item'] * len(self))
+        self.attrs[attr] = np.reshape(np.asarray(seq, dtype=float),
+            (len(self), self.widths[attr]))
+
+
+class Mesh(ID):
+
+    def __init__(self):
+        ID.__init__(self, vertices=MeshElements({'co': 3}),
+            loops=MeshElements({'vertex_index': 1}),
+            polygons=MeshElements({'use_smooth': 1, 'material_index': 1,
+                'loop_start': 1, 'loop_total': 1}),
+            materials=[], use_auto_smooth=False)
+
+    @property
+    def faces(self):
+        """Vertex indices of every polygon."""
+        index = self.loops.attrs['vertex_index'][:, 0].astype(int)
+        start = self.polygons.attrs['loop_start'][:, 0].astype(int)
+        total = self.polygons.attrs['loop_total'][:, 0].astype(int)
+        return [tuple(index[s:s+t]) for s, t in zip(start, total)]
+
+    def from_pydata(self, vertices, edges, faces):
+        record('from_pydata', COSTS['foreach_per_item'] * len(vertices))
+        self.vertices.attrs['co'] = np.reshape(
+            np.array(vertices, dtype=float), (-1, 3))
+        total = np.array([len(f) for f in faces], dtype=float)
+        self.loops.attrs['vertex_index'] = np.array(
+            [i for f in faces for i in f], dtype=float).reshape(-1, 1)
+        self.polygons.attrs = {k: np.zeros((len(faces), w))
+            for k, w in self.polygons.widths.items()}
+        self.polygons.attrs['loop_total'][:, 0] = total
+        self.polygons.attrs['loop_start'][:, 0] = np.cumsum(total) - total
+
+    def update(self, calc_edges=False):
+        record('mesh update', COSTS['op_per_vertex'] * len(self.vertices))
+
+
+class Action(ID):
+
+    def __init__(self):
+        ID.__init__(self, fcurves=FCurves())
+
+
+class KeyframePoints:
+    """Keyframes of an fcurve as an (n, 2) array of frames and values."""
+
+    def __init__(self):
+        self.co = np.zeros((0, 2))
+        self.points = []
+
+    def __len__(self):
+        return len(self.co)
+
+    def __iter__(self):
+        # keyframe point structs, which only keep their interpolation
+        self.points += [Struct(rna='Keyframe', interpolation='BEZIER')
+            for _ in range(len(self) - len(self.points))]
+        return iter(self.points[:len(self)])
+
+    def add(self, count):
+        self.co = np.concatenate([self.co, np.zeros((count, 2))])
+
+    def insert(self, frame, value):
+        keep = self.co[:, 0] != frame
+        self.co = np.concatenate([self.co[keep], [[frame, value]]])
+        self.co = self.co[np.argsort(self.co[:, 0], kind='stable')]
+
+    def foreach_get(self, attr, seq):
+        record('foreach_get', COSTS['foreach_per_item'] * len(self))
+        seq[:2 * len(self)] = self.co.ravel()
+
+    def foreach_set(self, attr, seq):
+        record('foreach_set', COSTS['foreach_per_item'] * len(self))
+        self.co = np.reshape(np.asarray(seq, dtype=float), (-1, 2))
+
+
+class FCurve(Struct):
+
+    def __init__(self, data_path, index=0, action_group=''):
+        Struct.__init__(self, data_path=data_path, array_index=index,
+            group=action_group, keyframe_points=KeyframePoints())
+
+    def evaluate(self, frame):
+        co = self.keyframe_points.co
+        return np.interp(frame, co[:, 0], co[:, 1]) if len(co) else 0
+
+    def update(self):
+        record('fcurve update', COSTS['foreach_per_item']
+            * len(self.keyframe_points))
+
+
+class FCurves(Collection):
+
+    def find(self, data_path, index=0):
+        for fc in self.items:
+            if fc.data_path == data_path and fc.array_index == index:
+                return fc
+        return None
+
+    def new(self, data_path, index=0, action_group=''):
+        fc = FCurve(data_path, index=index, action_group=action_group)
+        self.items.append(fc)
+        return fc
+
+    def remove(self, fc):
+        self.items.remove(fc)
+
+
+class Modifiers(Collection):
+
+    def new(self, name, type):
+        mod = Struct(name=name, type=type, thickness=0.01)
+        self.items.append(mod)
+        return mod
+
+    def remove(self, mod):
+        self.items.remove(mod)
+
+
+def euler_matrix(rot):
+    """Get the 3x3 rotation matrix of XYZ Euler angles."""
+    (cx, cy, cz), (sx, sy, sz) = np.cos(rot), np.sin(rot)
+    rx = np.array([[1, 0, 0], [0, cx, -sx], [0, sx, cx]])
+    ry = np.array([[cy, 0, sy], [0, 1, 0], [-sy, 0, cy]])
+    rz = np.array([[cz, -sz, 0], [sz, cz, 0], [0, 0, 1]])
+    return rz @ ry @ rx
+
+
+class Object(ID):
+
+    def __init__(self, object_data=None, type=None):
+        if type is None:
+            type = 'MESH' if isinstance(object_data, Mesh) else 'EMPTY'
+        ID.__init__(self, data=object_data, type=type,
+            location=Vector((0, 0, 0)), rotation_euler=Vector((0, 0, 0)),
+            scale=Vector((1, 1, 1)), parent=None, rigid_body=None,
+            animation_data=None, modifiers=Modifiers(),
+            collision=Struct(rna='CollisionSettings', stickiness=0,
+                damping_factor=0, friction_factor=0),
+            field=Struct(rna='FieldSettings', type='NONE', strength=1,
+                falloff_type='SPHERE', falloff_power=0),
+            display=Struct(rna='ObjectDisplay', show_shadows=True),
+            instance_type='NONE', hide_render=False, hide_viewport=False,
+            show_instancer_for_render=True,
+            show_instancer_for_viewport=True, selected=False, slots=[])
+
+    @property
+    def material_slots(self):
+        mats = self.data.materials if isinstance(self.data, Mesh) else []
+        for mat in mats[len(self.slots):]:
+            self.slots.append(Struct(rna='MaterialSlot', link='DATA',
+                material=mat))
+        return Collection(self.slots[:len(mats)])
+
+    @property
+    def matrix_world(self):
+        mat = np.eye(4)
+        mat[:3, :3] = euler_matrix(self.rotation_euler) * self.scale
+        mat[:3, 3] = self.location
+        if self.parent is not None:
+            mat = np.array(self.parent.matrix_world) @ mat
+        return Matrix(Vector(row) for row in mat.tolist())
+
+    @property
+    def dimensions(self):
+        if not isinstance(self.data, Mesh) or not len(self.data.vertices):
+            return Vector((0, 0, 0))
+        co = self.data.vertices.attrs['co']
+        return Vector(np.ptp(co, axis=0) * np.abs(self.scale))
+
+    def select_set(self, state):
+        record('select_set', COSTS['property'])
+        object.__setattr__(self, 'selected', bool(state))
+
+    def select_get(self):
+        return self.selected
+
+    def animation_data_create(self):
+        if self.animation_data is None:
+            object.__setattr__(self, 'animation_data', Struct(action=None))
+        return self.animation_data
+
+    def keyframe_insert(self, data_path, index=-1, frame=None):
+        if frame is None:
+            frame = SCENE.frame_current
+        *path, prop = data_path.split('.')
+        owner = self
+        for name in path:
+            owner = getattr(owner, name)
+        value = getattr(owner, prop)
+        values = list(value) if isinstance(value, list) else [value]
+        self.animation_data_create()
+        if self.animation_data.action is None:
+            self.animation_data.action = DATA.actions.new(self.name + 'Action')
+        fcurves = self.animation_data.action.fcurves
+        for i, v in enumerate(values):
+            if index >= 0 and i != index:
+                continue
+            fc = fcurves.find(data_path, index=i) or fcurves.new(
+                data_path, index=i)
+            fc.keyframe_points.insert(frame, float(v))
+        record('keyframe_insert', COSTS['keyframe_insert']
+            + COSTS['foreach_per_item'] * len(fcurves), event=(
+            self.name, data_path, frame))
+        return True
+
+
+class Scene(ID):
+
+    def __init__(self):
+        ID.__init__(self, frame_start=1, frame_end=250, frame_current=1,
+            gravity=Vector((0, 0, -9.81)), use_gravity=True, camera=None,
+            rigidbody_world=None, collection=SceneCollection(),
+            render=Struct(filepath='/tmp/', fps=24, fps_base=1,
+                resolution_x=1920, resolution_y=1080,
+                resolution_percentage=100, image_settings=Struct(
+                    file_format='PNG', quality=90)))
+
+    @property
+    def objects(self):
+        return Collection(self.collection.all_objects())
+
+    def frame_set(self, frame, subframe=0):
+        objects = self.collection.all_objects()
+        record('frame_set', COSTS['frame_set']
+            + COSTS['frame_set_per_object'] * len(objects))
+        object.__setattr__(self, 'frame_current', frame)
+        for obj in objects:
+            anim = obj.animation_data
+            if anim is None or anim.action is None:
+                continue
+            for fc in anim.action.fcurves:
+                if fc.data_path == 'location':
+                    obj.location[fc.array_index] = fc.evaluate(frame)
+
+
+class CollectionObjects(Collection):
+
+    def link(self, obj):
+        record('link', COSTS['new_id_per_id'] * len(self.items))
+        if obj in self.items:
+            raise RuntimeError('Object "{}" already in collection'.format(
+                obj.name))
+        self.items.append(obj)
+
+    def unlink(self, obj):
+        self.items.remove(obj)
+
+
+class SceneCollection(ID):
+
+    def __init__(self):
+        ID.__init__(self, objects=CollectionObjects(), children=Collection())
+
+    def all_objects(self):
+        objects = list(self.objects.items)
+        for child in self.children:
+            objects += [o for o in child.all_objects() if o not in objects]
+        return objects
+
+
+class LayerObjects(Collection):
+    """Objects of the view layer with the active object."""
+
+    def __init__(self):
+        Collection.__init__(self)
+        self.active = None
+
+    @property
+    def items(self):
+        return SCENE.collection.all_objects()
+
+    @items.setter
+    def items(self, value):
+        pass
+
+    @property
+    def selected(self):
+        return [obj for obj in self.items if obj.selected]
+
+
+class ViewLayer(Struct):
+
+    def __init__(self):
+        Struct.__init__(self, objects=LayerObjects(),
+            active_layer_collection=Struct(collection=SCENE.collection))
+
+    def update(self):
+        record('view_layer.update', COSTS['op_per_object']
+            * len(SCENE.collection.all_objects()))
+
+
+class Context(Struct):
+    """bpy.context, with the active object taken from the view layer."""
+
+    scene = property(lambda self: SCENE)
+    view_layer = property(lambda self: VIEW_LAYER)
+    collection = property(lambda self: SCENE.collection)
+    object = property(lambda self: VIEW_LAYER.objects.active)
+    active_object = property(lambda self: VIEW_LAYER.objects.active)
+    selected_objects = property(lambda self: VIEW_LAYER.objects.selected)
+    selected_editable_objects = selected_objects
+
+    def copy(self):
+        return {'scene': self.scene, 'view_layer': self.view_layer,
+            'active_object': self.active_object, 'object': self.object,
+            'selected_objects': self.selected_objects,
+            'selected_editable_objects': self.selected_editable_objects}
+
+
+# ------------------------------- OPERATORS ----------------------------------
+
+# implementations of operators by id, returning extra simulated cost
+OPERATORS = {}
+
+
+def operator(op_id):
+    """Register a function as the implementation of an operator."""
+    def register(func):
+        OPERATORS[op_id] = func
+        return func
+    return register
+
+
+def add_object(name, object_data=None, type=None, location=(0, 0, 0),
+    rotation=(0, 0, 0)):
+    """Add an object like the add operators do: linked to the active
+    collection, selected and active, with everything else deselected."""
+    for obj in SCENE.collection.all_objects():
+        object.__setattr__(obj, 'selected', False)
+    obj = DATA.objects.new(name, object_data)
+    if type is not None:
+        object.__setattr__(obj, 'type', type)
+    object.__setattr__(obj, 'location', Vector(map(float, location)))
+    object.__setattr__(obj, 'rotation_euler', Vector(map(float, rotation)))
+    object.__setattr__(obj, 'selected', True)
+    VIEW_LAYER.active_layer_collection.collection.objects.link(obj)
+    VIEW_LAYER.objects.active = obj
+    return obj
+
+
+def add_mesh_object(name, verts, faces, location, rotation=(0, 0, 0)):
+    mesh = DATA.meshes.new(name)
+    mesh.from_pydata(verts, [], faces)
+    add_object(name, mesh, location=location, rotation=rotation)
+    return COSTS['op_per_vertex'] * len(verts)
+
+
+@operator('mesh.primitive_uv_sphere_add')
+def primitive_uv_sphere_add(segments=32, ring_count=16, radius=1,
+    location=(0, 0, 0), rotation=(0, 0, 0), **kwargs):
+    from particle_spawner import uv_sphere_geometry
+    verts, faces = uv_sphere_geometry(segments=segments, rings=ring_count)
+    return add_mesh_object('Sphere', verts * radius, faces, location, rotation)
+
+
+@operator('mesh.primitive_cube_add')
+def primitive_cube_add(size=2, location=(0, 0, 0), rotation=(0, 0, 0),
+    **kwargs):
+    verts = (np.indices((2, 2, 2)).reshape(3, -1).T - 0.5) * size
+    faces = [(0, 1, 3, 2), (4, 6, 7, 5), (0, 4, 5, 1),
+        (2, 3, 7, 6), (0, 2, 6, 4), (1, 5, 7, 3)]
+    return add_mesh_object('Cube', verts, faces, location, rotation)
+
+
+@operator('mesh.primitive_plane_add')
+def primitive_plane_add(size=2, location=(0, 0, 0), rotation=(0, 0, 0),
+    **kwargs):
+    verts = [(x * size / 2, y * size / 2, 0)
+        for x, y in ((-1, -1), (1, -1), (1, 1), (-1, 1))]
+    return add_mesh_object('Plane', verts, [(0, 1, 2, 3)], location, rotation)
+
+
+@operator('object.camera_add')
+def camera_add(location=(0, 0, 0), rotation=(0, 0, 0), **kwargs):
+    camera = DATA.cameras.new('Camera')
+    # field of view of the default 50 mm lens
+    object.__setattr__(camera, 'angle', 0.6911)
+    add_object('Camera', camera, type='CAMERA',
+        location=location, rotation=rotation)
+
+
+@operator('object.light_add')
+def light_add(type='POINT', radius=1, location=(0, 0, 0), **kwargs):
+    light = DATA.lights.new('Light')
+    object.__setattr__(light, 'type', type)
+    add_object('Light', light, type='LIGHT', location=location)
+
+
+@operator('object.effector_add')
+def effector_add(type='FORCE', location=(0, 0, 0), **kwargs):
+    obj = add_object(type.capitalize(), type='EMPTY', location=location)
+    object.__setattr__(obj, 'field', Struct(rna='FieldSettings', type=type,
+        strength=1, falloff_type='SPHERE', falloff_power=0))
+
+
+@operator('object.select_all')
+def select_all(action='TOGGLE'):
+    objects = SCENE.collection.all_objects()
+    if action == 'TOGGLE':
+        action = 'DESELECT' if any(o.selected for o in objects) else 'SELECT'
+    for obj in objects:
+        state = not obj.selected if action == 'INVERT' else action == 'SELECT'
+        object.__setattr__(obj, 'selected', state)
+
+
+@operator('object.delete')
+def delete(use_global=False, confirm=True):
+    for obj in VIEW_LAYER.objects.selected:
+        if VIEW_LAYER.objects.active is obj:
+            VIEW_LAYER.objects.active = None
+        DATA.objects.remove(obj)
+
+
+@operator('object.shade_smooth')
+def shade_smooth():
+    for obj in VIEW_LAYER.objects.selected:
+        if isinstance(obj.data, Mesh):
+            obj.data.polygons.attrs['use_smooth'][:] = 1
+
+
+@operator('object.modifier_add')
+def modifier_add(type='SUBSURF'):
+    obj = VIEW_LAYER.objects.active
+    obj.modifiers.new(type.capitalize(), type)
+
+
+@operator('object.modifier_apply')
+def modifier_apply(apply_as='DATA', modifier=''):
+    obj = VIEW_LAYER.objects.active
+    mod = obj.modifiers[modifier]
+    obj.modifiers.remove(mod)
+    mesh = obj.data
+    if mod.type == 'SOLIDIFY' and isinstance(mesh, Mesh):
+        # a shell of the mesh doubles its vertices and faces
+        co = mesh.vertices.attrs['co']
+        n = len(co)
+        mesh.from_pydata(np.concatenate([co, co]).tolist(), [], mesh.faces
+            + [tuple(i + n for i in f) for f in mesh.faces])
+    return COSTS['op_per_vertex'] * len(mesh.vertices)
+
+
+@operator('object.parent_set')
+def parent_set(type='OBJECT', **kwargs):
+    active = VIEW_LAYER.objects.active
+    for obj in VIEW_LAYER.objects.selected:
+        if obj is not active:
+            object.__setattr__(obj, 'parent', active)
+
+
+@operator('object.join')
+def join(override=None):
+    override = override or {}
+    active = override.get('active_object', VIEW_LAYER.objects.active)
+    selected = override.get('selected_editable_objects',
+        VIEW_LAYER.objects.selected)
+    mesh = active.data
+    inverse = np.linalg.inv(active.matrix_world)
+    verts, faces = [], []
+    for obj in [active] + [o for o in selected if o is not active]:
+        # vertices in the space of the active object
+        mat = inverse @ np.array(obj.matrix_world)
+        co = obj.data.vertices.attrs['co'] @ mat[:3, :3].T + mat[:3, 3]
+        faces += [tuple(i + len(verts) for i in f) for f in obj.data.faces]
+        verts += co.tolist()
+        if obj is not active:
+            mesh.materials += [m for m in obj.data.materials
+                if m not in mesh.materials]
+            DATA.objects.remove(obj)
+    mesh.from_pydata(verts, [], faces)
+    return COSTS['op_per_vertex'] * len(verts)
+
+
+def add_rigid_body(obj, type='ACTIVE'):
+    if SCENE.rigidbody_world is None:
+        rigidbody_world_add()
+    object.__setattr__(obj, 'rigid_body', Struct(rna='RigidBodyObject',
+        type=type, enabled=True,
+        kinematic=False, mass=1, friction=0.5, restitution=0,
+        collision_shape='CONVEX_HULL', collision_margin=0.04,
+        use_margin=False, linear_damping=0.04, angular_damping=0.1))
+
+
+@operator('rigidbody.world_add')
+def rigidbody_world_add():
+    object.__setattr__(SCENE, 'rigidbody_world', Struct(
+        rna='RigidBodyWorld', steps_per_second=60, solver_iterations=10,
+        time_scale=1, use_split_impulse=False, point_cache=Struct(
+            rna='PointCache', frame_start=1, frame_end=250, is_baked=False)))
+
+
+@operator('rigidbody.world_remove')
+def rigidbody_world_remove():
+    object.__setattr__(SCENE, 'rigidbody_world', None)
+
+
+@operator('rigidbody.object_add')
+def rigidbody_object_add(type='ACTIVE'):
+    add_rigid_body(VIEW_LAYER.objects.active, type=type)
+
+
+@operator('rigidbody.objects_add')
+def rigidbody_objects_add(type='ACTIVE'):
+    for obj in VIEW_LAYER.objects.selected:
+        add_rigid_body(obj, type=type)
+
+
+@operator('ptcache.free_bake_all')
+def free_bake_all():
+    world = SCENE.rigidbody_world
+    if world is not None:
+        object.__setattr__(world.point_cache, 'is_baked', False)
+
+
+@operator('ptcache.bake_all')
+def bake_all(bake=True):
+    world = SCENE.rigidbody_world
+    if world is None or not bake or world.point_cache.is_baked:
+        return 0
+    object.__setattr__(world.point_cache, 'is_baked', True)
+    bodies = [obj for obj in SCENE.collection.all_objects() if obj.rigid_body]
+    cache = world.point_cache
+    steps = (cache.frame_end - cache.frame_start + 1) \
+        * world.steps_per_second / SCENE.render.fps
+    return (COSTS['bake_per_body_step'] * len(bodies) * steps
+        * world.solver_iterations)
+
+
+@operator('wm.save_as_mainfile')
+def save_as_mainfile(filepath='', **kwargs):
+    # a placeholder, so saved files can be copied and moved like real ones
+    with open(filepath, 'wb') as f:
+        f.write(b'fake_bpy placeholder\n')
+
+
+@operator('render.render')
+def render_render(*args, animation=False, **kwargs):
+    frames = SCENE.frame_end - SCENE.frame_start + 1 if animation else 1
+    return COSTS['render_per_frame'] * frames
+
+
+class Operator:
+    """Callable operator which records its calls and cost."""
+
+    def __init__(self, op_id):
+        self.op_id = op_id
+
+    def __call__(self, *args, **kwargs):
+        # execution context strings and override dictionaries come first
+        override = [a for a in args if isinstance(a, dict)]
+        impl = OPERATORS.get(self.op_id)
+        extra = 0
+        if impl is not None:
+            if self.op_id == 'object.join':
+                extra = impl(*override)
+            else:
+                extra = impl(**kwargs)
+        record('ops.' + self.op_id, COSTS['op'] + (extra or 0)
+            + COSTS['op_per_object'] * len(SCENE.collection.all_objects()),
+            event=(kwargs,))
+        return {'FINISHED'}
+
+
+class OperatorModule:
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, name):
+        return Operator(self.name + '.' + name)
+
+
+class Operators:
+
+    def __getattr__(self, name):
+        return OperatorModule(name)
+
+
+# ------------------------------- INSTALLATION -------------------------------
+
+DATA = SCENE = VIEW_LAYER = None
+
+
+def batch_remove(ids):
+    """Remove several datablocks from bpy.data at once."""
+    ids = list(ids)
+    record('batch_remove', COSTS['new_id'] + COSTS['new_id_per_id'] * len(ids))
+    for item in ids:
+        if VIEW_LAYER.objects.active is item:
+            VIEW_LAYER.objects.active = None
+        item.registry.discard(item)
+
+
+def reset():
+    """Start over with an empty file holding a scene with its world, like
+    the factory startup file without its cube, camera and light."""
+    global DATA, SCENE, VIEW_LAYER
+    DATA = types.SimpleNamespace(
+        objects=DataCollection(Object), meshes=DataCollection(Mesh),
+        materials=DataCollection(Material), worlds=DataCollection(World),
+        actions=DataCollection(Action), scenes=DataCollection(Scene),
+        collections=DataCollection(SceneCollection),
+        cameras=DataCollection(ID), lights=DataCollection(ID))
+    DATA.batch_remove = batch_remove
+    SCENE = DATA.scenes.new('Scene')
+    VIEW_LAYER = ViewLayer()
+    DATA.worlds.new('World')
+    if 'bpy' in sys.modules and hasattr(sys.modules['bpy'], 'fake'):
+        sys.modules['bpy'].data = DATA
+
+
+def install():
+    """Make 'import bpy' give this stand-in, with a fresh empty scene and
+    ledger. Modules which imported bpy before must be reloaded."""
+    reset()
+    reset_ledger()
+    bpy = types.ModuleType('bpy')
+    bpy.fake = True
+    bpy.data = DATA
+    bpy.context = Context()
+    bpy.ops = Operators()
+    bpy.app = types.SimpleNamespace(background=True, version=(2, 83, 0),
+        version_string='2.83.0 (fake)', binary_path='blender')
+    bpy.types = types.SimpleNamespace(Material=Material, Mesh=Mesh,
+        Object=Object, Scene=Scene)
+    sys.modules['bpy'] = bpy
+    # create_body.py imports bmesh without using it
+    sys.modules.setdefault('bmesh', types.ModuleType('bmesh'))
+    return bpy
+
+
+def report(top=None):
+    """Get the (name, calls, simulated seconds) of the recorded kinds of
+    calls, most costly first."""
+    rows = [(name, LEDGER['calls'][name], LEDGER['cost'][name])
+        for name in LEDGER['calls']]
+    rows.sort(key=lambda row: row[2], reverse=True)
+    return rows[:top]
+
+
+def print_report(top=20):
+    """Print the most costly kinds of calls and the total simulated time."""
+    print('{:<50} {:>9} {:>10}'.format('call', 'count', 'seconds'))
+    for name, calls, cost in report(top):
+        print('{:<50} {:>9} {:>10.3f}'.format(name[:50], calls, cost))
+    print('total simulated time {:.3f} s'.format(sum(LEDGER['cost'].values())))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=(
+        'Run a scene script against the fake bpy and report its calls.'))
+    parser.add_argument('script')
+    parser.add_argument('--top', type=int, default=20)
+    argv = sys.argv[1:]
+    script_args = argv[argv.index('--'):] if '--' in argv else []
+    args = parser.parse_args(argv[:len(argv) - len(script_args)])
+    install()
+    # scene scripts read their arguments after '--' like inside Blender,
+    # and later --set arguments override the bake cache being off
+    sys.argv = [args.script, '--', '--set', 'bake_cache='] + script_args[1:]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+    start = time.perf_counter()
+    runpy.run_path(args.script, run_name='__main__')
+    print_report(args.top)
+    print('real time {:.3f} s'.format(time.perf_counter() - start))
@@ -0,0 +1,161 @@
+import numpy as np
+
+try:
+    import bpy
+    from bpy import data as D
+    from bpy import context as C
+except ImportError:
+    # allow importing outside of Blender, where only NumPy code can run
+    bpy = D = C = None
+
+"""
+Write whole trajectories into location fcurves at once.
+
+Calling obj.keyframe_insert(data_path='location', frame=f) for every object
+and every frame costs one Python call (and one fcurve search and insert) per
+keyframe. write_location_keyframes instead fills the keyframe points of each
+location fcurve with a single foreach_set call:
+
+trajectory = np.zeros((250, len(particles), 3))
+write_location_keyframes(particles, trajectory, frame_start=0)
+
+Rigid bodies have no initial velocity setting. set_initial_velocities
+gives them one by animating them as kinematic bodies moving at that
+velocity for one frame, after which the simulation takes over, with a
+few keyframes on each of four fcurves per body and no operator calls:
+
+velocities = maxwell_boltzmann_velocities(len(particles), temperature=5)
+set_initial_velocities(particles, velocities, frame=0)
+"""
+
+
+def object_action(obj):
+    """Get the action of an object, creating it if it has none."""
+    if obj.animation_data is None:
+        obj.animation_data_create()
+    action = obj.animation_data.action
+    if action is None:
+        action = D.actions.new(name=obj.name + 'Action')
+        obj.animation_data.action = action
+    return action
+
+
+def replace_fcurve(obj, data_path, index=0, action_group=''):
+    """Get an empty fcurve of an object's action for data_path[index],
+    replacing any existing one."""
+    action = object_action(obj)
+    fc = action.fcurves.find(data_path, index=index)
+    if fc is not None:
+        action.fcurves.remove(fc)
+    return action.fcurves.new(data_path, index=index,
+        action_group=action_group)
+
+
+def location_fcurves(obj, replace=True):
+    """Get the x, y, z location fcurves of an object, replacing any existing
+    location animation with empty fcurves unless replace is False."""
+    if not replace:
+        action = object_action(obj)
+        fcurves = [action.fcurves.find('location', index=axis)
+            for axis in range(3)]
+        if all(fc is not None for fc in fcurves):
+            return fcurves
+    return [replace_fcurve(obj, 'location', index=axis,
+        action_group='Object Transforms') for axis in range(3)]
+
+
+def write_fcurve(fc, frames, values, interpolation=None):
+    """Write keyframes at the given frames and values into an empty
+    fcurve, optionally with the interpolation of every keyframe."""
+    co = np.column_stack((frames, values)).astype(float)
+    fc.keyframe_points.add(len(co))
+    fc.keyframe_points.foreach_set('co', co.ravel())
+    if interpolation is not None:
+        # enum properties can't be set with foreach_set
+        for point in fc.keyframe_points:
+            point.interpolation = interpolation
+    fc.update()
+
+
+def write_location_keyframes(objects, trajectory, frame_start=0):
+    """Animate the location of each object using a trajectory array of
+    shape (frames, N, 3), where N is the number of objects. One keyframe
+    is written per frame starting at frame_start."""
+    trajectory = np.asarray(trajectory, dtype=float)
+    if trajectory.ndim != 3 or trajectory.shape[1:] != (len(objects), 3):
+        raise ValueError('Trajectory shape {} does not match {} objects.'.format(
+            trajectory.shape, len(objects)))
+    frame_num = len(trajectory)
+    frames = frame_start + np.arange(frame_num, dtype=float)
+    # interleaved (frame, value) pairs for keyframe_points.foreach_set
+    co = np.empty((frame_num, 2))
+    co[:, 0] = frames
+    for i, obj in enumerate(objects):
+        for axis, fc in enumerate(location_fcurves(obj)):
+            co[:, 1] = trajectory[:, i, axis]
+            fc.keyframe_points.add(frame_num)
+            fc.keyframe_points.foreach_set('co', co.ravel())
+            # recalculate handles of the new keyframes
+            fc.update()
+        # leave the object at its location on the first frame
+        obj.location = trajectory[0, i]
+
+
+def append_location_keyframes(objects, trajectory, frame_start):
+    """Add the frames of a (frames, N, 3) trajectory array after the
+    existing location keyframes of each object, starting at frame_start,
+    so long trajectories can be written chunk by chunk without holding
+    them in memory. The existing keyframes are read back for each chunk,
+    so use chunks of many frames."""
+    trajectory = np.asarray(trajectory, dtype=float)
+    if trajectory.ndim != 3 or trajectory.shape[1:] != (len(objects), 3):
+        raise ValueError('Trajectory shape {} does not match {} objects.'
+            .format(trajectory.shape, len(objects)))
+    frame_num = len(trajectory)
+    new = np.empty((frame_num, 2))
+    new[:, 0] = frame_start + np.arange(frame_num)
+    for i, obj in enumerate(objects):
+        for axis, fc in enumerate(location_fcurves(obj, replace=False)):
+            points = fc.keyframe_points
+            # foreach_set can only write all keyframes of an fcurve
+            old = np.empty(2 * len(points))
+            points.foreach_get('co', old)
+            new[:, 1] = trajectory[:, i, axis]
+            points.add(frame_num)
+            points.foreach_set('co', np.concatenate((old, new.ravel())))
+            fc.update()
+
+
+def set_initial_velocities(objects, velocities, frame=0, kick_frames=1,
+    scene=None):
+    """Give rigid bodies an (N, 3) array of initial velocities in units
+    per second. Each body is kinematic from the given frame and moves
+    from its current location at its velocity for kick_frames frames,
+    after which the simulation takes over with that velocity. The
+    simulation only sees motion inside its point cache, so the kick
+    starts no earlier than the first cached frame. Any location
+    animation of the bodies is replaced."""
+    velocities = np.asarray(velocities, dtype=float)
+    if velocities.shape != (len(objects), 3):
+        raise ValueError('Velocities shape {} does not match {} objects.'
+            .format(velocities.shape, len(objects)))
+    if kick_frames < 1:
+        raise ValueError('kick_frames must be >= 1.')
+    scene = scene or C.scene
+    fps = scene.render.fps / scene.render.fps_base
+    if scene.rigidbody_world is not None:
+        # a kick ending on the first simulated frame leaves bodies at rest
+        frame = max(frame, scene.rigidbody_world.point_cache.frame_start)
+    frames = (frame, frame + kick_frames)
+    start = np.array([obj.location for obj in objects], dtype=float)
+    end = start + velocities * kick_frames / fps
+    # the kinematic flag is read at the end of each step, so the body
+    # stays kinematic through the last frame it is moved on
+    kinematic_frames = frames + (frame + kick_frames + 1,)
+    for i, obj in enumerate(objects):
+        # linear motion, so the body leaves at exactly its velocity
+        for axis, fc in enumerate(location_fcurves(obj)):
+            write_fcurve(fc, frames, (start[i, axis], end[i, axis]),
+                interpolation='LINEAR')
+        write_fcurve(replace_fcurve(obj, 'rigid_body.kinematic'),
+            kinematic_frames, (1, 1, 0), interpolation='CONSTANT')
@@ -0,0 +1,65 @@
+import numpy as np
+
+"""
+Crystal lattice coordinates computed with NumPy broadcasting.
+
+Every lattice is built from a conventional unit cell with a basis of atoms
+in fractional coordinates, which is repeated over a supercell of cells:
+
+locs = lattice_coordinates('fcc', cells=(10, 10, 10), a=1.5)
+spawn_particles(locs, radius=0.1, mats=mat, prefix='atom_1_')
+
+Supported lattices are simple cubic ('sc'), body-centered cubic ('bcc'),
+face-centered cubic ('fcc'), hexagonal close packed ('hcp') and 'diamond'.
+"""
+
+
+# atoms of each conventional unit cell in fractional coordinates
+LATTICE_BASES = {
+    'sc': [[0, 0, 0]],
+    'bcc': [[0, 0, 0], [0.5, 0.5, 0.5]],
+    'fcc': [[0, 0, 0], [0.5, 0.5, 0], [0.5, 0, 0.5], [0, 0.5, 0.5]],
+    'diamond': [[0, 0, 0], [0.5, 0.5, 0], [0.5, 0, 0.5], [0, 0.5, 0.5],
+        [0.25, 0.25, 0.25], [0.75, 0.75, 0.25],
+        [0.75, 0.25, 0.75], [0.25, 0.75, 0.75]],
+    # orthohexagonal cell of an ideal hcp lattice
+    'hcp': [[0, 0, 0], [0.5, 0.5, 0], [0, 1/3, 0.5], [0.5, 5/6, 0.5]],
+}
+
+
+def cell_lengths(lattice='sc', a=1):
+    """Get the x, y, z side lengths of the unit cell of a lattice with
+    lattice constant a. For hcp, a is the distance between neighbors."""
+    if lattice not in LATTICE_BASES:
+        raise ValueError('Lattice must be one of {}, not {}.'.format(
+            sorted(LATTICE_BASES), repr(lattice)))
+    if lattice == 'hcp':
+        return a * np.array([1, np.sqrt(3), np.sqrt(8/3)])
+    return a * np.ones(3)
+
+
+def lattice_coordinates(lattice='sc', cells=3, a=1, center=True,
+    vacancy=0, displacement=0, seed=None):
+    """Get an (N, 3) array of atom locations in a block of unit cells.
+    Cells can be one number of cells per axis or a tuple of x, y, z cell
+    numbers. Centered blocks have their atoms symmetric about the origin.
+    A fraction vacancy of the atoms is removed at random, and the rest are
+    moved by Gaussian noise with standard deviation displacement * a. The
+    seed can be an int or a numpy.random.Generator."""
+    if not 0 <= vacancy < 1:
+        raise ValueError('Vacancy fraction must be between 0 and 1.')
+    basis = np.array(LATTICE_BASES.get(lattice, []), dtype=float)
+    lengths = cell_lengths(lattice, a=a)
+    cells = np.broadcast_to(cells, (3,))
+    # origin of every unit cell, ordered like nested x, y, z loops
+    origins = np.indices(cells).reshape(3, -1).T
+    locs = ((origins[:, None, :] + basis) * lengths).reshape(-1, 3)
+    if center:
+        locs -= (locs.min(axis=0) + locs.max(axis=0)) / 2
+    if vacancy or displacement:
+        rng = np.random.default_rng(seed)
+        if vacancy:
+            locs = locs[rng.random(len(locs)) >= vacancy]
+        if displacement:
+            locs = locs + rng.normal(scale=displacement * a, size=locs.shape)
+    return locs
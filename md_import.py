@@ -0,0 +1,279 @@
+import os
+import itertools
+import numpy as np
+
+try:
+    import bpy
+    from bpy import context as C
+except ImportError:
+    # the trajectory readers also work outside of Blender
+    bpy = C = None
+
+from scene_builder import make_gas_material
+from particle_spawner import spawn_particles
+from keyframes import append_location_keyframes
+from point_cache import (open_pc2, append_pc2, finish_pc2, read_pc2_header,
+    point_cache_particles)
+
+"""
+Import trajectories of molecular dynamics codes in XYZ or LAMMPS dump
+format as animated particles, without loading the whole file.
+
+The file is read frame by frame and parsed in chunks of chunk_frames
+frames, so memory holds one chunk at a time however long the run is:
+
+for types, positions in trajectory_chunks('run.lammpstrj', chunk_frames=50):
+    print(positions.shape)  # (50, atoms, 3), the last chunk can be shorter
+
+import_trajectory spawns one sphere per atom with the material of its
+species from make_gas_material and appends the location keyframes of each
+chunk after the previous ones:
+
+atoms = import_trajectory('water.xyz', radii={'O': 0.3, 'H': 0.15},
+    stride=10)
+
+Blender keeps all those keyframes in memory and in the .blend. With
+import_point_cache each species instead becomes one point cloud moved by
+a PC2 file (see point_cache), written in the same single pass, and only
+the frame on screen is read.
+
+XYZ files hold the atom count, a comment line and one 'type x y z' line
+per atom for every frame. LAMMPS dumps need the id and type columns and
+unscaled (x, y, z), unwrapped (xu, yu, zu) or scaled (xs, ys, zs)
+coordinates of an orthogonal box.
+"""
+
+
+# colors of common elements in XYZ files, and of other species in turn
+ELEMENT_COLORS = {
+    'H': (0.9, 0.9, 0.9, 1),
+    'C': (0.2, 0.2, 0.2, 1),
+    'N': (0.05, 0.1, 0.8, 1),
+    'O': (0.8, 0.04, 0.05, 1),
+    'S': (0.9, 0.75, 0.1, 1),
+    'P': (0.9, 0.4, 0.0, 1),
+}
+SPECIES_COLORS = ((0.8, 0.04, 0.05, 1), (0, 0.02, 0.8, 1),
+    (0.05, 0.6, 0.1, 1), (0.9, 0.75, 0.1, 1), (0.5, 0.1, 0.7, 1),
+    (0.1, 0.6, 0.7, 1))
+
+# LAMMPS dump coordinate columns, with whether they are scaled to the box
+LAMMPS_COORDINATES = ((('x', 'y', 'z'), False), (('xu', 'yu', 'zu'), False),
+    (('xs', 'ys', 'zs'), True), (('xsu', 'ysu', 'zsu'), True))
+
+
+def trajectory_format(path):
+    """Guess the format of a trajectory file from its extension."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.xyz':
+        return 'xyz'
+    if ext in ('.dump', '.lammpstrj'):
+        return 'lammps'
+    raise ValueError('Unknown trajectory format of {}, give xyz or lammps.'
+        .format(path))
+
+
+def xyz_frames(f):
+    """Yield the atom lines of every frame of an open XYZ file."""
+    while True:
+        header = f.readline()
+        if not header.strip():
+            return
+        atom_num = int(header)
+        # comment line
+        f.readline()
+        yield [f.readline() for _ in range(atom_num)]
+
+
+def parse_xyz_frame(lines):
+    """Get the types and (N, 3) positions of the atom lines of an XYZ
+    frame."""
+    types = np.array([line.split(None, 1)[0] for line in lines])
+    positions = np.loadtxt(lines, usecols=(1, 2, 3), ndmin=2)
+    return types, positions
+
+
+def lammps_frames(f):
+    """Yield the column names, (3, 2) box bounds and atom lines of every
+    frame of an open LAMMPS dump file."""
+    while True:
+        line = f.readline()
+        if not line:
+            return
+        if not line.startswith('ITEM: TIMESTEP'):
+            continue
+        # timestep, then the number of atoms
+        f.readline()
+        f.readline()
+        atom_num = int(f.readline())
+        f.readline()
+        # only the low and high bounds, tilt factors are ignored
+        bounds = np.array([f.readline().split()[:2] for _ in range(3)],
+            dtype=float)
+        columns = f.readline().split()[2:]
+        yield columns, bounds, [f.readline() for _ in range(atom_num)]
+
+
+def parse_lammps_frame(frame):
+    """Get the types and (N, 3) positions, sorted by atom id, of a frame
+    of lammps_frames."""
+    columns, bounds, lines = frame
+    data = np.loadtxt(lines, ndmin=2)
+    if 'id' in columns:
+        data = data[np.argsort(data[:, columns.index('id')])]
+    for names, scaled in LAMMPS_COORDINATES:
+        if all(name in columns for name in names):
+            positions = data[:, [columns.index(name) for name in names]]
+            break
+    else:
+        raise ValueError('No atom coordinates in the dump columns {}.'
+            .format(columns))
+    if scaled:
+        positions = bounds[:, 0] + positions * (bounds[:, 1] - bounds[:, 0])
+    types = data[:, columns.index('type')].astype(int)
+    return types, positions
+
+
+def trajectory_chunks(path, fmt=None, chunk_frames=100, stride=1,
+    max_frames=None):
+    """Yield the atom types and the (frames, N, 3) positions of chunks of
+    up to chunk_frames frames of a trajectory file, reading every stride-th
+    frame and at most max_frames of them. Skipped frames are not parsed.
+    The atoms must be the same on every frame."""
+    fmt = fmt or trajectory_format(path)
+    if fmt == 'xyz':
+        read_frames, parse = xyz_frames, parse_xyz_frame
+    elif fmt == 'lammps':
+        read_frames, parse = lammps_frames, parse_lammps_frame
+    else:
+        raise ValueError("Format must be 'xyz' or 'lammps', not {}.".format(
+            repr(fmt)))
+    with open(path) as f:
+        frames = itertools.islice(read_frames(f), 0, None, stride)
+        frames = itertools.islice(frames, max_frames)
+        types = None
+        while True:
+            chunk = [parse(frame) for frame in
+                itertools.islice(frames, chunk_frames)]
+            if not chunk:
+                return
+            if types is None:
+                types = chunk[0][0]
+            for frame_types, _ in chunk:
+                if not np.array_equal(frame_types, types):
+                    raise ValueError('The atoms of {} change between frames.'
+                        .format(path))
+            yield types, np.stack([positions for _, positions in chunk])
+
+
+def species_materials(types, colors=None):
+    """Get a make_gas_material material for every species in an array of
+    atom types, as {str(type): material}. Colors can map types to RGBA
+    colors; other types get ELEMENT_COLORS or else SPECIES_COLORS in
+    turn."""
+    # types are looked up as strings, like keys of JSON parameters
+    colors = {str(k): v for k, v in (colors or {}).items()}
+    mats = {}
+    others = itertools.cycle(SPECIES_COLORS)
+    for species in np.unique(types).astype(str):
+        color = colors.get(species) or ELEMENT_COLORS.get(species) \
+            or next(others)
+        mats[species] = make_gas_material(color,
+            name='species_{}'.format(species))
+    return mats
+
+
+def spawn_atoms(types, positions, radius=0.2, radii=None, colors=None,
+    prefix='atom_', mesh=None):
+    """Spawn a sphere at each of the (N, 3) positions of atoms of the given
+    types, with the material of its species. Radii and colors can map atom
+    types to radii and RGBA colors, other types get radius and a color
+    from species_materials. Returns the list of atom objects."""
+    mats = species_materials(types, colors)
+    radii = {str(k): v for k, v in (radii or {}).items()}
+    names = np.asarray(types).astype(str)
+    return spawn_particles(positions,
+        radius=[radii.get(t, radius) for t in names],
+        mats=[mats[t] for t in names], prefix=prefix, mesh=mesh)
+
+
+def import_trajectory(path, fmt=None, chunk_frames=100, stride=1,
+    max_frames=None, frame_start=0, radius=0.2, radii=None, colors=None,
+    prefix='atom_', mesh=None, atoms=None):
+    """Animate the atoms of a trajectory file with one location keyframe
+    per read frame, from frame_start on, reading and writing chunk_frames
+    frames at a time. Without atoms, they are first spawned at their
+    positions on the first frame with spawn_atoms. Sets the end frame of
+    the scene and returns the list of atom objects, by id for LAMMPS
+    dumps."""
+    frame = frame_start
+    read = False
+    for types, positions in trajectory_chunks(path, fmt=fmt,
+        chunk_frames=chunk_frames, stride=stride, max_frames=max_frames):
+        if atoms is None:
+            atoms = spawn_atoms(types, positions[0], radius=radius,
+                radii=radii, colors=colors, prefix=prefix, mesh=mesh)
+        append_location_keyframes(atoms, positions, frame)
+        frame += len(positions)
+        read = True
+    if not read:
+        raise ValueError('No frames in {}.'.format(path))
+    C.scene.frame_end = frame - 1
+    return atoms
+
+
+def write_point_caches(path, cache_dir, fmt=None, chunk_frames=100,
+    stride=1, max_frames=None, frame_start=0, prefix='atoms_'):
+    """Write the positions of each species of a trajectory file to its own
+    PC2 file in cache_dir, chunk_frames frames at a time, starting at
+    frame_start. Returns the paths of the files by species."""
+    files = None
+    try:
+        for types, positions in trajectory_chunks(path, fmt=fmt,
+            chunk_frames=chunk_frames, stride=stride, max_frames=max_frames):
+            if files is None:
+                names = types.astype(str)
+                files = {species: open_pc2(
+                    os.path.join(cache_dir, prefix + species + '.pc2'),
+                    np.count_nonzero(names == species),
+                    frame_start=frame_start) for species in np.unique(names)}
+            for species, f in files.items():
+                append_pc2(f, positions[:, names == species])
+    finally:
+        for f in (files or {}).values():
+            finish_pc2(f)
+    if files is None:
+        raise ValueError('No frames in {}.'.format(path))
+    return {str(species): f.name for species, f in files.items()}
+
+
+def point_cache_clouds(paths, frame_start=0, radius=0.2, radii=None,
+    colors=None, prefix='atoms_', mesh=None):
+    """Create a point cloud of instanced spheres moved by the PC2 file of
+    each species in paths, like those of write_point_caches, with radii
+    and colors as for spawn_atoms. Sets the end frame of the scene and
+    returns the point cloud objects by species."""
+    mats = species_materials(list(paths), colors)
+    radii = {str(k): v for k, v in (radii or {}).items()}
+    clouds = {}
+    for species, path in paths.items():
+        clouds[species] = point_cache_particles(path,
+            radius=radii.get(species, radius), mat=mats[species],
+            name=prefix + species, frame_start=frame_start, mesh=mesh)
+    frame_num = read_pc2_header(next(iter(paths.values())))['frame_num']
+    C.scene.frame_end = frame_start + frame_num - 1
+    return clouds
+
+
+def import_point_cache(path, cache_dir, fmt=None, chunk_frames=100,
+    stride=1, max_frames=None, frame_start=0, radius=0.2, radii=None,
+    colors=None, prefix='atoms_', mesh=None):
+    """Like import_trajectory, but write the positions of each species to
+    its own PC2 file in cache_dir with write_point_caches, and animate it
+    as one point cloud of instanced spheres moved by that file. Returns
+    the point cloud objects by species."""
+    paths = write_point_caches(path, cache_dir, fmt=fmt,
+        chunk_frames=chunk_frames, stride=stride, max_frames=max_frames,
+        frame_start=frame_start, prefix=prefix)
+    return point_cache_clouds(paths, frame_start=frame_start, radius=radius,
+        radii=radii, colors=colors, prefix=prefix, mesh=mesh)
@@ -0,0 +1,155 @@
+import numpy as np
+
+from neighbors import (cell_list_pairs, build_neighbor_list,
+    update_neighbor_list)
+
+"""
+Offline integration of particles with inherent forces, as an alternative to
+the FORCE field effectors which create_force_particle parents to every
+particle. Blender evaluates every effector against every rigid body on
+every substep, which makes baking unusable above a few dozen particles.
+Here the same pairwise forces are computed with NumPy and the result is a
+trajectory array which can be written to keyframes:
+
+trajectory = integrate_forces(locs, frame_num=500, strengths=-30)
+write_location_keyframes(particles, trajectory)
+
+Like a FORCE field with falloff_power p, particle j pushes particle i with
+force strengths[j] / r**p along the line from j to i, so negative strengths
+attract. With a cutoff, only pairs closer than the cutoff interact and a
+neighbor list from neighbors.py finds them in O(N) instead of checking all
+N**2 pairs.
+
+The fields alone let attracting particles pass through each other down to
+min_distance. With a contact_distance, like the particle diameter, closer
+pairs are also pushed apart by a stiff spring (see contact_forces), in
+place of the rigid body collisions of the baked scene.
+"""
+
+
+# largest number of pair distances held in memory at once
+PAIR_CHUNK = 2**22
+
+
+def pairwise_forces(positions, strengths, falloff=2, cutoff=None,
+    min_distance=0.1, pairs=None):
+    """Get the (N, 3) array of total force on each particle from the force
+    fields of all other particles. Strengths can be one value or an array
+    of N field strengths. Distances below min_distance are clamped so
+    overlapping particles don't get infinite forces. With a cutoff, pairs
+    can be candidate index arrays i, j from a neighbor list; pairs farther
+    apart than the cutoff are ignored."""
+    positions = np.asarray(positions, dtype=float)
+    n = len(positions)
+    strengths = np.broadcast_to(np.asarray(strengths, dtype=float), (n,))
+    forces = np.zeros((n, 3))
+    if cutoff is None:
+        # all pairs, a block of rows at a time to bound memory
+        chunk = max(1, PAIR_CHUNK // max(n, 1))
+        for start in range(0, n, chunk):
+            diff = positions[start:start+chunk, None, :] - positions
+            dist = np.maximum(np.linalg.norm(diff, axis=2), min_distance)
+            scale = strengths / dist**(falloff + 1)
+            # particles don't feel their own field
+            rows = np.arange(len(diff))
+            scale[rows, start + rows] = 0
+            forces[start:start+chunk] = np.einsum('ij,ijk->ik', scale, diff)
+        return forces
+    if pairs is None:
+        pairs = cell_list_pairs(positions, cutoff)
+    i, j = pairs
+    diff = positions[i] - positions[j]
+    dist = np.linalg.norm(diff, axis=1)
+    unit_scale = np.where(
+        dist < cutoff, 1 / np.maximum(dist, min_distance)**(falloff + 1), 0)
+    # field of j acting on i and field of i acting on j
+    f_i = (strengths[j] * unit_scale)[:, None] * diff
+    f_j = -(strengths[i] * unit_scale)[:, None] * diff
+    for axis in range(3):
+        forces[:, axis] = (
+            np.bincount(i, weights=f_i[:, axis], minlength=n)
+            + np.bincount(j, weights=f_j[:, axis], minlength=n))
+    return forces
+
+
+def contact_forces(positions, distance, stiffness=1e5, pairs=None):
+    """Get the (N, 3) array of short-range repulsion which keeps particles
+    from passing through each other: pairs closer than distance, like the
+    sum of their radii, are pushed apart with stiffness times their
+    overlap. Pairs can be candidate index arrays i, j from a neighbor list
+    reaching at least as far as distance."""
+    positions = np.asarray(positions, dtype=float)
+    n = len(positions)
+    forces = np.zeros((n, 3))
+    if n < 2:
+        return forces
+    if pairs is None:
+        pairs = cell_list_pairs(positions, distance)
+    i, j = pairs
+    diff = positions[i] - positions[j]
+    dist = np.linalg.norm(diff, axis=1)
+    overlap = np.maximum(distance - dist, 0)
+    # push i away from j and j away from i
+    f = (stiffness * overlap / np.maximum(dist, 1e-9))[:, None] * diff
+    for axis in range(3):
+        forces[:, axis] = (
+            np.bincount(i, weights=f[:, axis], minlength=n)
+            - np.bincount(j, weights=f[:, axis], minlength=n))
+    return forces
+
+
+def integrate_forces(positions, frame_num, strengths=0, falloff=2,
+    masses=1, velocities=None, lin_damp=0.25, gravity=(0, 0, 0),
+    floor=None, fps=24, steps_per_second=500, cutoff=None, skin=None,
+    min_distance=0.1, contact_distance=None, contact_stiffness=1e5):
+    """Integrate the motion of particles under their pairwise force fields
+    and return the trajectory as an array of shape (frame_num, N, 3), where
+    the first frame holds the initial positions. Linear damping and the
+    number of steps per second work like the rigid body settings of the
+    same names. If floor is a height, particles stop falling when they
+    reach it, like on the non-bouncy floor plane of the sticky particles
+    scene (give it the floor height plus the particle radius). With a
+    cutoff, the neighbor list is only rebuilt when particles have drifted
+    more than half its skin (see neighbors.build_neighbor_list). Without a
+    contact_distance particles can pass through each other; with one they
+    are kept apart by contact_forces, which stay stable for a
+    contact_stiffness below 4 * mass * (fps * substeps)**2."""
+    positions = np.array(positions, dtype=float).reshape(-1, 3)
+    n = len(positions)
+    masses = np.broadcast_to(np.asarray(masses, dtype=float), (n,))[:, None]
+    if velocities is None:
+        velocities = np.zeros((n, 3))
+    velocities = np.array(velocities, dtype=float).reshape(n, 3)
+    gravity = np.asarray(gravity, dtype=float)
+    substeps = max(1, int(round(steps_per_second / fps)))
+    dt = 1 / (fps * substeps)
+    damping = (1 - lin_damp)**dt
+    trajectory = np.empty((frame_num, n, 3))
+    trajectory[0] = positions
+    nlist = None
+    if cutoff is not None:
+        nlist = build_neighbor_list(positions, cutoff, skin=skin)
+    for frame in range(1, frame_num):
+        for _ in range(substeps):
+            if nlist is not None:
+                nlist = update_neighbor_list(nlist, positions)
+            forces = pairwise_forces(
+                positions, strengths, falloff=falloff, cutoff=cutoff,
+                min_distance=min_distance,
+                pairs=None if nlist is None else nlist['pairs'])
+            if contact_distance:
+                # reuse the neighbor list if it reaches far enough
+                reach = nlist is not None and cutoff >= contact_distance
+                forces += contact_forces(positions, contact_distance,
+                    stiffness=contact_stiffness,
+                    pairs=nlist['pairs'] if reach else None)
+            # semi-implicit Euler step
+            velocities += dt * (forces / masses + gravity)
+            velocities *= damping
+            positions += dt * velocities
+            if floor is not None:
+                below = positions[:, 2] < floor
+                positions[below, 2] = floor
+                velocities[below, 2] = np.maximum(velocities[below, 2], 0)
+        trajectory[frame] = positions
+    return trajectory
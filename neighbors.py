@@ -0,0 +1,90 @@
+import numpy as np
+
+"""
+Neighbor search for short-range pairwise interactions using a uniform grid
+(cell list), computed with NumPy only.
+
+Forces with falloff_power=2 are negligible beyond a few particle radii, so
+only pairs closer than a cutoff need to be evaluated. cell_list_pairs bins
+the particles into cubic cells of side cutoff and compares each particle
+only with particles in the 27 surrounding cells, which is O(N).
+
+For particles which move a little between evaluations, a neighbor list
+keeps the pairs within cutoff + skin and is only rebuilt once some particle
+has drifted more than skin / 2 from where the list was built:
+
+nlist = build_neighbor_list(positions, cutoff=1, skin=0.3)
+for step in range(steps):
+    nlist = update_neighbor_list(nlist, positions)
+    i, j = nlist['pairs']
+    ...
+"""
+
+
+def cell_list_pairs(positions, cutoff):
+    """Get the index arrays i, j (with i < j) of all pairs of positions
+    closer than the cutoff, by binning positions into cubic cells of side
+    cutoff and only comparing positions in neighboring cells."""
+    positions = np.asarray(positions, dtype=float)
+    if cutoff <= 0:
+        raise ValueError('Cutoff must be > 0.')
+    cells = np.floor((positions - positions.min(axis=0)) / cutoff).astype(int)
+    dims = cells.max(axis=0) + 1
+    cell_ids = np.ravel_multi_index(cells.T, dims)
+    order = np.argsort(cell_ids, kind='stable')
+    sorted_ids = cell_ids[order]
+    pairs_i, pairs_j = [], []
+    for offset in np.indices((3, 3, 3)).reshape(3, -1).T - 1:
+        neighbor_cells = cells + offset
+        inside = np.all((neighbor_cells >= 0) & (neighbor_cells < dims), axis=1)
+        i = np.flatnonzero(inside)
+        neighbor_ids = np.ravel_multi_index(neighbor_cells[i].T, dims)
+        # every position in the neighboring cell is a candidate partner
+        start = np.searchsorted(sorted_ids, neighbor_ids, side='left')
+        counts = np.searchsorted(sorted_ids, neighbor_ids, side='right') - start
+        i = np.repeat(i, counts)
+        first = np.repeat(start - np.cumsum(counts) + counts, counts)
+        j = order[first + np.arange(counts.sum())]
+        keep = i < j
+        i, j = i[keep], j[keep]
+        close = np.sum((positions[i] - positions[j])**2, axis=1) < cutoff**2
+        pairs_i.append(i[close])
+        pairs_j.append(j[close])
+    return np.concatenate(pairs_i), np.concatenate(pairs_j)
+
+
+def build_neighbor_list(positions, cutoff, skin=None):
+    """Build a neighbor list of all pairs closer than cutoff + skin. The
+    skin defaults to 30% of the cutoff. Returns a dictionary with the pair
+    index arrays, the positions it was built at, and its settings."""
+    if skin is None:
+        skin = 0.3 * cutoff
+    positions = np.array(positions, dtype=float)
+    return {
+        'pairs': cell_list_pairs(positions, cutoff + skin),
+        'reference': positions,
+        'cutoff': cutoff,
+        'skin': skin,
+        'builds': 1,
+    }
+
+
+def needs_rebuild(nlist, positions):
+    """Check whether any particle has moved more than half the skin since
+    the neighbor list was built, so a pair could have come within the
+    cutoff without being in the list."""
+    if len(positions) != len(nlist['reference']):
+        return True
+    drift = np.sum((positions - nlist['reference'])**2, axis=1)
+    return drift.max(initial=0) > (nlist['skin'] / 2)**2
+
+
+def update_neighbor_list(nlist, positions):
+    """Get a neighbor list which is valid for the current positions,
+    rebuilding the given one only if particles have drifted too far."""
+    if not needs_rebuild(nlist, positions):
+        return nlist
+    builds = nlist['builds']
+    nlist = build_neighbor_list(positions, nlist['cutoff'], skin=nlist['skin'])
+    nlist['builds'] += builds
+    return nlist
@@ -0,0 +1,147 @@
+import os
+import sys
+import argparse
+import subprocess
+
+try:
+    import bpy
+    from bpy import context as C
+except ImportError:
+    # the orchestrator itself runs in plain Python
+    bpy = C = None
+
+"""
+Render the frames of an animation in parallel headless Blender processes.
+
+render() in the scene scripts bakes and then renders the whole frame range
+in one Blender process. Here the prepared scene is baked and saved once,
+the frame range is split into chunks, each chunk is rendered to an image
+sequence by its own 'blender --background' worker, and the images are
+stitched into a movie with ffmpeg afterwards.
+
+From inside a scene script, instead of render():
+
+render_parallel('/tmp/blender_render', workers=8)
+
+Scene scripts do this in their render stage with --set render_workers=8.
+
+Or from a shell, for a scene which has already been baked and saved:
+
+python parallel_render.py scene.blend /tmp/blender_render --workers 8
+"""
+
+
+def split_frame_range(start, end, workers):
+    """Split the inclusive frame range from start to end into at most
+    workers contiguous chunks of nearly equal length, returned as a list
+    of inclusive (first, last) frame pairs."""
+    frame_num = end - start + 1
+    if frame_num < 1 or workers < 1:
+        raise ValueError('Need start <= end and at least one worker.')
+    workers = min(workers, frame_num)
+    size, extra = divmod(frame_num, workers)
+    chunks = []
+    first = start
+    for w in range(workers):
+        last = first + size + (w < extra) - 1
+        chunks.append((first, last))
+        first = last + 1
+    return chunks
+
+
+def worker_command(blend_path, output_dir, first, last, blender='blender',
+    file_format='PNG', threads=0):
+    """Get the command line of a headless Blender worker which renders
+    frames first to last of a saved scene into numbered images."""
+    return [
+        blender, '--background', blend_path,
+        '--render-output', os.path.join(output_dir, 'frame_####'),
+        '--render-format', file_format,
+        '--threads', str(threads),
+        '--frame-start', str(first),
+        '--frame-end', str(last),
+        '--render-anim']
+
+
+def render_frames(blend_path, output_dir, start, end, workers=None,
+    blender='blender', file_format='PNG'):
+    """Render frames start to end of a saved scene with parallel Blender
+    workers, splitting the CPU threads between them. Raises
+    subprocess.CalledProcessError if any worker fails."""
+    workers = workers or os.cpu_count()
+    chunks = split_frame_range(start, end, workers)
+    threads = max(1, os.cpu_count() // len(chunks))
+    os.makedirs(output_dir, exist_ok=True)
+    procs = []
+    for first, last in chunks:
+        cmd = worker_command(blend_path, output_dir, first, last,
+            blender=blender, file_format=file_format, threads=threads)
+        log = open(os.path.join(
+            output_dir, 'worker_{}_{}.log'.format(first, last)), 'w')
+        procs.append((cmd, log, subprocess.Popen(
+            cmd, stdout=log, stderr=subprocess.STDOUT)))
+    failed = None
+    for cmd, log, proc in procs:
+        proc.wait()
+        log.close()
+        if proc.returncode and failed is None:
+            failed = subprocess.CalledProcessError(proc.returncode, cmd)
+    if failed:
+        raise failed
+
+
+def stitch_frames(output_dir, movie_path, start=0, fps=24, file_format='PNG',
+    codec='mjpeg'):
+    """Join the numbered images rendered by render_frames into a movie with
+    ffmpeg. The default motion JPEG codec matches the AVI_JPEG output of
+    render() when movie_path ends in .avi."""
+    ext = {'PNG': 'png', 'JPEG': 'jpg', 'OPEN_EXR': 'exr'}[file_format]
+    subprocess.run([
+        'ffmpeg', '-y',
+        '-framerate', str(fps),
+        '-start_number', str(start),
+        '-i', os.path.join(output_dir, 'frame_%04d.' + ext),
+        '-c:v', codec, '-q:v', '2',
+        movie_path], check=True)
+
+
+def render_parallel(filepath=os.path.expanduser('~/Desktop/blender_render'),
+    workers=None):
+    """Bake the current scene unless it is already baked, save a copy of it
+    next to the output and render the animation with parallel workers of
+    this Blender binary. The image sequence is kept in filepath and the
+    movie is written to filepath + '.avi'."""
+    os.makedirs(filepath, exist_ok=True)
+    blend_path = os.path.join(filepath, 'scene.blend')
+    scene = C.scene
+    world = scene.rigidbody_world
+    if world is None or not world.point_cache.is_baked:
+        bpy.ops.ptcache.bake_all(bake=True)
+    bpy.ops.wm.save_as_mainfile(filepath=blend_path, copy=True)
+    render_frames(blend_path, filepath, scene.frame_start, scene.frame_end,
+        workers=workers, blender=bpy.app.binary_path)
+    stitch_frames(filepath, filepath + '.avi', start=scene.frame_start,
+        fps=scene.render.fps / scene.render.fps_base)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=(
+        'Render a saved and baked Blender scene with parallel workers.'))
+    parser.add_argument('blend_path')
+    parser.add_argument('output_dir')
+    parser.add_argument('--start', type=int, default=0)
+    parser.add_argument('--end', type=int, default=250)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--blender', default='blender')
+    parser.add_argument('--fps', type=float, default=24)
+    parser.add_argument('--movie', default=None,
+        help='stitch the frames into this movie file with ffmpeg')
+    args = parser.parse_args()
+    try:
+        render_frames(args.blend_path, args.output_dir, args.start, args.end,
+            workers=args.workers, blender=args.blender)
+    except subprocess.CalledProcessError as e:
+        sys.exit('Worker failed: ' + ' '.join(e.cmd))
+    if args.movie:
+        stitch_frames(args.output_dir, args.movie, start=args.start,
+            fps=args.fps)
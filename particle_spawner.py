@@ -0,0 +1,215 @@
+import numpy as np
+
+try:
+    import bpy
+    from bpy import data as D
+    from bpy import context as C
+except ImportError:
+    # outside of Blender only the NumPy helpers below can be used
+    bpy = D = C = None
+
+"""
+Bulk creation of sphere particles through the low-level bpy.data API.
+
+create_particle in the scene scripts calls primitive_uv_sphere_add and
+shade_smooth for every sphere, and each operator call triggers a depsgraph
+update and an undo push. The functions here build one sphere mesh and link
+it to as many objects as needed, so thousands of particles can be created
+in a single pass:
+
+locs = np.random.random((10000, 3)) - 0.5
+particles = spawn_particles(locs, radius=0.1, mats=mat, prefix='gas_')
+
+Because the mesh is shared, materials are linked to the object instead of
+the mesh. Operators which change mesh data (like applying the SOLIDIFY
+modifier in add_collision_properties) need a single-user mesh, so for those
+call obj.data = obj.data.copy() first.
+
+For large species of identical particles which don't need to be rigid
+bodies, spawn_instanced_particles keeps the whole species in one point cloud
+mesh which instances a single sphere at each vertex.
+
+Small or distant spheres cover a few pixels, where a 32 segment sphere
+looks no different from an 8 segment one. camera_sphere_lod picks the
+coarsest level of SPHERE_LODS whose edges stay a few pixels long as seen
+from the scene camera, and lod_sphere_mesh gives one shared mesh per level:
+
+segments, rings = camera_sphere_lod(0.01, locs)
+particles = spawn_particles(locs, radius=0.01,
+    mesh=lod_sphere_mesh(segments, rings))
+"""
+
+
+# (segments, rings) of the UV spheres of each level of detail, coarsest
+# first, up to the default of primitive_uv_sphere_add
+SPHERE_LODS = ((8, 4), (12, 6), (16, 8), (24, 12), (32, 16))
+
+
+def uv_sphere_geometry(segments=32, rings=16):
+    """Get vertices and faces of a unit UV sphere with the same topology as
+    bpy.ops.mesh.primitive_uv_sphere_add. Returns an array of vertex
+    coordinates and a list of faces as tuples of vertex indices."""
+    # polar and azimuthal angles of the vertices between the two poles
+    theta = np.pi * np.arange(1, rings) / rings
+    phi = 2 * np.pi * np.arange(segments) / segments
+    theta, phi = np.meshgrid(theta, phi, indexing='ij')
+    ring_verts = np.column_stack((
+        (np.sin(theta) * np.cos(phi)).ravel(),
+        (np.sin(theta) * np.sin(phi)).ravel(),
+        np.cos(theta).ravel()))
+    verts = np.vstack(([0, 0, 1], ring_verts, [0, 0, -1]))
+    top, bottom = 0, len(verts) - 1
+    # index of vertex j on ring i, where ring 0 is next to the top pole
+    def idx(i, j):
+        return 1 + i * segments + j % segments
+    faces = []
+    for j in range(segments):
+        faces.append((top, idx(0, j), idx(0, j + 1)))
+        for i in range(rings - 2):
+            faces.append(
+                (idx(i, j), idx(i + 1, j), idx(i + 1, j + 1), idx(i, j + 1)))
+        faces.append((idx(rings - 2, j + 1), idx(rings - 2, j), bottom))
+    return verts, faces
+
+
+def make_sphere_mesh(name='sphere', segments=32, rings=16):
+    """Create a smooth-shaded unit sphere mesh datablock which can be shared
+    by many particle objects. The mesh has one empty material slot so each
+    object can link its own material."""
+    verts, faces = uv_sphere_geometry(segments=segments, rings=rings)
+    mesh = D.meshes.new(name)
+    mesh.from_pydata(verts.tolist(), [], faces)
+    mesh.polygons.foreach_set('use_smooth', [True] * len(mesh.polygons))
+    mesh.materials.append(None)
+    mesh.update()
+    return mesh
+
+
+def lod_sphere_mesh(segments=32, rings=16):
+    """Get the shared sphere mesh of a level of detail, creating it on
+    first use."""
+    name = 'sphere_lod_{}x{}'.format(segments, rings)
+    mesh = D.meshes.get(name)
+    if mesh is None:
+        mesh = make_sphere_mesh(name=name, segments=segments, rings=rings)
+    return mesh
+
+
+def sphere_lod(pixels, pixels_per_edge=4):
+    """Get the (segments, rings) of the coarsest level of SPHERE_LODS whose
+    edges are at most pixels_per_edge long around the outline of a sphere
+    of the given on-screen diameter in pixels."""
+    for segments, rings in SPHERE_LODS:
+        if np.pi * pixels / segments <= pixels_per_edge:
+            return segments, rings
+    return SPHERE_LODS[-1]
+
+
+def screen_diameter(radius, distance, angle, resolution):
+    """Get the on-screen diameter in pixels of a sphere at a distance from
+    a camera with a field of view angle in radians across resolution
+    pixels."""
+    distance = np.maximum(distance, radius)
+    return resolution * radius / (distance * np.tan(angle / 2))
+
+
+def camera_sphere_lod(radius, locs, margin=0, pixels_per_edge=4,
+    scene=None):
+    """Get the (segments, rings) of sphere_lod for spheres of a radius at
+    the (N, 3) locations, seen from the scene camera by the closest one.
+    Particles which move can come closer to the camera by up to margin
+    during the animation. Without a camera the finest level is used."""
+    scene = scene or C.scene
+    camera = scene.camera
+    if camera is None or camera.type != 'CAMERA':
+        return SPHERE_LODS[-1]
+    locs = np.asarray(locs, dtype=float).reshape(-1, 3)
+    cam_loc = np.array(camera.matrix_world.translation)
+    distance = np.linalg.norm(locs - cam_loc, axis=1).min() - margin
+    render = scene.render
+    resolution = max(render.resolution_x, render.resolution_y) \
+        * render.resolution_percentage / 100
+    pixels = screen_diameter(radius, distance, camera.data.angle, resolution)
+    return sphere_lod(pixels, pixels_per_edge=pixels_per_edge)
+
+
+def spawn_particles(locs, radius=1, mats=None, prefix='particle_',
+    mesh=None, collection=None):
+    """Create one sphere object per row of the (N, 3) array of locations.
+    The radius can be a single value or an array of N radii, and mats can be
+    None, a single material, or a sequence of N materials. All objects
+    share one sphere mesh, which is created if not given. Objects are named
+    by prefix and index like create_particle names them in the scene
+    scripts. Returns the list of new objects."""
+    locs = np.asarray(locs, dtype=float).reshape(-1, 3)
+    radii = np.broadcast_to(np.asarray(radius, dtype=float), (len(locs),))
+    if mats is None or isinstance(mats, bpy.types.Material):
+        mats = [mats] * len(locs)
+    if len(mats) != len(locs):
+        raise ValueError('Got {} materials for {} particles.'.format(
+            len(mats), len(locs)))
+    if mesh is None:
+        mesh = make_sphere_mesh(name=prefix + 'sphere')
+    if collection is None:
+        collection = C.view_layer.active_layer_collection.collection
+    particles = []
+    for i in range(len(locs)):
+        obj = D.objects.new(prefix + str(i).zfill(3), mesh)
+        obj.location = locs[i]
+        obj.scale = (radii[i], radii[i], radii[i])
+        if mats[i]:
+            obj.material_slots[0].link = 'OBJECT'
+            obj.material_slots[0].material = mats[i]
+        collection.objects.link(obj)
+        particles.append(obj)
+    # evaluate the depsgraph once for all new objects
+    C.view_layer.update()
+    return particles
+
+
+def spawn_instanced_particles(locs, radius=1, mat=None, name='particles',
+    mesh=None, collection=None):
+    """Create identical particles at the (N, 3) array of locations as vertex
+    instances of one sphere, for species where every particle has the same
+    radius and material. Only a point cloud mesh with one vertex per
+    particle and a single sphere object are added to the scene, so memory
+    and file size barely grow with N. Instances can't be rigid bodies or
+    have their own keyframes; move them with set_instance_locations.
+    Returns the point cloud object which instances the sphere."""
+    locs = np.asarray(locs, dtype=float).reshape(-1, 3)
+    if collection is None:
+        collection = C.view_layer.active_layer_collection.collection
+    # point cloud with one vertex per particle
+    points = D.meshes.new(name + '_points')
+    points.vertices.add(len(locs))
+    points.vertices.foreach_set('co', locs.ravel())
+    points.update()
+    instancer = D.objects.new(name, points)
+    instancer.instance_type = 'VERTS'
+    instancer.show_instancer_for_render = False
+    instancer.show_instancer_for_viewport = False
+    # sphere which is drawn at every vertex of the point cloud
+    if mesh is None:
+        mesh = make_sphere_mesh(name=name + '_sphere')
+    sphere = D.objects.new(name + '_sphere', mesh)
+    sphere.scale = (radius, radius, radius)
+    if mat:
+        sphere.material_slots[0].link = 'OBJECT'
+        sphere.material_slots[0].material = mat
+    sphere.parent = instancer
+    collection.objects.link(instancer)
+    collection.objects.link(sphere)
+    C.view_layer.update()
+    return instancer
+
+
+def set_instance_locations(instancer, locs):
+    """Move the particles of a point cloud made by spawn_instanced_particles
+    to the (N, 3) array of locations."""
+    points = instancer.data
+    locs = np.asarray(locs, dtype=float).reshape(-1, 3)
+    if len(locs) != len(points.vertices):
+        raise ValueError('Got {} locations for {} particles.'.format(
+            len(locs), len(points.vertices)))
+    points.vertices.foreach_set('co', locs.ravel())
+    points.update()
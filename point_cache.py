@@ -0,0 +1,139 @@
+import os
+import struct
+import numpy as np
+
+try:
+    import bpy
+    from bpy import context as C
+except ImportError:
+    # point cache files can be written and read outside of Blender
+    bpy = C = None
+
+from particle_spawner import spawn_instanced_particles
+
+"""
+Animate particles from a PC2 point cache file instead of location
+keyframes.
+
+Location fcurves cost three fcurves and a keyframe per axis, frame and
+particle, all stored in the .blend and loaded into memory. A PC2 file
+holds the positions of all points on all frames as float32 after a short
+header, and Blender's Mesh Cache modifier reads only the frame it shows.
+The particles are the vertices of one point cloud mesh instancing a
+sphere (see spawn_instanced_particles), moved by the modifier:
+
+write_pc2('/tmp/walk.pc2', trajectory)
+particles = point_cache_particles('/tmp/walk.pc2', radius=0.1, mat=mat)
+
+Trajectories can be written chunk by chunk, so they never have to fit in
+memory, and read back lazily as a memory map with read_pc2. Instanced
+particles can't be rigid bodies, so this is for precomputed animation
+like random walks and imported trajectories.
+"""
+
+
+# magic string, version, points, start frame, sample rate, samples
+PC2_HEADER = struct.Struct('<12siiffi')
+PC2_MAGIC = b'POINTCACHE2\0'
+
+
+def open_pc2(path, point_num, frame_start=0, sample_rate=1):
+    """Open a new PC2 file for writing frames with append_pc2, and
+    finish_pc2 once all frames are written."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    f = open(path, 'wb')
+    # the number of frames is filled in by finish_pc2
+    f.write(PC2_HEADER.pack(PC2_MAGIC, 1, point_num, frame_start,
+        sample_rate, 0))
+    f.point_num = point_num
+    f.frame_num = 0
+    return f
+
+
+def append_pc2(f, positions):
+    """Write a (frames, N, 3) array of positions after the frames already
+    in an open PC2 file."""
+    positions = np.asarray(positions, dtype='<f4')
+    if positions.ndim == 2:
+        positions = positions[None]
+    if positions.shape[1:] != (f.point_num, 3):
+        raise ValueError('Positions shape {} does not match {} points.'
+            .format(positions.shape, f.point_num))
+    f.write(np.ascontiguousarray(positions).tobytes())
+    f.frame_num += len(positions)
+
+
+def finish_pc2(f):
+    """Write the number of frames into the header of an open PC2 file and
+    close it."""
+    f.seek(PC2_HEADER.size - 4)
+    f.write(struct.pack('<i', f.frame_num))
+    f.close()
+
+
+def write_pc2(path, trajectory, frame_start=0, sample_rate=1):
+    """Write a (frames, N, 3) trajectory array, or an iterable of such
+    arrays to be written one after another, to a PC2 file. Returns the
+    number of frames written."""
+    if isinstance(trajectory, np.ndarray):
+        trajectory = [trajectory]
+    f = None
+    try:
+        for chunk in trajectory:
+            chunk = np.asarray(chunk)
+            if f is None:
+                f = open_pc2(path, chunk.shape[-2], frame_start=frame_start,
+                    sample_rate=sample_rate)
+            append_pc2(f, chunk)
+    finally:
+        if f is not None:
+            finish_pc2(f)
+    if f is None:
+        raise ValueError('No frames to write to {}.'.format(path))
+    return f.frame_num
+
+
+def read_pc2_header(path):
+    """Get the number of points and frames, start frame and sample rate of
+    a PC2 file."""
+    with open(path, 'rb') as f:
+        magic, _, point_num, frame_start, sample_rate, frame_num = \
+            PC2_HEADER.unpack(f.read(PC2_HEADER.size))
+    if magic != PC2_MAGIC:
+        raise ValueError('{} is not a PC2 file.'.format(path))
+    return {'point_num': point_num, 'frame_num': frame_num,
+        'frame_start': frame_start, 'sample_rate': sample_rate}
+
+
+def read_pc2(path):
+    """Get the positions in a PC2 file as a read-only (frames, N, 3)
+    memory map, which only reads the frames that are indexed."""
+    header = read_pc2_header(path)
+    return np.memmap(path, dtype='<f4', mode='r', offset=PC2_HEADER.size,
+        shape=(header['frame_num'], header['point_num'], 3))
+
+
+def add_mesh_cache(obj, path, frame_start=0):
+    """Add a Mesh Cache modifier to an object which moves its vertices to
+    the positions of each frame in a PC2 file, from frame_start on."""
+    mod = obj.modifiers.new('MeshCache', 'MESH_CACHE')
+    mod.cache_format = 'PC2'
+    mod.filepath = os.path.abspath(path)
+    mod.deform_mode = 'OVERWRITE'
+    mod.time_mode = 'FRAME'
+    mod.play_mode = 'SCENE'
+    mod.frame_start = frame_start
+    mod.interpolation = 'LINEAR'
+    return mod
+
+
+def point_cache_particles(path, radius=1, mat=None, name='particles',
+    frame_start=0, mesh=None, collection=None):
+    """Create particles moved by a PC2 file from frame_start on, as a point
+    cloud with one vertex per point instancing a sphere. The particles
+    start at their positions on the first frame of the file. Returns the
+    point cloud object."""
+    instancer = spawn_instanced_particles(read_pc2(path)[0], radius=radius,
+        mat=mat, name=name, mesh=mesh, collection=collection)
+    add_mesh_cache(instancer, path, frame_start=frame_start)
+    return instancer
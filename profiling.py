@@ -0,0 +1,154 @@
+import os
+import sys
+import json
+import time
+import runpy
+import atexit
+import functools
+from collections import Counter
+
+try:
+    import bpy
+except ImportError:
+    # profile against the pure-Python stand-in outside of Blender
+    import fake_bpy
+    bpy = fake_bpy.install()
+
+# make helper modules next to this script importable inside Blender
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import scene_builder
+import particle_spawner
+import keyframes
+import trajectory_export
+import nbody
+from scene_builder import STAGE_TIMER, STAGE_TIMES, parse_scene_args
+
+"""
+Find where the time of a scene script goes by counting and timing every
+bpy.ops call and the scene helpers, per stage of the run (see
+scene_builder.start_stage):
+
+blender --background --python profiling.py -- blender_sticky_particles.py
+    --set particle_num=50 --set profile_path=/tmp/sticky_profile.json
+
+Outside of Blender the script runs against fake_bpy, with the bake cache
+off unless it is given, which shows which calls sit in hot loops but not
+their cost in Blender. At exit the profile is written as JSON, with the
+calls and total time of every call path, and in the folded stack format
+of flamegraph.pl and speedscope next to it (/tmp/sticky_profile.folded),
+where each line is a call path like
+'spawn;create_force_particle;ops.object.effector_add' and its own time in
+microseconds.
+"""
+
+
+# helpers which are timed, by module
+PROFILED_HELPERS = {
+    scene_builder: ('delete_all_objects_and_materials', 'boundary_plane',
+        'create_bounding_box', 'make_transparent_material',
+        'make_gas_material', 'create_particle', 'add_collision_properties',
+        'create_force_particle', 'bake', 'render'),
+    particle_spawner: ('spawn_particles', 'spawn_instanced_particles'),
+    keyframes: ('write_location_keyframes',),
+    trajectory_export: ('extract_trajectory',),
+    nbody: ('integrate_forces',),
+}
+
+# calls, total and child time of every call path, starting with the stage
+PROFILE = {'stack': [], 'calls': Counter(), 'time': Counter(),
+    'child_time': Counter()}
+
+
+def profiled(name, func):
+    """Wrap a function so its calls and wall time are added to PROFILE
+    under the current stage and call path."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        stack = PROFILE['stack']
+        stack.append(name)
+        path = (STAGE_TIMER['stage'] or 'run',) + tuple(stack)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            stack.pop()
+            PROFILE['calls'][path] += 1
+            PROFILE['time'][path] += seconds
+            PROFILE['child_time'][path[:-1]] += seconds
+    wrapper.profiled = True
+    return wrapper
+
+
+class ProfiledOperators:
+    """Stand-in for bpy.ops which times every operator call."""
+
+    def __init__(self, ops, module=None):
+        self.ops = ops
+        self.module = module
+
+    def __getattr__(self, name):
+        attr = getattr(self.ops, name)
+        if self.module is None:
+            return ProfiledOperators(attr, module=name)
+        return profiled('ops.{}.{}'.format(self.module, name), attr)
+
+
+def instrument():
+    """Time every bpy.ops call and the helpers in PROFILED_HELPERS. Scene
+    scripts must import the helpers after this, so they get the timed
+    versions."""
+    if not isinstance(bpy.ops, ProfiledOperators):
+        bpy.ops = ProfiledOperators(bpy.ops)
+    for module, names in PROFILED_HELPERS.items():
+        for name in names:
+            func = getattr(module, name)
+            if not getattr(func, 'profiled', False):
+                setattr(module, name, profiled(name, func))
+
+
+def profile_rows():
+    """Get the stage, call path, calls, total and own seconds of every
+    profiled call path, most costly first."""
+    rows = []
+    for path, calls in PROFILE['calls'].items():
+        total = PROFILE['time'][path]
+        rows.append({
+            'stage': path[0],
+            'path': list(path[1:]),
+            'calls': calls,
+            'seconds': total,
+            'own_seconds': total - PROFILE['child_time'][path],
+        })
+    rows.sort(key=lambda row: row['seconds'], reverse=True)
+    return rows
+
+
+def write_profile(path):
+    """Write the stage times and profiled calls to a JSON file, and the own
+    time of every call path in microseconds to a .folded file for flame
+    graphs."""
+    rows = profile_rows()
+    with open(path, 'w') as f:
+        json.dump({'stages': dict(STAGE_TIMES), 'calls': rows}, f, indent=4)
+    with open(os.path.splitext(path)[0] + '.folded', 'w') as f:
+        for row in rows:
+            f.write('{} {}\n'.format(';'.join([row['stage']] + row['path']),
+                int(round(1e6 * max(row['own_seconds'], 0)))))
+
+
+if __name__ == '__main__':
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    if not argv or argv[0].startswith('-'):
+        sys.exit('Give the scene script to profile after --')
+    profile_path = parse_scene_args(argv).get('profile_path') \
+        or 'profile.json'
+    if getattr(bpy, 'fake', False):
+        # the stand-in saves placeholders, which mustn't go into the real
+        # bake cache; a later --set bake_cache=DIR still turns it on
+        dash = sys.argv.index('--')
+        sys.argv[dash + 2:dash + 2] = ['--set', 'bake_cache=']
+    instrument()
+    # also write the profile if the scene script exits early
+    atexit.register(write_profile, os.path.abspath(profile_path))
+    runpy.run_path(os.path.abspath(argv[0]), run_name='__main__')
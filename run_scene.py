@@ -0,0 +1,46 @@
+import os
+import sys
+import runpy
+import bpy
+
+# make helper modules next to this script importable inside Blender
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from scene_builder import (RUN_PARAMS, parse_scene_args, parse_stages,
+    validate_scene_params, finish_scene)
+
+"""
+Run the stages of a scene script headless, with parameters from the command
+line or a JSON config file instead of edits to the script:
+
+blender --background --python run_scene.py -- blender_sticky_particles.py
+    --config job.json --set end_kf=250 --set blend_path=/farm/job1.blend
+    --stages build,bake
+
+The build stage runs the scene script and saves the scene to blend_path.
+Later jobs can skip the build and run the remaining stages on the saved
+scene, where a bake which is already stored in it is not repeated:
+
+blender --background --python run_scene.py -- blender_sticky_particles.py
+    --set blend_path=/farm/job1.blend --stages bake,render
+"""
+
+
+argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+overrides = parse_scene_args(argv)
+stages = parse_stages(overrides.get('stages', RUN_PARAMS['stages']))
+
+if 'build' in stages:
+    if not argv or argv[0].startswith('-'):
+        sys.exit('Give the scene script to build after --')
+    # the scene script reads the same arguments with scene_params
+    runpy.run_path(os.path.abspath(argv[0]), run_name='__main__')
+else:
+    # only run-level parameters apply to a scene which is already built
+    params = validate_scene_params(
+        {k: v for k, v in overrides.items() if k in RUN_PARAMS},
+        defaults=RUN_PARAMS)
+    params['stages'] = stages
+    if not os.path.isfile(params['blend_path']):
+        sys.exit('Without the build stage, blend_path must be a saved scene.')
+    bpy.ops.wm.open_mainfile(filepath=os.path.abspath(params['blend_path']))
+    finish_scene(params)
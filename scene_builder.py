@@ -0,0 +1,606 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+try:
+    import bpy
+    from bpy import data as D
+    from bpy import context as C
+except ImportError:
+    # outside of Blender only the NumPy helpers below can be used
+    bpy = D = C = None
+
+from bake_cache import BAKE_CACHE_GB, bake_key, restore_bake, store_bake
+from trajectory_export import extract_trajectory
+from solver_tuning import tune_solver_accuracy
+from parallel_render import render_parallel
+
+"""
+Shared helpers for building particle scenes in Blender.
+
+Import them in a scene script with:
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from scene_builder import add_camera, create_bounding_box, render
+
+bpy is only imported if it is available, so the NumPy parts of this module
+(bounding box geometry and scene parameter parsing and validation) can be
+used to plan and check scenes in a plain Python process before launching
+Blender.
+
+Scene scripts read their parameters with scene_params, so they can be set
+from the command line or a JSON config file, and end with finish_scene,
+which runs the bake and render stages selected on the command line and
+reuses earlier bakes of identical scenes from the bake cache if one is
+given with --set bake_cache=DIR.
+"""
+
+
+# stages of a scene job, in the order they run
+SCENE_STAGES = ('build', 'bake', 'render')
+
+# parameters every scene script accepts besides its own
+RUN_PARAMS = {
+    'stages': 'build',
+    'blend_path': '',
+    'render_path': os.path.expanduser('~/Desktop/blender_render'),
+    # more than one renders frame chunks in parallel Blender processes
+    'render_workers': 1,
+    'seed': None,
+    # off unless a directory is given, e.g. bake_cache.BAKE_CACHE_DIR
+    'bake_cache': '',
+    'bake_cache_gb': BAKE_CACHE_GB,
+    # read by scene scripts, see scene_template.base_scene
+    'base_scene_cache': '',
+    'trajectory_path': '',
+    'tune_solver': False,
+    'tune_frames': 50,
+    'benchmark_path': '',
+    # written last by finish_scene, marks a run which got to the end
+    'done_path': '',
+    # read by profiling.py
+    'profile_path': '',
+}
+
+# wall time in seconds of each stage of this run, see start_stage
+STAGE_TIMES = {}
+STAGE_TIMER = {'stage': None, 'start': 0}
+
+# custom property holding the parameters a material was made with, and
+# the names of those materials by their parameters, see find_material
+MATERIAL_KEY = 'material_key'
+MATERIALS = {}
+
+# kinds of datablocks in bpy.data which only exist to be used by others,
+# removed by purge_orphans once nothing uses them
+ORPHAN_DATA = ('meshes', 'materials', 'actions', 'cameras', 'lights',
+    'curves', 'textures', 'images', 'node_groups')
+
+# thickness of the inward SOLIDIFY shell of add_collision_properties
+SOLIDIFY_THICKNESS = 0.05
+
+# default parameters of a rigid body particle scene
+DEFAULT_SCENE_PARAMS = {
+    'start_kf': 0,
+    'end_kf': 250,
+    'gravity': (0, 0, 0),
+    'plane_size': 10,
+    'gas_particle_num': 30,
+    'radius': 0.1,
+    'mass': 1,
+    'bounciness': 1,
+    'friction': 0,
+    'collision_margin': 0.1,
+    'steps_per_second': 300,
+    'solver_iterations': 50,
+    'seed': None,
+}
+
+
+def parse_stages(stages):
+    """Get the tuple of stages to run, in order, from a comma separated
+    string like 'bake,render' or a sequence of stage names."""
+    if isinstance(stages, str):
+        stages = [st.strip() for st in stages.split(',') if st.strip()]
+    unknown = set(stages) - set(SCENE_STAGES)
+    if unknown:
+        raise ValueError('Unknown stages {}, choose from {}.'.format(
+            sorted(unknown), SCENE_STAGES))
+    return tuple(st for st in SCENE_STAGES if st in stages)
+
+
+def validate_scene_params(params=None, defaults=DEFAULT_SCENE_PARAMS,
+    **kwargs):
+    """Get a full set of scene parameters by updating the defaults
+    with the given dictionary and keyword arguments. Raises ValueError
+    listing every problem found, so scenes can be checked without bpy."""
+    full = dict(defaults)
+    full.update(params or {})
+    full.update(kwargs)
+    problems = []
+    unknown = set(full) - set(defaults)
+    if unknown:
+        problems.append('unknown parameters {}'.format(sorted(unknown)))
+    if 'start_kf' in full and 'end_kf' in full:
+        if not 0 <= full['start_kf'] < full['end_kf']:
+            problems.append('need 0 <= start_kf < end_kf')
+    if 'gravity' in full and len(full['gravity']) != 3:
+        problems.append('gravity must be an (x, y, z) vector')
+    for key in ('plane_size', 'radius', 'mass',
+            'steps_per_second', 'solver_iterations', 'bake_cache_gb',
+            'tune_frames'):
+        if key in full and not full[key] > 0:
+            problems.append('{} must be > 0'.format(key))
+    for key in ('gas_particle_num', 'friction', 'collision_margin'):
+        if key in full and not full[key] >= 0:
+            problems.append('{} must be >= 0'.format(key))
+    if 'bounciness' in full and not 0 <= full['bounciness'] <= 1:
+        problems.append('bounciness must be between 0 and 1')
+    if 'radius' in full and 'plane_size' in full:
+        if 2 * full['radius'] >= full['plane_size']:
+            problems.append('particles do not fit inside the bounding box')
+    if 'stages' in full:
+        try:
+            parse_stages(full['stages'])
+        except ValueError as e:
+            problems.append(str(e))
+    if problems:
+        raise ValueError('Invalid scene parameters: ' + '; '.join(problems))
+    return full
+
+
+def parse_scene_args(argv=None):
+    """Get scene parameter overrides from the command line arguments given
+    to Blender after '--', for example:
+
+    blender --background --python blender_sticky_particles.py --
+        --config job.json --set end_kf=250 --stages build,bake
+
+    A config file is a JSON object of parameters, and --set takes
+    precedence over it. Values of --set are read as JSON when possible
+    and as strings otherwise."""
+    if argv is None:
+        argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    parser = argparse.ArgumentParser(
+        prog='blender --background --python SCRIPT --')
+    parser.add_argument('script', nargs='?',
+        help='scene script, when run through run_scene.py')
+    parser.add_argument('--config', help='JSON file of scene parameters')
+    parser.add_argument('--set', action='append', default=[],
+        metavar='NAME=VALUE', help='set one scene parameter')
+    parser.add_argument('--stages',
+        help='comma separated stages to run from {}'.format(SCENE_STAGES))
+    args = parser.parse_args(argv)
+    overrides = {}
+    if args.config:
+        with open(args.config) as f:
+            overrides.update(json.load(f))
+    for item in args.set:
+        name, sep, value = item.partition('=')
+        if not sep:
+            parser.error('--set needs NAME=VALUE, got {}'.format(item))
+        try:
+            overrides[name] = json.loads(value)
+        except ValueError:
+            overrides[name] = value
+    if args.stages:
+        overrides['stages'] = args.stages
+    return overrides
+
+
+def scene_params(defaults, argv=None):
+    """Get the parameters of a scene script from its defaults, updated
+    with the config file and --set arguments on the command line (see
+    parse_scene_args). RUN_PARAMS are added to the defaults, stages are
+    parsed into a tuple, NumPy's global random generator is seeded if a
+    seed is given, and timing of the 'setup' stage starts."""
+    params = validate_scene_params(
+        parse_scene_args(argv), defaults=dict(RUN_PARAMS, **defaults))
+    params['stages'] = parse_stages(params['stages'])
+    start_stage('setup')
+    if params['seed'] is not None:
+        np.random.seed(params['seed'])
+    return params
+
+
+def start_stage(name):
+    """End the current stage of the run, adding its wall time to
+    STAGE_TIMES, and start timing the stage with this name. Scene scripts
+    mark where spawning particles and animating them start, and
+    finish_scene times the bake, save, export and render stages. A name
+    of None only ends the current stage."""
+    now = time.perf_counter()
+    stage = STAGE_TIMER['stage']
+    if stage is not None:
+        STAGE_TIMES[stage] = (STAGE_TIMES.get(stage, 0)
+            + now - STAGE_TIMER['start'])
+    STAGE_TIMER['stage'] = name
+    STAGE_TIMER['start'] = now
+
+
+def write_stage_times(path, params=None):
+    """Write the stage times of this run, its peak memory use where the
+    platform reports it, and the JSON serializable scene parameters to a
+    JSON file."""
+    record = {'stages': dict(STAGE_TIMES)}
+    try:
+        import resource
+        # kilobytes on Linux
+        record['peak_rss_mb'] = resource.getrusage(
+            resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        pass
+    record['params'] = {k: v for k, v in (params or {}).items()
+        if isinstance(v, (bool, int, float, str, list, tuple, type(None)))}
+    with open(path, 'w') as f:
+        json.dump(record, f, indent=4)
+
+
+def bounding_box_planes(plane_size=5, open_top=False):
+    """Get the locations, rotations and names of the planes which make up a
+    cube of side plane_size centered at the origin. With open_top the high
+    z plane is left out."""
+    half = plane_size / 2
+    plane_locs = ((0, 0, -half), (0, 0, half),
+        (-half, 0, 0), (half, 0, 0),
+        (0, -half, 0), (0, half, 0))
+    plane_rots = ((0, 0, 0), (0, 0, 0),
+        (0, np.pi/2, 0), (0, np.pi/2, 0),
+        (np.pi/2, 0, 0), (np.pi/2, 0, 0))
+    plane_names = ('plane_low_z', 'plane_high_z',
+        'plane_low_x', 'plane_high_x',
+        'plane_low_y', 'plane_high_y')
+    keep = [p for p in range(6) if not (open_top and p == 1)]
+    return ([plane_locs[p] for p in keep], [plane_rots[p] for p in keep],
+        [plane_names[p] for p in keep])
+
+
+def delete_all_objects_and_materials(keep_registered=True):
+    """Delete all objects and materials. Run this
+    at the beginning of the script to clear the environment.
+    Materials made by the material helpers are kept for reuse by scenes
+    built next in the same Blender session, unless keep_registered is
+    False."""
+    # delete all physics bakes
+    bpy.ops.ptcache.free_bake_all()
+    # remove all objects and materials at once, which is much faster than
+    # deleting the selection with bpy.ops.object.delete in large scenes
+    D.batch_remove(list(D.objects) + [mat for mat in D.materials
+        if not (keep_registered and mat.get(MATERIAL_KEY) is not None)])
+    if not keep_registered:
+        MATERIALS.clear()
+    # remove the meshes, lights and animation left behind by the objects
+    purge_orphans(keep_registered=keep_registered)
+
+
+def purge_orphans(keep_registered=True):
+    """Remove the datablocks which nothing uses any more, like the meshes
+    of deleted objects, so rebuilding scenes in one Blender session doesn't
+    keep growing its memory. Materials made by the material helpers are
+    kept unless keep_registered is False. Returns the number of removed
+    datablocks."""
+    removed = 0
+    while True:
+        # removing meshes can leave their materials unused, so repeat
+        orphans = [block for name in ORPHAN_DATA
+            for block in getattr(D, name, ())
+            if block.users == 0 and not block.use_fake_user
+            and not (keep_registered and block.get(MATERIAL_KEY) is not None)]
+        if not orphans:
+            return removed
+        D.batch_remove(orphans)
+        removed += len(orphans)
+
+
+def add_camera(loc=(0, 0, 20), rot=(0, 0, 0)):
+    """Add a camera to the scene."""
+    bpy.ops.object.camera_add(location=loc, rotation=rot)
+    C.object.name = 'cam'
+    C.scene.camera = D.objects['cam']
+
+
+def add_light(loc=(10, -10, 10), name='lamp'):
+    """Add a sun light source to the scene."""
+    bpy.ops.object.light_add(type='SUN', radius=1.0, location=loc)
+    C.object.name = name
+
+
+def set_background(rgb_alpha=(0, 0, 0, 0)):
+    """Set the background color of the scene."""
+    bg = D.worlds["World"].node_tree.nodes["Background"]
+    bg.inputs[0].default_value = rgb_alpha
+
+
+def set_keyframe_range(start_kf, end_kf):
+    """Set the start and end keyframes of the scene and go to the first."""
+    C.scene.frame_start = start_kf
+    C.scene.frame_end = end_kf
+    C.scene.frame_set(start_kf)
+
+
+def set_rigid_body_accuracy(steps_per_second=300, solver_iterations=50):
+    """Increase rigid body accuracy so objects don't pass through each
+    other. Does nothing in scenes without rigid bodies."""
+    if C.scene.rigidbody_world is None:
+        return
+    C.scene.rigidbody_world.steps_per_second = steps_per_second
+    C.scene.rigidbody_world.solver_iterations = solver_iterations
+
+
+def boundary_plane(size, loc=(0, 0, 0), rot=(0, 0, 0),
+    name=None, bounciness=1, friction=0, collision_margin=0.1,
+    rigid_body_type='PASSIVE', mat=None):
+    """Create bounding plane for rigid body simulation."""
+    # create plane
+    bpy.ops.mesh.primitive_plane_add(
+        size=size, location=loc, rotation=rot)
+    # name it
+    if name:
+        C.object.name = name
+    # set material
+    if mat:
+        C.active_object.data.materials.append(mat)
+    # make it a rigid object
+    bpy.ops.rigidbody.objects_add()
+    C.object.rigid_body.type = rigid_body_type
+    # set how elastic collisions are
+    C.object.rigid_body.restitution = bounciness
+    C.object.rigid_body.friction = friction
+    C.object.rigid_body.collision_margin = collision_margin
+    bpy.ops.object.modifier_add(type='SOLIDIFY')
+    C.object.modifiers["Solidify"].thickness = 0.1
+    bpy.ops.object.modifier_apply(apply_as='DATA', modifier="Solidify")
+
+
+def create_bounding_box(plane_size=5, open_top=False, **plane_kwargs):
+    """Create bounding box for rigid bodies by building
+    transparent cube from multiple planes. Keyword arguments
+    are passed on to boundary_plane."""
+    plane_locs, plane_rots, plane_names = bounding_box_planes(
+        plane_size, open_top=open_top)
+    # create transparent material
+    mat = make_transparent_material()
+    # create each plane
+    for p in range(len(plane_locs)):
+        boundary_plane(
+            plane_size,
+            loc=plane_locs[p],
+            rot=plane_rots[p],
+            name=plane_names[p],
+            mat=mat,
+            **plane_kwargs)
+
+
+def material_key(kind, *params):
+    """Get the key of a material made by the helper kind with the given
+    parameters, as stored in its MATERIAL_KEY property."""
+    return json.dumps([kind] + [p if isinstance(p, str)
+        else np.asarray(p, dtype=float).tolist() for p in params])
+
+
+def find_material(key):
+    """Get the material registered with key, or None if there is none.
+    Materials of a rebuilt or reopened scene are found by their
+    MATERIAL_KEY property."""
+    mat = D.materials.get(MATERIALS.get(key, ''))
+    if mat is None or mat.get(MATERIAL_KEY) != key:
+        mat = next((m for m in D.materials if m.get(MATERIAL_KEY) == key),
+            None)
+    if mat is not None:
+        MATERIALS[key] = mat.name
+    return mat
+
+
+def register_material(mat, key):
+    """Register a material so later calls of its helper with the same
+    parameters reuse it."""
+    mat[MATERIAL_KEY] = key
+    MATERIALS[key] = mat.name
+    return mat
+
+
+def make_transparent_material(name='transparent', reuse=True):
+    """Create a transparent material, or reuse the one made before unless
+    reuse is False."""
+    key = material_key('transparent')
+    mat = find_material(key) if reuse else None
+    if mat is not None:
+        return mat
+    mat = D.materials.new(name=name)
+    mat.use_nodes = True
+    mat.shadow_method = 'NONE'
+    mat.blend_method = 'HASHED'
+    mat.diffuse_color = (0, 0, 0, 0)
+    mat.node_tree.nodes["Principled BSDF"].inputs[18].default_value = 0
+    return register_material(mat, key)
+
+
+def make_gas_material(rgb_alpha, name='gas', shadow_method='NONE',
+    reuse=True):
+    """Create a material for gas particles. Use it like this:
+    mat = make_gas_material((0.8, 0.04, 0.05, 1))
+    C.active_object.data.materials.append(mat)
+    A material made before with the same color and shadow method is
+    returned instead, whatever its name, unless reuse is False, so every
+    distinct material is compiled by the render engine only once.
+    """
+    key = material_key('gas', rgb_alpha, shadow_method)
+    mat = find_material(key) if reuse else None
+    if mat is not None:
+        return mat
+    mat = D.materials.new(name=name)
+    mat.use_nodes = True
+    mat_nodes = mat.node_tree.nodes["Principled BSDF"]
+    mat.diffuse_color = rgb_alpha
+    mat_nodes.inputs[0].default_value = rgb_alpha
+    mat_nodes.inputs[5].default_value = 0
+    mat.roughness = 1
+    mat.shadow_method = shadow_method
+    return register_material(mat, key)
+
+
+def create_particle(loc=(0, 0, 0), rot=(0, 0, 0), radius=1, name=None,
+    mat=None, segments=32, rings=16):
+    """Create a sphere to simulate a gas particle. Use fewer segments and
+    rings for small particles, see particle_spawner.camera_sphere_lod."""
+    bpy.ops.mesh.primitive_uv_sphere_add(
+        segments=segments,
+        ring_count=rings,
+        location=loc,
+        radius=radius)
+    bpy.ops.object.shade_smooth()
+    if name:
+        C.object.name = name
+    if mat:
+        C.active_object.data.materials.append(mat)
+
+
+def add_collision_properties(obj, mass=1, bounciness=1, friction=0,
+    collision_margin=0.1, solidify=True):
+    """Turn a mesh object into a rigid body for elastic collisions.
+    The SOLIDIFY shell doubles the vertices of the mesh and can't be
+    applied to meshes shared by several particles, so leave it out with
+    solidify=False. The SPHERE collision shape takes its radius from the
+    bounding box, which the shell grows for spheres thinner than it, so
+    give such spheres the radius of solidified_radius instead."""
+    bpy.context.view_layer.objects.active = obj
+    C.object.rigid_body.restitution = bounciness
+    C.object.rigid_body.friction = friction
+    C.object.rigid_body.linear_damping = 0
+    C.object.rigid_body.angular_damping = 0
+    C.object.display.show_shadows = False
+    C.object.rigid_body.collision_margin = collision_margin
+    C.object.rigid_body.collision_shape = 'SPHERE'
+    if solidify:
+        bpy.ops.object.modifier_add(type='SOLIDIFY')
+        C.object.modifiers["Solidify"].thickness = SOLIDIFY_THICKNESS
+        bpy.ops.object.modifier_apply(apply_as='DATA', modifier="Solidify")
+    C.object.rigid_body.mass = mass
+
+
+def solidified_radius(radius, thickness=SOLIDIFY_THICKNESS):
+    """Get the radius of the bounding sphere of a sphere with the inward
+    SOLIDIFY shell of add_collision_properties, which reaches through the
+    center of spheres thinner than the shell."""
+    return max(radius, thickness - radius)
+
+
+def create_force_particle(loc=(0, 0, 0), radius=1,
+    p_name=None, mat=None, force=0, falloff=2, mass=1,
+    lin_damp=0.25, ang_damp=0.25, sticky=True):
+    """Create a sphere to simulate a particle with an inherent force.
+    Force can be positive or negative (repulsive or attractive) with falloff
+    exponent and linear and angular damping of particle motion. Sticky
+    particles get a collision modifier with stickiness."""
+    create_particle(loc=loc, radius=radius, name=p_name, mat=mat)
+    p = C.object
+
+    # make particle a rigid body
+    bpy.ops.rigidbody.object_add()
+    C.object.rigid_body.linear_damping = lin_damp
+    C.object.rigid_body.angular_damping = ang_damp
+    C.object.rigid_body.mass = mass
+
+    # add collision properties
+    if sticky:
+        bpy.ops.object.modifier_add(type='COLLISION')
+        C.object.collision.stickiness = 0.2
+        C.object.collision.damping_factor = 0.2
+        C.object.collision.friction_factor = 0.2
+
+    # create force field
+    if force != 0:
+        bpy.ops.object.effector_add(
+            type='FORCE',
+            enter_editmode=False,
+            location=loc)
+        C.object.field.strength = force
+        C.object.field.falloff_power = falloff
+        C.object.name = p.name + '_force'
+        f = C.object
+        # select particle and force field and parent them
+        bpy.ops.object.select_all(action='DESELECT')
+        p.select_set(True)
+        f.select_set(True)
+        C.view_layer.objects.active = p
+        bpy.ops.object.parent_set(type='OBJECT')
+
+
+def render(filepath=RUN_PARAMS['render_path'], workers=1):
+    """Render the animation, baking the simulation first if needed. With
+    more than one worker, chunks of frames are rendered by parallel
+    headless Blender processes (see parallel_render.render_parallel)."""
+    if workers > 1:
+        render_parallel(filepath, workers=workers)
+        return
+    C.scene.render.filepath = filepath
+    C.scene.render.image_settings.file_format = 'AVI_JPEG'
+    C.scene.render.image_settings.quality = 100
+    world = C.scene.rigidbody_world
+    if world is None or not world.point_cache.is_baked:
+        bpy.ops.ptcache.bake_all(bake=True)
+    if bpy.app.background:
+        bpy.ops.render.render(animation=True)
+    else:
+        bpy.ops.render.render('INVOKE_DEFAULT', animation=True)
+
+
+def bake(cache_dir=RUN_PARAMS['bake_cache'], max_gb=BAKE_CACHE_GB,
+    blend_path='', tune_frames=None):
+    """Bake the simulation, or open a cached bake of an identical scene
+    from cache_dir instead (see bake_cache.py). An empty cache_dir turns
+    the cache off. A restored scene is copied to blend_path if given.
+    With tune_frames, the solver settings are tuned on that many frames
+    before baking (see tune_solver_accuracy), but not for cached bakes.
+    Returns whether the bake came from the cache."""
+    cache_dir = os.path.expanduser(cache_dir)
+    key = bake_key(tune_frames=tune_frames) if cache_dir else None
+    if key and restore_bake(key, cache_dir, blend_path=blend_path):
+        return True
+    if tune_frames:
+        tune_solver_accuracy(tune_frames)
+    bpy.ops.ptcache.bake_all(bake=True)
+    if key:
+        store_bake(key, cache_dir, max_gb=max_gb)
+    return False
+
+
+def finish_scene(params):
+    """Run the stages after building a scene as selected by
+    params['stages']: bake the rigid body simulation for the bake or
+    render stage unless it is already baked or in the bake cache, after
+    tuning the solver settings if params['tune_solver'] is set and the
+    bake is not in the cache, save
+    the scene to params['blend_path'] and export the particle
+    trajectories to params['trajectory_path'] if given, and render the
+    animation to params['render_path'], with params['render_workers']
+    parallel processes if more than one. The time of each stage is written
+    to params['benchmark_path'] if given (see write_stage_times), and to
+    params['done_path'] once all stages have succeeded."""
+    stages = params['stages']
+    world = C.scene.rigidbody_world
+    baking = 'bake' in stages or 'render' in stages
+    if baking and world and not world.point_cache.is_baked:
+        start_stage('bake')
+        bake(params['bake_cache'], max_gb=params['bake_cache_gb'],
+            blend_path=params['blend_path'],
+            tune_frames=params['tune_frames'] if params['tune_solver']
+            else None)
+    if params['blend_path'] and ('build' in stages or 'bake' in stages):
+        start_stage('save')
+        bpy.ops.wm.save_as_mainfile(
+            filepath=os.path.abspath(params['blend_path']), copy=True)
+    if params['trajectory_path'] and 'bake' in stages:
+        start_stage('export')
+        extract_trajectory(params['trajectory_path'])
+    if 'render' in stages:
+        start_stage('render')
+        render(params['render_path'], workers=params['render_workers'])
+    start_stage(None)
+    if params['benchmark_path']:
+        write_stage_times(params['benchmark_path'], params)
+    if params['done_path']:
+        write_stage_times(params['done_path'], params)
@@ -0,0 +1,149 @@
+import os
+import inspect
+
+try:
+    import bpy
+    from bpy import data as D
+    from bpy import context as C
+except ImportError:
+    # template keys can be computed outside of Blender
+    bpy = D = C = None
+
+import scene_builder
+from bake_cache import hash_inputs
+from scene_builder import MATERIAL_KEY, find_material
+
+"""
+Reuse the base of a scene, like its camera, light, background and walls,
+from a template .blend file instead of building it with operators.
+
+Every scene script starts by adding the same few objects with operators,
+each of which gets slower with the number of objects in the session. The
+first run saves the objects made by a build function to a small template
+file, and later runs append them from it:
+
+def build_base():
+    add_camera(loc=(30, -30, 13), rot=(np.pi/2.5, 0, np.pi/4))
+    add_light(loc=(10, -10, 10))
+    set_background(rgb_alpha=(1, 1, 1, 1))
+    create_bounding_box(plane_size=params['plane_size'])
+
+delete_all_objects_and_materials()
+base_scene(build_base, {'plane_size': params['plane_size']},
+    template_dir=params['base_scene_cache'])
+
+The template is found by a hash of the Blender version, the source of the
+build function and of scene_builder, and the parameters it uses, so give
+every parameter the build function reads. Scene scripts do this when
+params['base_scene_cache'] is a directory.
+"""
+
+
+BASE_SCENE_DIR = os.path.expanduser('~/.cache/blender_base_scenes')
+
+
+def template_key(build, params=None):
+    """Get the key of the template of the scene made by build with the
+    given parameters."""
+    with open(scene_builder.__file__) as f:
+        helpers = f.read()
+    try:
+        source = inspect.getsource(build)
+    except (OSError, TypeError):
+        # functions defined in Blender's text editor have no source file
+        source = build.__name__
+    return hash_inputs({
+        'blender': bpy.app.version_string if bpy else None,
+        'build': source,
+        'helpers': helpers,
+        'params': params or {},
+    })
+
+
+def template_path(key, template_dir=BASE_SCENE_DIR):
+    """Get the path of the template with this key."""
+    return os.path.join(template_dir, key + '.blend')
+
+
+def write_template(path, objects, scene=None):
+    """Save the objects, and everything they use, and the world of the
+    scene to a template file."""
+    scene = scene or C.scene
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # write to a temporary file so other jobs never read half a file
+    tmp_path = '{}_{}.tmp.blend'.format(os.path.splitext(path)[0],
+        os.getpid())
+    D.libraries.write(tmp_path, set(objects) | {scene.world},
+        fake_user=True)
+    os.replace(tmp_path, path)
+
+
+def append_template(path, scene=None):
+    """Append the objects and world of a template file to the scene, with
+    the camera set as the scene camera and passive rigid bodies added to
+    the rigid body world. Returns the appended objects."""
+    scene = scene or C.scene
+    with D.libraries.load(path, link=False) as (data_from, data_to):
+        data_to.objects = data_from.objects
+        data_to.worlds = data_from.worlds
+    objects = [obj for obj in data_to.objects if obj is not None]
+    for obj in objects:
+        scene.collection.objects.link(obj)
+        obj.use_fake_user = False
+        if obj.type == 'CAMERA':
+            scene.camera = obj
+    if data_to.worlds and data_to.worlds[0] is not None:
+        world, old_world = data_to.worlds[0], scene.world
+        world.use_fake_user = False
+        scene.world = world
+        if old_world is not None and old_world.users == 0:
+            D.worlds.remove(old_world)
+        # set_background looks the world up by name
+        world.name = 'World'
+    reuse_registered_materials(objects)
+    rigid_bodies = [obj for obj in objects if obj.rigid_body is not None]
+    if rigid_bodies:
+        if scene.rigidbody_world is None:
+            bpy.ops.rigidbody.world_add()
+        world = scene.rigidbody_world
+        if world.collection is None:
+            world.collection = D.collections.new('RigidBodyWorld')
+        for obj in rigid_bodies:
+            world.collection.objects.link(obj)
+    return objects
+
+
+def reuse_registered_materials(objects):
+    """Replace the appended copies of materials made by the material
+    helpers with the ones already in the session."""
+    for obj in objects:
+        for slot in obj.material_slots:
+            mat = slot.material
+            key = mat.get(MATERIAL_KEY) if mat is not None else None
+            if key is None:
+                continue
+            mat.use_fake_user = False
+            existing = find_material(key)
+            if existing is not None and existing is not mat:
+                mat.user_remap(existing)
+                D.materials.remove(mat)
+            else:
+                scene_builder.register_material(mat, key)
+
+
+def base_scene(build, params=None, template_dir=BASE_SCENE_DIR):
+    """Append the base scene made by build with the given parameters from
+    its template, or build it and save the template for the next run.
+    Without a template_dir, build is simply called. Returns whether the
+    template was used."""
+    if not template_dir:
+        build()
+        return False
+    path = template_path(template_key(build, params), template_dir)
+    if os.path.isfile(path):
+        append_template(path)
+        return True
+    before = set(D.objects)
+    build()
+    write_template(path, [obj for obj in D.objects if obj not in before])
+    return False
@@ -0,0 +1,177 @@
+import time
+import numpy as np
+
+try:
+    import bpy
+    from bpy import context as C
+except ImportError:
+    # the tunneling checks also work on exported trajectories
+    bpy = C = None
+
+from neighbors import cell_list_pairs
+from trajectory_export import active_rigid_bodies, read_trajectory
+
+"""
+Find the cheapest rigid body solver settings which still keep particles
+from passing through walls and each other.
+
+The scene scripts set steps_per_second and solver_iterations high so
+objects don't pass through each other, and bake time grows with both.
+tune_solver_accuracy bakes the first frames of the built scene at
+decreasing accuracy, checks every trial for tunneling, and sets the
+cheapest settings which pass:
+
+result = tune_solver_accuracy(trial_frames=50)
+print(result['speedup'])
+
+A trial fails if a particle ends up outside the walls of the scene or two
+particles overlap by more than a fraction tolerance of their radii.
+The cost of settings is steps_per_second times solver_iterations, not the
+measured bake time, which is mostly noise for short trials, so the same
+scene always gets the same settings. finish_scene runs the tuner before
+baking with --set tune_solver=true, unless the bake is in the cache.
+"""
+
+
+# candidate settings, from most to least accurate
+STEPS_PER_SECOND = (1000, 500, 300, 240, 120, 60)
+SOLVER_ITERATIONS = (150, 100, 50, 20, 10)
+
+
+def wall_bounds(scene=None):
+    """Get the low and high corners of the space enclosed by the passive
+    planes of a scene, such as those of create_bounding_box. Each plane
+    bounds the axis it faces. Axes with a single plane, like a floor, are
+    open upwards, and axes without planes are open both ways."""
+    scene = scene or C.scene
+    low, high = np.full(3, np.inf), np.full(3, -np.inf)
+    for obj in scene.objects:
+        if obj.rigid_body is None or obj.rigid_body.type != 'PASSIVE':
+            continue
+        mat = np.array(obj.matrix_world)
+        # the local z axis is the normal of a plane
+        axis = np.argmax(np.abs(mat[:3, 2]))
+        low[axis] = min(low[axis], mat[axis, 3])
+        high[axis] = max(high[axis], mat[axis, 3])
+    high[low >= high] = np.inf
+    low[np.isinf(low)] = -np.inf
+    return low, high
+
+
+def escaped(trajectory, low, high, margin=0):
+    """Get the indices of particles which leave the box from low to high
+    by more than margin on any frame of a (frames, N, 3) trajectory."""
+    outside = ((trajectory < np.asarray(low) - margin)
+        | (trajectory > np.asarray(high) + margin))
+    return np.flatnonzero(outside.any(axis=(0, 2)))
+
+
+def max_overlap(positions, radii):
+    """Get the largest overlap of two spheres at the given (N, 3)
+    positions, as a fraction of the smaller radius."""
+    radii = np.broadcast_to(np.asarray(radii, dtype=float), (len(positions),))
+    if len(positions) < 2:
+        return 0
+    i, j = cell_list_pairs(positions, 2 * radii.max())
+    if not len(i):
+        return 0
+    dist = np.linalg.norm(positions[i] - positions[j], axis=1)
+    overlap = (radii[i] + radii[j] - dist) / np.minimum(radii[i], radii[j])
+    return max(overlap.max(), 0)
+
+
+def check_tunneling(trajectory, radii, low, high, tolerance=0.25):
+    """Check a (frames, N, 3) trajectory of spheres for particles which
+    passed through the walls or overlap by more than tolerance of their
+    radius. Returns a list of the problems found."""
+    problems = []
+    out = escaped(trajectory, low, high, margin=tolerance * np.max(radii))
+    if len(out):
+        problems.append('{} particles escaped the walls'.format(len(out)))
+    overlap = max(max_overlap(p, radii) for p in trajectory)
+    if overlap > tolerance:
+        problems.append('particles overlap by {:.0%} of their radius'.format(
+            overlap))
+    return problems
+
+
+def trial_bake(steps_per_second, solver_iterations, frame_num,
+    objects, radii, low, high, tolerance=0.25, scene=None):
+    """Bake the first frame_num frames of the simulation with the given
+    solver settings and check them for tunneling. Returns the bake time
+    in seconds and the list of problems found."""
+    scene = scene or C.scene
+    world = scene.rigidbody_world
+    world.steps_per_second = steps_per_second
+    world.solver_iterations = solver_iterations
+    bpy.ops.ptcache.free_bake_all()
+    start = time.perf_counter()
+    bpy.ops.ptcache.bake_all(bake=True)
+    seconds = time.perf_counter() - start
+    trajectory = read_trajectory(np.empty((frame_num, len(objects), 3)),
+        objects, world.point_cache.frame_start, scene=scene)
+    return seconds, check_tunneling(trajectory, radii, low, high,
+        tolerance=tolerance)
+
+
+def tune_solver_accuracy(trial_frames=50, tolerance=0.25, scene=None,
+    steps_per_second=STEPS_PER_SECOND, solver_iterations=SOLVER_ITERATIONS):
+    """Bake the first trial_frames frames of the scene with the current
+    solver settings and with every candidate combination of settings,
+    from most to least accurate, and set the cheapest settings which pass
+    check_tunneling, by steps_per_second times solver_iterations. Settings
+    less accurate in both values than a failed trial are not tried.
+    Returns a dictionary of the chosen settings, the bake times and
+    speedup versus the current settings, and all trials."""
+    scene = scene or C.scene
+    world = scene.rigidbody_world
+    cache = world.point_cache
+    frame_end = cache.frame_end
+    cache.frame_end = min(frame_end, cache.frame_start + trial_frames - 1)
+    frame_num = cache.frame_end - cache.frame_start + 1
+    objects = active_rigid_bodies(scene)
+    radii = np.array([max(obj.dimensions) / 2 for obj in objects])
+    low, high = wall_bounds(scene)
+    baseline = (world.steps_per_second, world.solver_iterations)
+    args = (frame_num, objects, radii, low, high, tolerance, scene)
+    try:
+        base_time, base_problems = trial_bake(*baseline, *args)
+        trials = [(baseline, base_time, base_problems)]
+        failed = []
+        candidates = sorted(
+            ((s, i) for s in steps_per_second for i in solver_iterations),
+            key=lambda c: c[0] * c[1], reverse=True)
+        for s, i in candidates:
+            if (s, i) == baseline:
+                continue
+            if any(s <= fs and i <= fi for fs, fi in failed):
+                continue
+            seconds, problems = trial_bake(s, i, *args)
+            trials.append(((s, i), seconds, problems))
+            if problems:
+                failed.append((s, i))
+    finally:
+        bpy.ops.ptcache.free_bake_all()
+        cache.frame_end = frame_end
+    passed = [t for t in trials if not t[2]]
+    if not passed:
+        # nothing passes, not even the current settings, so keep them
+        best, best_time = baseline, base_time
+    else:
+        # ties go to fewer steps, which are cheaper than iterations
+        best, best_time, _ = min(passed,
+            key=lambda t: (t[0][0] * t[0][1], t[0]))
+    world.steps_per_second, world.solver_iterations = best
+    result = {
+        'steps_per_second': best[0],
+        'solver_iterations': best[1],
+        'bake_time': best_time,
+        'baseline': baseline,
+        'baseline_time': base_time,
+        'speedup': base_time / best_time if best_time else 1,
+        'trials': [{'steps_per_second': s, 'solver_iterations': i,
+            'bake_time': t, 'problems': p} for (s, i), t, p in trials],
+    }
+    print('Solver settings {} -> {}: {:.1f}x faster bakes'.format(
+        baseline, best, result['speedup']))
+    return result
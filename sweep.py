@@ -0,0 +1,232 @@
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import hashlib
+import argparse
+import itertools
+import subprocess
+
+"""
+Run a scene script over a sweep of parameters with a bounded pool of
+headless Blender processes.
+
+Every point of a parameter grid or random design becomes a job which runs
+the scene script with its parameters as a config file (see
+scene_builder.scene_params) and saves the scene, and the trajectories of a
+baked scene, to its own directory. Jobs are tracked in a SQLite table in
+the sweep directory, failed jobs are retried, and jobs which already got
+to the end of finish_scene are skipped, so an interrupted sweep can simply
+be started again. A sweep is described by a JSON file:
+
+{
+    "script": "blender_sticky_particles.py",
+    "grid": {"force": [-30, -100, -200], "particle_num": [10, 50]},
+    "random": {"samples": 20, "seed": 0,
+        "ranges": {"heavy_mass": [5, 50]}},
+    "fixed": {"end_kf": 250},
+    "stages": "build,bake"
+}
+
+and run from a shell with:
+
+python sweep.py sweep.json /data/sticky_sweep --workers 8
+
+Grid and random points are combined: each random sample is run at every
+grid point.
+"""
+
+
+def grid_points(grid):
+    """Get the list of parameter dictionaries for all combinations of the
+    values in a {name: list of values} grid."""
+    names = sorted(grid)
+    return [dict(zip(names, values))
+        for values in itertools.product(*(grid[n] for n in names))]
+
+
+def random_points(ranges, samples, seed=None):
+    """Get samples parameter dictionaries with values drawn uniformly from
+    {name: (low, high)} ranges. Ranges with integer ends give integers."""
+    rng = random.Random(seed)
+    points = []
+    for _ in range(samples):
+        point = {}
+        for name in sorted(ranges):
+            low, high = ranges[name]
+            if isinstance(low, int) and isinstance(high, int):
+                point[name] = rng.randint(low, high)
+            else:
+                point[name] = rng.uniform(low, high)
+        points.append(point)
+    return points
+
+
+def sweep_points(spec):
+    """Get the parameter dictionaries of all jobs of a sweep description,
+    with its fixed parameters added to every point."""
+    points = grid_points(spec.get('grid', {}))
+    design = spec.get('random')
+    if design:
+        samples = random_points(design['ranges'], design['samples'],
+            seed=design.get('seed'))
+        points = [dict(p, **s) for p in points for s in samples]
+    fixed = dict(spec.get('fixed', {}))
+    if 'stages' in spec:
+        fixed['stages'] = spec['stages']
+    return [dict(fixed, **p) for p in points]
+
+
+def job_key(script, params):
+    """Get a short hash identifying the job of a script and parameters."""
+    text = json.dumps([os.path.basename(script), params], sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def open_job_table(db_path):
+    """Open the SQLite job table of a sweep, creating it if needed."""
+    db = sqlite3.connect(db_path)
+    db.execute('''CREATE TABLE IF NOT EXISTS jobs (
+        key TEXT PRIMARY KEY,
+        script TEXT,
+        params TEXT,
+        job_dir TEXT,
+        status TEXT DEFAULT 'pending',
+        attempts INTEGER DEFAULT 0,
+        returncode INTEGER,
+        started REAL,
+        finished REAL)''')
+    db.commit()
+    return db
+
+
+def add_jobs(db, script, points, sweep_dir):
+    """Add a job for every parameter point which is not in the job table
+    yet. Each job writes its results to its own directory in sweep_dir.
+    Returns the number of jobs added."""
+    script = os.path.abspath(script)
+    added = 0
+    for point in points:
+        key = job_key(script, point)
+        job_dir = os.path.join(os.path.abspath(sweep_dir), key)
+        params = dict(point,
+            blend_path=os.path.join(job_dir, 'scene.blend'),
+            trajectory_path=os.path.join(job_dir, 'trajectory.npy'),
+            render_path=os.path.join(job_dir, 'render'),
+            done_path=os.path.join(job_dir, 'done.json'))
+        cursor = db.execute('INSERT OR IGNORE INTO jobs '
+            '(key, script, params, job_dir) VALUES (?, ?, ?, ?)',
+            (key, script, json.dumps(params), job_dir))
+        added += cursor.rowcount
+    db.commit()
+    return added
+
+
+def result_exists(params):
+    """Check whether a job has already finished all its stages. A saved
+    scene is not enough, since the export or render after it can fail."""
+    done_path = params.get('done_path')
+    return bool(done_path) and os.path.isfile(done_path)
+
+
+def job_command(script, config_path, blender='blender', threads=0):
+    """Get the command line of a headless Blender job which runs a scene
+    script with the parameters of a config file. Blender exits with 1 if
+    the script raises, instead of 0."""
+    return [blender, '--background', '--threads', str(threads),
+        '--python-exit-code', '1', '--python', script, '--',
+        '--config', config_path]
+
+
+def start_job(db, key, script, params, job_dir, blender='blender',
+    threads=0):
+    """Write the config file of a job, start its Blender process with the
+    output going to a log file, and mark it as running."""
+    os.makedirs(job_dir, exist_ok=True)
+    config_path = os.path.join(job_dir, 'params.json')
+    with open(config_path, 'w') as f:
+        json.dump(params, f, indent=4)
+    log = open(os.path.join(job_dir, 'blender.log'), 'a')
+    proc = subprocess.Popen(
+        job_command(script, config_path, blender=blender, threads=threads),
+        stdout=log, stderr=subprocess.STDOUT)
+    db.execute('UPDATE jobs SET status = ?, attempts = attempts + 1, '
+        'started = ?, finished = NULL WHERE key = ?',
+        ('running', time.time(), key))
+    db.commit()
+    return proc, log
+
+
+def run_sweep(db_path, workers=None, blender='blender', max_attempts=3,
+    poll_interval=1):
+    """Run the pending and failed jobs of a job table with at most workers
+    Blender processes at a time, splitting the CPU threads between them.
+    Jobs which fail are retried until they have been attempted
+    max_attempts times. Returns the number of jobs per status."""
+    workers = workers or os.cpu_count()
+    threads = max(1, os.cpu_count() // workers)
+    db = open_job_table(db_path)
+    # jobs left running by an interrupted sweep start over
+    db.execute("UPDATE jobs SET status = 'pending' "
+        "WHERE status = 'running'")
+    db.commit()
+    running = {}
+    while True:
+        for key, (proc, log) in list(running.items()):
+            if proc.poll() is None:
+                continue
+            log.close()
+            del running[key]
+            db.execute('UPDATE jobs SET status = ?, returncode = ?, '
+                'finished = ? WHERE key = ?',
+                ('done' if proc.returncode == 0 else 'failed',
+                proc.returncode, time.time(), key))
+            db.commit()
+        todo = db.execute("SELECT key, script, params, job_dir FROM jobs "
+            "WHERE status IN ('pending', 'failed') AND attempts < ? "
+            "ORDER BY rowid", (max_attempts,)).fetchall()
+        todo = [job for job in todo if job[0] not in running]
+        for key, script, params, job_dir in todo:
+            if len(running) >= workers:
+                break
+            params = json.loads(params)
+            if result_exists(params):
+                db.execute("UPDATE jobs SET status = 'done' WHERE key = ?",
+                    (key,))
+                db.commit()
+                continue
+            running[key] = start_job(db, key, script, params, job_dir,
+                blender=blender, threads=threads)
+        if not running and not todo:
+            break
+        time.sleep(poll_interval)
+    counts = dict(db.execute(
+        'SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+    db.close()
+    return counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=(
+        'Run a scene script over a parameter sweep with headless Blender.'))
+    parser.add_argument('spec', help='JSON file describing the sweep')
+    parser.add_argument('sweep_dir', help='directory for the job results')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--blender', default='blender')
+    parser.add_argument('--max-attempts', type=int, default=3)
+    args = parser.parse_args()
+    with open(args.spec) as f:
+        spec = json.load(f)
+    os.makedirs(args.sweep_dir, exist_ok=True)
+    db_path = os.path.join(args.sweep_dir, 'jobs.sqlite')
+    db = open_job_table(db_path)
+    added = add_jobs(db, spec['script'], sweep_points(spec), args.sweep_dir)
+    db.close()
+    print('Added {} new jobs.'.format(added))
+    counts = run_sweep(db_path, workers=args.workers, blender=args.blender,
+        max_attempts=args.max_attempts)
+    print(', '.join('{} {}'.format(n, s) for s, n in sorted(counts.items())))
+    if counts.get('failed'):
+        sys.exit(1)
@@ -0,0 +1,44 @@
+import os
+import time
+import numpy as np
+
+from bake_cache import hash_inputs, evict_bakes, remove_stale_tmp
+
+"""
+Tests of the key hashing and eviction of bake_cache.py.
+"""
+
+
+def write_file(path, size, age=0):
+    with open(path, 'wb') as f:
+        f.write(b'\0' * size)
+    then = time.time() - age
+    os.utime(path, (then, then))
+    return path
+
+
+def test_hash_ignores_dict_order_and_array_layout():
+    a = np.arange(6.0).reshape(2, 3)
+    assert hash_inputs({'x': 1, 'a': a}) == \
+        hash_inputs({'a': np.asfortranarray(a), 'x': 1})
+    assert hash_inputs({'a': a}) != hash_inputs({'a': a.reshape(3, 2)})
+
+
+def test_evict_least_recently_used(tmp_path):
+    old = write_file(str(tmp_path / 'old.blend'), 600, age=30)
+    kept = write_file(str(tmp_path / 'kept.blend'), 600, age=20)
+    new = write_file(str(tmp_path / 'new.blend'), 600, age=10)
+    deleted = evict_bakes(str(tmp_path), max_gb=1000 / 2**30, keep=(kept,))
+    assert deleted == [old, new]
+    assert os.listdir(str(tmp_path)) == ['kept.blend']
+
+
+def test_evict_removes_stale_tmp_files(tmp_path):
+    tmp_dir = tmp_path / 'tmp'
+    tmp_dir.mkdir()
+    stale = write_file(str(tmp_dir / 'a_1.blend'), 10, age=2 * 24 * 3600)
+    write_file(str(tmp_dir / 'b_2.blend'), 10)
+    assert evict_bakes(str(tmp_path), max_gb=1) == [stale]
+    assert os.listdir(str(tmp_dir)) == ['b_2.blend']
+    assert remove_stale_tmp(str(tmp_path), max_age=-1) == \
+        [str(tmp_dir / 'b_2.blend')]
@@ -0,0 +1,67 @@
+import importlib
+import numpy as np
+import pytest
+
+import fake_bpy
+
+"""
+Tests of the keyframes written by keyframes.py, against the bpy stand-in.
+"""
+
+
+@pytest.fixture
+def keyframes():
+    """The keyframes module with a fresh fake bpy and an empty scene."""
+    fake_bpy.install()
+    import keyframes
+    return importlib.reload(keyframes)
+
+
+def add_bodies(num):
+    """Add num rigid body spheres at (i, 0, 0)."""
+    import bpy
+    objects = []
+    for i in range(num):
+        bpy.ops.mesh.primitive_uv_sphere_add(location=(i, 0, 0))
+        bpy.ops.rigidbody.object_add()
+        objects.append(bpy.context.object)
+    return objects
+
+
+def fcurve_keys(obj, data_path, index=0):
+    fc = obj.animation_data.action.fcurves.find(data_path, index=index)
+    return fc.keyframe_points.co, [p.interpolation for p in fc.keyframe_points]
+
+
+def test_initial_velocity_keys(keyframes):
+    import bpy
+    objects = add_bodies(2)
+    scene = bpy.context.scene
+    scene.render.fps, scene.render.fps_base = 25, 1
+    velocities = [(5, 0, 0), (0, 0, -10)]
+    keyframes.set_initial_velocities(objects, velocities, frame=10,
+        kick_frames=2)
+    co, interpolation = fcurve_keys(objects[0], 'location', 0)
+    np.testing.assert_allclose(co, [(10, 0), (12, 5 * 2 / 25)])
+    assert interpolation == ['LINEAR', 'LINEAR']
+    co, _ = fcurve_keys(objects[1], 'location', 2)
+    np.testing.assert_allclose(co, [(10, 0), (12, -10 * 2 / 25)])
+    # kinematic through the last moved frame, dynamic on the next one
+    co, interpolation = fcurve_keys(objects[1], 'rigid_body.kinematic')
+    np.testing.assert_allclose(co, [(10, 1), (12, 1), (13, 0)])
+    assert interpolation == ['CONSTANT'] * 3
+
+
+def test_initial_velocity_kick_starts_in_point_cache(keyframes):
+    import bpy
+    objects = add_bodies(1)
+    cache = bpy.context.scene.rigidbody_world.point_cache
+    keyframes.set_initial_velocities(objects, [(1, 0, 0)], frame=0)
+    co, _ = fcurve_keys(objects[0], 'rigid_body.kinematic')
+    np.testing.assert_allclose(co[:, 0],
+        [cache.frame_start, cache.frame_start + 1, cache.frame_start + 2])
+
+
+def test_initial_velocity_shape(keyframes):
+    with pytest.raises(ValueError):
+        keyframes.set_initial_velocities(add_bodies(2), [(1, 0, 0)])
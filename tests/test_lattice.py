@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from lattice import LATTICE_BASES, lattice_coordinates
+from neighbors import cell_list_pairs
+
+"""
+Tests of the crystal lattices of lattice.py.
+"""
+
+
+# distance between nearest neighbors for a lattice constant of 1
+NEIGHBOR_DISTANCES = {'sc': 1, 'bcc': np.sqrt(3) / 2, 'fcc': np.sqrt(2) / 2,
+    'diamond': np.sqrt(3) / 4, 'hcp': 1}
+
+
+@pytest.mark.parametrize('lattice', sorted(LATTICE_BASES))
+def test_lattice_site_count_and_spacing(lattice):
+    locs = lattice_coordinates(lattice, cells=(3, 4, 5), a=1.5)
+    assert locs.shape == (3 * 4 * 5 * len(LATTICE_BASES[lattice]), 3)
+    dist = np.linalg.norm(locs[:, None] - locs, axis=2)
+    np.fill_diagonal(dist, np.inf)
+    np.testing.assert_allclose(dist.min(), 1.5 * NEIGHBOR_DISTANCES[lattice])
+
+
+def test_lattice_is_centered():
+    locs = lattice_coordinates('fcc', cells=4, a=2)
+    np.testing.assert_allclose(locs.min(axis=0), -locs.max(axis=0))
+
+
+def test_lattice_vacancies_and_displacement():
+    perfect = lattice_coordinates('sc', cells=10)
+    locs = lattice_coordinates('sc', cells=10, vacancy=0.2, seed=0)
+    assert 700 < len(locs) < 900
+    # every remaining atom is on a lattice site
+    assert len(cell_list_pairs(np.vstack((perfect, locs)), 0.1)[0]) \
+        == len(locs)
+    moved = lattice_coordinates('sc', cells=10, displacement=0.01, seed=0)
+    np.testing.assert_allclose((moved - perfect).std(), 0.01, rtol=0.1)
+
+
+def test_unknown_lattice():
+    with pytest.raises(ValueError):
+        lattice_coordinates('abc')
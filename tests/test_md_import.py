@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from md_import import trajectory_chunks
+
+"""
+Tests of the XYZ and LAMMPS dump readers of md_import.py.
+"""
+
+
+def write_xyz(path, types, trajectory):
+    with open(path, 'w') as f:
+        for frame, positions in enumerate(trajectory):
+            f.write('{}\nframe {}\n'.format(len(types), frame))
+            for t, (x, y, z) in zip(types, positions):
+                f.write('{} {:.17g} {:.17g} {:.17g}\n'.format(t, x, y, z))
+
+
+def write_lammps(path, types, trajectory, box=(-5, 5), scaled=False):
+    columns = 'xs ys zs' if scaled else 'x y z'
+    with open(path, 'w') as f:
+        for frame, positions in enumerate(trajectory):
+            f.write('ITEM: TIMESTEP\n{}\n'.format(100 * frame))
+            f.write('ITEM: NUMBER OF ATOMS\n{}\n'.format(len(types)))
+            f.write('ITEM: BOX BOUNDS pp pp pp\n')
+            f.write('{} {}\n'.format(*box) * 3)
+            f.write('ITEM: ATOMS id type {}\n'.format(columns))
+            if scaled:
+                positions = (positions - box[0]) / (box[1] - box[0])
+            # atoms out of id order, as written by parallel runs
+            for i in reversed(range(len(types))):
+                f.write('{} {} {:.17g} {:.17g} {:.17g}\n'.format(
+                    i + 1, types[i], *positions[i]))
+
+
+TRAJECTORY = np.random.default_rng(0).uniform(-4, 4, (11, 5, 3))
+
+
+def read_all(path, **kwargs):
+    chunks = list(trajectory_chunks(str(path), **kwargs))
+    return chunks[0][0], np.concatenate([c[1] for c in chunks])
+
+
+def test_xyz_round_trip(tmp_path):
+    path = tmp_path / 'run.xyz'
+    write_xyz(path, ['O', 'H', 'H', 'O', 'C'], TRAJECTORY)
+    types, positions = read_all(path, chunk_frames=4)
+    assert list(types) == ['O', 'H', 'H', 'O', 'C']
+    np.testing.assert_allclose(positions, TRAJECTORY)
+
+
+@pytest.mark.parametrize('scaled', [False, True])
+def test_lammps_round_trip(tmp_path, scaled):
+    path = tmp_path / 'run.lammpstrj'
+    write_lammps(path, [1, 2, 2, 1, 3], TRAJECTORY, scaled=scaled)
+    types, positions = read_all(path, chunk_frames=3)
+    assert list(types) == [1, 2, 2, 1, 3]
+    np.testing.assert_allclose(positions, TRAJECTORY)
+
+
+def test_stride_and_max_frames(tmp_path):
+    path = tmp_path / 'run.xyz'
+    write_xyz(path, ['O'] * 5, TRAJECTORY)
+    _, positions = read_all(path, stride=3, max_frames=3, chunk_frames=2)
+    np.testing.assert_allclose(positions, TRAJECTORY[[0, 3, 6]])
+
+
+def test_chunks_hold_at_most_chunk_frames(tmp_path):
+    path = tmp_path / 'run.xyz'
+    write_xyz(path, ['O'] * 5, TRAJECTORY)
+    sizes = [len(p) for _, p in trajectory_chunks(str(path), chunk_frames=4)]
+    assert sizes == [4, 4, 3]
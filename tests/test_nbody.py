@@ -0,0 +1,48 @@
+import numpy as np
+
+from nbody import pairwise_forces, contact_forces, integrate_forces
+
+"""
+Tests of the pairwise forces and integration of nbody.py.
+"""
+
+
+def test_cutoff_forces_match_all_pairs():
+    rng = np.random.default_rng(0)
+    positions = rng.uniform(-3, 3, (300, 3))
+    strengths = rng.uniform(-50, 50, 300)
+    # a cutoff beyond the largest distance gives the all-pairs forces
+    np.testing.assert_allclose(
+        pairwise_forces(positions, strengths, cutoff=20),
+        pairwise_forces(positions, strengths), rtol=1e-9, atol=1e-9)
+
+
+def test_cutoff_ignores_far_pairs():
+    positions = np.array([(0, 0, 0), (1, 0, 0), (5, 0, 0)])
+    forces = pairwise_forces(positions, -1, falloff=2, cutoff=2)
+    # the near pair attracts with strength / r**2, the far one is ignored
+    np.testing.assert_allclose(forces, [(1, 0, 0), (-1, 0, 0), (0, 0, 0)])
+
+
+def test_contact_forces_push_overlapping_pairs_apart():
+    positions = np.array([(0, 0, 0), (0.3, 0, 0), (2, 0, 0)])
+    forces = contact_forces(positions, 0.4, stiffness=100)
+    np.testing.assert_allclose(forces, [(-10, 0, 0), (10, 0, 0), (0, 0, 0)])
+
+
+def test_contact_keeps_attracting_particles_apart():
+    positions = np.array([(-1, 0, 0), (1, 0, 0)])
+    free = integrate_forces(positions, 100, strengths=-30)
+    contact = integrate_forces(positions, 100, strengths=-30,
+        contact_distance=0.4)
+    gap = lambda t: np.linalg.norm(t[:, 0] - t[:, 1], axis=1)
+    assert gap(free).min() < 0.2
+    assert gap(contact).min() > 0.3
+
+
+def test_integrate_forces_falls_under_gravity():
+    trajectory = integrate_forces([(0, 0, 10)], 25, gravity=(0, 0, -2),
+        lin_damp=0, fps=24, steps_per_second=2400)
+    # z = 10 - g t**2 / 2 after one second
+    np.testing.assert_allclose(trajectory[-1, 0], (0, 0, 9), atol=0.01)
+    assert trajectory.shape == (25, 1, 3)
@@ -0,0 +1,39 @@
+import numpy as np
+
+from neighbors import (cell_list_pairs, build_neighbor_list,
+    update_neighbor_list)
+
+"""
+Tests of the cell list neighbor search of neighbors.py.
+"""
+
+
+def brute_force_pairs(positions, cutoff):
+    """Get the set of pairs (i, j), i < j, closer than the cutoff."""
+    i, j = np.triu_indices(len(positions), 1)
+    close = np.linalg.norm(positions[i] - positions[j], axis=1) < cutoff
+    return set(zip(i[close], j[close]))
+
+
+def test_cell_list_pairs_match_brute_force():
+    rng = np.random.default_rng(0)
+    positions = rng.uniform(-5, 5, (500, 3)) * [1, 1, 0.2]
+    for cutoff in (0.3, 1, 2.5):
+        i, j = cell_list_pairs(positions, cutoff)
+        assert np.all(i < j)
+        pairs = set(zip(i, j))
+        assert len(pairs) == len(i)
+        assert pairs == brute_force_pairs(positions, cutoff)
+
+
+def test_neighbor_list_rebuilds_only_after_drift():
+    rng = np.random.default_rng(1)
+    positions = rng.uniform(0, 10, (200, 3))
+    nlist = build_neighbor_list(positions, 1, skin=0.4)
+    # moving less than half the skin keeps the list
+    assert update_neighbor_list(nlist, positions + 0.1) is nlist
+    moved = positions + rng.normal(scale=0.5, size=positions.shape)
+    rebuilt = update_neighbor_list(nlist, moved)
+    assert rebuilt is not nlist
+    # every pair within the cutoff is in the list
+    assert brute_force_pairs(moved, 1) <= set(zip(*rebuilt['pairs']))
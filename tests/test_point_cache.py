@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from point_cache import (open_pc2, append_pc2, finish_pc2, write_pc2,
+    read_pc2_header, read_pc2)
+
+"""
+Tests of the PC2 point cache files of point_cache.py.
+"""
+
+
+def test_pc2_round_trip(tmp_path):
+    path = str(tmp_path / 'walk.pc2')
+    trajectory = np.random.default_rng(0).normal(size=(20, 7, 3))
+    assert write_pc2(path, trajectory, frame_start=5) == 20
+    assert read_pc2_header(path) == {'point_num': 7, 'frame_num': 20,
+        'frame_start': 5, 'sample_rate': 1}
+    np.testing.assert_allclose(read_pc2(path), trajectory, rtol=1e-6)
+
+
+def test_pc2_written_in_chunks(tmp_path):
+    path = str(tmp_path / 'chunks.pc2')
+    trajectory = np.arange(10 * 4 * 3, dtype=float).reshape(10, 4, 3)
+    f = open_pc2(path, 4)
+    for chunk in np.array_split(trajectory, 3):
+        append_pc2(f, chunk)
+    finish_pc2(f)
+    np.testing.assert_array_equal(read_pc2(path), trajectory)
+
+
+def test_pc2_point_number_must_match(tmp_path):
+    with pytest.raises(ValueError):
+        write_pc2(str(tmp_path / 'bad.pc2'),
+            [np.zeros((2, 3, 3)), np.zeros((2, 4, 3))])
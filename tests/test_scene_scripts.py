@@ -0,0 +1,41 @@
+import os
+import sys
+import glob
+import subprocess
+import pytest
+
+"""
+Smoke test of the scene scripts: build and bake every script against the
+pure-Python bpy stand-in (see fake_bpy.py), without a Blender binary, and
+check that the scripts with scene parameters save their scene.
+"""
+
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = sorted(glob.glob(os.path.join(REPO, 'blender_*.py'))) \
+    + [os.path.join(REPO, 'create_body.py')]
+
+
+def write_xyz(path):
+    """Write a three frame XYZ trajectory of two atoms."""
+    with open(path, 'w') as f:
+        for frame in range(3):
+            f.write('2\nframe {}\n'.format(frame))
+            f.write('O 0 0 {}\nH 1 0 {}\n'.format(frame, frame))
+
+
+@pytest.mark.parametrize('script', SCRIPTS, ids=os.path.basename)
+def test_scene_script_runs(script, tmp_path):
+    args = ['--stages', 'build,bake',
+        '--set', 'blend_path={}'.format(tmp_path / 'scene.blend')]
+    if script.endswith('blender_md_trajectory.py'):
+        xyz_path = tmp_path / 'run.xyz'
+        write_xyz(xyz_path)
+        args += ['--set', 'trajectory_file={}'.format(xyz_path)]
+    proc = subprocess.run(
+        [sys.executable, os.path.join(REPO, 'fake_bpy.py'), script, '--']
+        + args, cwd=str(tmp_path), stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT, universal_newlines=True)
+    assert proc.returncode == 0, proc.stdout
+    if os.path.basename(script).startswith('blender_'):
+        assert (tmp_path / 'scene.blend').is_file()
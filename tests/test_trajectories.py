@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from trajectories import (brownian_steps, reflect_into_box,
+    brownian_trajectory, maxwell_boltzmann_velocities)
+
+"""
+Tests of the random walks and initial velocities of trajectories.py.
+"""
+
+
+def test_brownian_trajectory_is_cumsum_of_steps():
+    locs = np.arange(12, dtype=float).reshape(4, 3)
+    trajectory = brownian_trajectory(locs, 50, step_size=0.3, seed=1)
+    steps = brownian_steps(49, 4, step_size=0.3, seed=1)
+    assert trajectory.shape == (50, 4, 3)
+    np.testing.assert_array_equal(trajectory[0], locs)
+    np.testing.assert_allclose(trajectory[1:], locs + np.cumsum(steps, 0))
+
+
+def test_brownian_steps_stay_within_step_size():
+    steps = brownian_steps(100, 10, step_size=0.5, seed=0)
+    assert np.all(np.abs(steps) <= 0.25)
+
+
+def test_brownian_steps_variance_from_diffusion():
+    steps = brownian_steps(2000, 50, diffusion=0.5, dt=2,
+        distribution='gaussian', seed=0)
+    np.testing.assert_allclose(steps.var(), 2 * 0.5 * 2, rtol=0.05)
+
+
+def test_brownian_trajectory_seed_is_reproducible():
+    locs = np.zeros((3, 3))
+    np.testing.assert_array_equal(brownian_trajectory(locs, 10, seed=5),
+        brownian_trajectory(locs, 10, seed=5))
+
+
+def test_reflect_into_box_keeps_points_in_bounds():
+    points = np.random.default_rng(0).uniform(-20, 20, (1000, 3))
+    low, high = np.array([-1, 0, 2]), np.array([1, 3, 2.5])
+    folded = reflect_into_box(points, low, high)
+    assert np.all(folded >= low) and np.all(folded <= high)
+    # points inside stay where they are, points outside are mirrored
+    np.testing.assert_allclose(reflect_into_box([[0.5, 1, 2.2]], low, high),
+        [[0.5, 1, 2.2]])
+    np.testing.assert_allclose(reflect_into_box([[1.25, -0.5, 2.75]], low,
+        high), [[0.75, 0.5, 2.25]])
+
+
+def test_reflect_into_box_needs_a_box():
+    with pytest.raises(ValueError):
+        reflect_into_box(np.zeros((1, 3)), 1, 1)
+
+
+def test_maxwell_boltzmann_velocities():
+    mass = np.repeat([1, 4], 5000)
+    velocities = maxwell_boltzmann_velocities(len(mass), 2, mass=mass,
+        seed=0)
+    np.testing.assert_allclose(velocities[:5000].var(), 2, rtol=0.05)
+    np.testing.assert_allclose(velocities[5000:].var(), 0.5, rtol=0.05)
+    np.testing.assert_allclose((mass[:, None] * velocities).sum(axis=0), 0,
+        atol=1e-9)
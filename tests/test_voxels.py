@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from voxels import voxel_geometry
+
+"""
+Tests of the voxel meshes of voxels.py.
+"""
+
+
+def closed_mesh_volume(verts, quads):
+    """Get the volume enclosed by a closed mesh of quads with outward
+    normals, by the divergence theorem."""
+    a, b, c, d = (verts[quads[:, k]] for k in range(4))
+    return (np.einsum('ij,ij->i', a, np.cross(b, c))
+        + np.einsum('ij,ij->i', a, np.cross(c, d))).sum() / 6
+
+
+@pytest.mark.parametrize('mode', ['cubes', 'culled', 'greedy'])
+def test_voxel_volume(mode):
+    grid = (np.random.default_rng(0).random((6, 5, 4)) < 0.5).astype(int)
+    grid[grid > 0] += np.arange(np.count_nonzero(grid)) % 2
+    verts, quads, material_index = voxel_geometry(grid, size=0.5,
+        mode=mode)
+    assert len(material_index) == len(quads)
+    assert set(material_index) == {0, 1}
+    np.testing.assert_allclose(closed_mesh_volume(verts, quads),
+        np.count_nonzero(grid) * 0.5**3)
+
+
+def test_solid_block_faces():
+    grid = np.ones((6, 6, 6), dtype=int)
+    assert len(voxel_geometry(grid, mode='cubes')[1]) == 6**3 * 6
+    assert len(voxel_geometry(grid, mode='culled')[1]) == 6 * 6**2
+    verts, quads, _ = voxel_geometry(grid, mode='greedy')
+    assert len(quads) == 6 and len(verts) == 8
@@ -0,0 +1,96 @@
+import numpy as np
+
+"""
+Random walk trajectories computed with NumPy only, so they can be generated
+and checked outside of Blender.
+
+The whole walk is drawn as one (frames, N, 3) array of steps and summed with
+a single cumsum, instead of drawing np.random.random(3) for each particle on
+each frame. Use the result with keyframes.write_location_keyframes:
+
+trajectory = brownian_trajectory(locs, 251, step_size=0.5, seed=0)
+write_location_keyframes(particles, trajectory)
+
+Initial velocities of a thermal gas are drawn the same way, for
+keyframes.set_initial_velocities.
+"""
+
+
+def brownian_steps(frame_num, particle_num, step_size=0.5, diffusion=None,
+    dt=1, distribution='uniform', seed=None):
+    """Get an array of random steps with shape (frame_num, particle_num, 3).
+    By default each coordinate is drawn uniformly from
+    [-step_size/2, step_size/2) like the scene scripts do. If a diffusion
+    coefficient is given, steps are scaled so that each coordinate has
+    variance 2 * diffusion * dt instead. Distribution can be 'uniform' or
+    'gaussian'. The seed can be an int or a numpy.random.Generator."""
+    rng = np.random.default_rng(seed)
+    shape = (frame_num, particle_num, 3)
+    if diffusion is None:
+        # standard deviation of the uniform step of width step_size
+        sigma = step_size / np.sqrt(12)
+    else:
+        if diffusion < 0 or dt <= 0:
+            raise ValueError('Diffusion must be >= 0 and dt must be > 0.')
+        sigma = np.sqrt(2 * diffusion * dt)
+    if distribution == 'uniform':
+        return np.sqrt(12) * sigma * (rng.random(shape) - 0.5)
+    if distribution == 'gaussian':
+        return rng.normal(scale=sigma, size=shape)
+    raise ValueError(
+        "Distribution must be 'uniform' or 'gaussian', not {}.".format(
+            repr(distribution)))
+
+
+def reflect_into_box(positions, low, high):
+    """Fold positions into the box between low and high, mirroring them at
+    the walls. Applied to a free random walk this gives the same path as
+    reflecting each step off the walls. Low and high can be scalars or
+    arrays of x, y, z bounds."""
+    low = np.asarray(low, dtype=float)
+    high = np.asarray(high, dtype=float)
+    if np.any(high <= low):
+        raise ValueError('Upper bounds must be greater than lower bounds.')
+    width = high - low
+    folded = np.mod(positions - low, 2 * width)
+    return low + np.where(folded > width, 2 * width - folded, folded)
+
+
+def brownian_trajectory(initial_locs, frame_num, step_size=0.5,
+    diffusion=None, dt=1, distribution='uniform', bounds=None, seed=None):
+    """Get the random walk of particles starting at the (N, 3) array of
+    initial locations as an array of shape (frame_num, N, 3). The first
+    frame holds the initial locations. Bounds can be a (low, high) pair of
+    reflecting box walls. See brownian_steps for the other arguments."""
+    initial_locs = np.asarray(initial_locs, dtype=float).reshape(-1, 3)
+    steps = brownian_steps(
+        frame_num - 1, len(initial_locs), step_size=step_size,
+        diffusion=diffusion, dt=dt, distribution=distribution, seed=seed)
+    trajectory = np.empty((frame_num, len(initial_locs), 3))
+    trajectory[0] = initial_locs
+    np.cumsum(steps, axis=0, out=trajectory[1:])
+    trajectory[1:] += initial_locs
+    if bounds is not None:
+        trajectory = reflect_into_box(trajectory, *bounds)
+    return trajectory
+
+
+def maxwell_boltzmann_velocities(particle_num, temperature, mass=1,
+    boltzmann=1, remove_drift=True, seed=None):
+    """Get an (N, 3) array of velocities drawn from the Maxwell-Boltzmann
+    distribution of an ideal gas at the given temperature, where each
+    component is normal with variance boltzmann * temperature / mass. Mass
+    can be a scalar or an array of N masses. With remove_drift, the total
+    momentum is subtracted so the gas as a whole stays in place. The seed
+    can be an int or a numpy.random.Generator."""
+    if temperature < 0:
+        raise ValueError('Temperature must be >= 0.')
+    rng = np.random.default_rng(seed)
+    mass = np.broadcast_to(np.asarray(mass, dtype=float), (particle_num,))
+    if np.any(mass <= 0):
+        raise ValueError('Masses must be > 0.')
+    sigma = np.sqrt(boltzmann * temperature / mass)[:, None]
+    velocities = rng.normal(size=(particle_num, 3)) * sigma
+    if remove_drift and particle_num > 1:
+        velocities -= (mass[:, None] * velocities).sum(axis=0) / mass.sum()
+    return velocities
@@ -0,0 +1,105 @@
+import os
+import json
+import numpy as np
+
+try:
+    import bpy
+    from bpy import context as C
+except ImportError:
+    # exported trajectories can be loaded outside of Blender
+    bpy = C = None
+
+"""
+Extract the trajectories of all particles from a baked simulation into a
+NumPy array on disk.
+
+Reading obj.matrix_world.translation for every object on every frame is
+one Python call per object and frame. extract_trajectory steps through the
+baked frame range once and reads the world matrices of all scene objects
+with a single foreach_get call per frame, writing each frame straight into
+a memory-mapped .npy file of shape (frames, N, 3), or (frames, N, 4, 4)
+with matrices=True:
+
+extract_trajectory('/tmp/sticky.npy')
+
+The object names and frame range are written next to it in a .json file,
+and the array can be analyzed without Blender:
+
+trajectory, info = load_trajectory('/tmp/sticky.npy')
+"""
+
+
+def active_rigid_bodies(scene=None):
+    """Get the objects of a scene which are moved by the rigid body
+    simulation, in scene order."""
+    scene = scene or C.scene
+    return [obj for obj in scene.objects
+        if obj.rigid_body is not None and obj.rigid_body.type == 'ACTIVE']
+
+
+def read_trajectory(out, objects, frame_start, scene=None,
+    matrices=False):
+    """Fill an array of shape (frames, N, 3), or (frames, N, 4, 4) with
+    matrices=True, with the world locations or matrices of the objects
+    on each frame from frame_start on. The scene is returned to its
+    current frame afterwards."""
+    scene = scene or C.scene
+    # rows of the objects in the matrices of all scene objects
+    row_of = {obj.name: row for row, obj in enumerate(scene.objects)}
+    rows = np.array([row_of[obj.name] for obj in objects], dtype=int)
+    buf = np.empty(16 * len(row_of), dtype=np.float32)
+    current = scene.frame_current
+    for f in range(len(out)):
+        scene.frame_set(frame_start + f)
+        scene.objects.foreach_get('matrix_world', buf)
+        # Blender stores matrices column by column
+        mats = buf.reshape(-1, 4, 4)[rows]
+        if matrices:
+            out[f] = mats.transpose(0, 2, 1)
+        else:
+            out[f] = mats[:, 3, :3]
+    scene.frame_set(current)
+    return out
+
+
+def extract_trajectory(path, objects=None, frame_start=None, frame_end=None,
+    matrices=False, scene=None, dtype=np.float32):
+    """Write the world locations (or world matrices with matrices=True) of
+    the objects on every frame from frame_start to frame_end into a
+    memory-mapped .npy file at path, and return the memory map. Objects
+    default to the active rigid bodies of the scene, and the frame range
+    to the scene's."""
+    scene = scene or C.scene
+    if objects is None:
+        objects = active_rigid_bodies(scene)
+    if frame_start is None:
+        frame_start = scene.frame_start
+    if frame_end is None:
+        frame_end = scene.frame_end
+    frame_num = frame_end - frame_start + 1
+    shape = (frame_num, len(objects)) + ((4, 4) if matrices else (3,))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    out = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape)
+    read_trajectory(out, objects, frame_start, scene=scene, matrices=matrices)
+    out.flush()
+    with open(info_path(path), 'w') as f:
+        json.dump({
+            'objects': [obj.name for obj in objects],
+            'frame_start': frame_start,
+            'frame_end': frame_end,
+            'matrices': matrices,
+        }, f)
+    return out
+
+
+def info_path(path):
+    """Get the path of the .json file describing an exported trajectory."""
+    return os.path.splitext(path)[0] + '.json'
+
+
+def load_trajectory(path):
+    """Get a read-only memory map of an exported trajectory and the
+    dictionary of its object names and frame range."""
+    with open(info_path(path)) as f:
+        info = json.load(f)
+    return np.load(path, mmap_mode='r'), info
@@ -0,0 +1,201 @@
+import numpy as np
+
+try:
+    import bpy
+    from bpy import data as D
+    from bpy import context as C
+except ImportError:
+    # voxel geometry can be computed outside of Blender
+    bpy = D = C = None
+
+"""
+Build voxel bodies as a single mesh straight from NumPy arrays.
+
+Adding every voxel with bpy.ops.mesh.primitive_cube_add, appending its
+material and joining all cubes with bpy.ops.object.join costs several
+operator calls per voxel, each slower the more objects the scene holds.
+Here a body is an integer grid where 0 is empty and k > 0 is a voxel with
+the k-th material, and all of its cubes are written into one mesh with
+foreach_set, with the material of every face set through material_index:
+
+grid = np.zeros((10, 10, 10), dtype=int)
+grid[2:8, 2:8, 2:8] = 1
+body = voxel_object(grid, mats=[skin_mat], name='body', mode='greedy')
+
+Whole cubes keep the faces between neighboring voxels, 6 * 216 quads for
+the block above. mode='culled' leaves out those hidden faces, and
+mode='greedy' also merges coplanar faces of the same material into
+rectangles, which leaves 6 quads. Merged quads meet smaller ones with
+T-junctions, which render fine but may shade unevenly with smooth
+normals or subdivision.
+"""
+
+
+# corners of a unit cube, indexed 4 * x + 2 * y + z
+CUBE_CORNERS = np.indices((2, 2, 2)).reshape(3, -1).T - 0.5
+
+# outward facing quads of the cube corners: -x, +x, -y, +y, -z, +z
+CUBE_FACES = np.array([(0, 1, 3, 2), (4, 6, 7, 5), (0, 4, 5, 1),
+    (2, 3, 7, 6), (0, 2, 6, 4), (1, 5, 7, 3)])
+
+
+# voxel geometry modes of voxel_geometry
+VOXEL_MODES = ('cubes', 'culled', 'greedy')
+
+
+def cube_geometry(grid):
+    """Get the vertices, quads and material index of all six faces of one
+    cube per occupied voxel, in voxel coordinates."""
+    occupied = np.argwhere(grid > 0)
+    verts = (occupied[:, None, :] + CUBE_CORNERS).reshape(-1, 3)
+    quads = (CUBE_FACES + 8 * np.arange(len(occupied))[:, None, None])
+    material_index = np.repeat(grid[tuple(occupied.T)] - 1, len(CUBE_FACES))
+    return verts, quads.reshape(-1, 4), material_index
+
+
+def visible_faces(grid, axis, side):
+    """Get the material values of the voxel faces which point along axis
+    in the direction of side (-1 or 1) and are not covered by a neighbor,
+    and 0 elsewhere. The result is transposed to the axis order (axis,
+    axis + 1, axis + 2), so each slice is one layer of faces."""
+    occupied = grid > 0
+    # occupancy of the neighbor on that side, empty outside the grid
+    pad = [(0, 0)] * 3
+    pad[axis] = (1, 0) if side < 0 else (0, 1)
+    padded = np.pad(occupied, pad)
+    neighbor = np.take(padded, np.arange(grid.shape[axis])
+        + (0 if side < 0 else 1), axis=axis)
+    faces = np.where(occupied & ~neighbor, grid, 0)
+    return np.transpose(faces, [axis, (axis + 1) % 3, (axis + 2) % 3])
+
+
+def greedy_rectangles(mask):
+    """Cover the nonzero cells of a 2D array with rectangles of equal
+    values, grown greedily along rows and then columns. Returns arrays of
+    the first row, first column, row count, column count and value of
+    every rectangle."""
+    mask = mask.copy()
+    rows, cols = mask.shape
+    rects = []
+    for start in np.flatnonzero(mask):
+        u, v = divmod(start, cols)
+        value = mask[u, v]
+        if not value:
+            # already covered by an earlier rectangle
+            continue
+        run = mask[u, v:] == value
+        dv = len(run) if run.all() else np.argmin(run)
+        du = 1
+        while u + du < rows and np.all(mask[u + du, v:v + dv] == value):
+            du += 1
+        mask[u:u + du, v:v + dv] = 0
+        rects.append((u, v, du, dv, value))
+    return np.array(rects, dtype=int).reshape(-1, 5).T
+
+
+def face_geometry(grid, greedy=True):
+    """Get the vertices, quads and material index of only the voxel faces
+    which are not covered by a neighboring voxel, in voxel coordinates.
+    With greedy, coplanar faces of the same material are merged into
+    larger quads. Vertices shared by quads are merged."""
+    verts, material_index = [], []
+    for axis in range(3):
+        for side in (-1, 1):
+            faces = visible_faces(grid, axis, side)
+            if greedy:
+                rects = []
+                for layer in np.flatnonzero(faces.any(axis=(1, 2))):
+                    rect = greedy_rectangles(faces[layer])
+                    rects.append(np.vstack([np.full(rect.shape[1], layer),
+                        rect]))
+                if not rects:
+                    continue
+                layer, u, v, du, dv, value = np.hstack(rects)
+            else:
+                layer, u, v = np.nonzero(faces)
+                value = faces[layer, u, v]
+                du = dv = np.ones_like(u)
+            # corners counterclockwise around the outward normal
+            u0, u1, v0, v1 = u - 0.5, u + du - 0.5, v - 0.5, v + dv - 0.5
+            corners = [(u0, v0), (u1, v0), (u1, v1), (u0, v1)]
+            if side < 0:
+                corners = corners[::-1]
+            quad = np.empty((len(u), 4, 3))
+            quad[:, :, axis] = (layer + 0.5 * side)[:, None]
+            for k, (cu, cv) in enumerate(corners):
+                quad[:, k, (axis + 1) % 3] = cu
+                quad[:, k, (axis + 2) % 3] = cv
+            verts.append(quad.reshape(-1, 3))
+            material_index.append(value - 1)
+    if not verts:
+        return np.zeros((0, 3)), np.zeros((0, 4), dtype=int), np.zeros(0, int)
+    verts, inverse = np.unique(np.concatenate(verts), axis=0,
+        return_inverse=True)
+    return verts, inverse.reshape(-1, 4), np.concatenate(material_index)
+
+
+def voxel_geometry(grid, size=1, origin=(0, 0, 0), mode='cubes'):
+    """Get the vertices (V, 3), quads (F, 4) and material index (F,) of
+    the mesh of the occupied voxels of an integer grid, where voxel
+    (i, j, k) is centered at origin + size * (i, j, k). The 'cubes' mode
+    gives a whole cube per voxel, 'culled' leaves out faces between
+    neighboring voxels, and 'greedy' also merges coplanar faces of the
+    same material into larger quads."""
+    if mode not in VOXEL_MODES:
+        raise ValueError('Mode must be one of {}, not {}.'.format(
+            VOXEL_MODES, repr(mode)))
+    grid = np.asarray(grid)
+    if mode == 'cubes':
+        verts, quads, material_index = cube_geometry(grid)
+    else:
+        verts, quads, material_index = face_geometry(
+            grid, greedy=mode == 'greedy')
+    verts = np.asarray(origin, dtype=float) + size * verts
+    return verts, quads, material_index
+
+
+def mesh_from_quads(verts, quads, material_index=None, mats=(),
+    name='voxels', smooth=False):
+    """Create a mesh datablock from (V, 3) vertices and (F, 4) quads with
+    foreach_set, with an optional material index per face into mats."""
+    quads = np.asarray(quads, dtype=np.int32)
+    mesh = D.meshes.new(name)
+    mesh.vertices.add(len(verts))
+    mesh.vertices.foreach_set('co',
+        np.asarray(verts, dtype=np.float32).ravel())
+    mesh.loops.add(quads.size)
+    mesh.loops.foreach_set('vertex_index', quads.ravel())
+    mesh.polygons.add(len(quads))
+    mesh.polygons.foreach_set('loop_start',
+        np.arange(0, quads.size, 4, dtype=np.int32))
+    mesh.polygons.foreach_set('loop_total',
+        np.full(len(quads), 4, dtype=np.int32))
+    if material_index is not None:
+        mesh.polygons.foreach_set('material_index',
+            np.asarray(material_index, dtype=np.int32))
+    if smooth:
+        mesh.polygons.foreach_set('use_smooth',
+            np.ones(len(quads), dtype=bool))
+    for mat in mats:
+        mesh.materials.append(mat)
+    mesh.update(calc_edges=True)
+    return mesh
+
+
+def voxel_object(grid, size=1, origin=(0, 0, 0), mats=(), name='voxels',
+    smooth=False, collection=None, mode='cubes'):
+    """Create a single mesh object of the occupied voxels of an integer
+    grid, built in the given mode of voxel_geometry, where voxels with
+    value k get the k-th of mats. The object is linked to the active
+    collection and made active."""
+    verts, quads, material_index = voxel_geometry(grid, size=size,
+        origin=origin, mode=mode)
+    mesh = mesh_from_quads(verts, quads, material_index, mats=mats,
+        name=name, smooth=smooth)
+    obj = D.objects.new(name, mesh)
+    if collection is None:
+        collection = C.view_layer.active_layer_collection.collection
+    collection.objects.link(obj)
+    C.view_layer.objects.active = obj
+    obj.select_set(True)
+    return obj